@@ -0,0 +1,126 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from ChessEngine import createGameState
+from Evaluation import MIDDLEGAME_PIECE_SQUARES, ENDGAME_PIECE_SQUARES, PHASE_WEIGHTS, MAX_PHASE, evaluateFromScratch
+from Search import BENCHMARK_POSITIONS
+
+# Order of the piece planes of an encoded position
+PIECE_PLANES = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+EMPTY_PLANE = len(PIECE_PLANES)
+
+# Plane index of every two-character square of GameState.board, looked up by the (color byte << 8 | piece byte) code
+SQUARE_CODE_TO_PLANE = np.full(1 << 16, EMPTY_PLANE, dtype=np.uint8)
+for planeIndex, piece in enumerate(PIECE_PLANES):
+    SQUARE_CODE_TO_PLANE[(ord(piece[0]) << 8) | ord(piece[1])] = planeIndex
+
+# The evaluation tables of Evaluation.py as one (12 * 64) x 3 matrix : middlegame value, endgame value and phase weight
+# of every piece on every square, laid out like the flattened planes. The terms are small integers, so float32 is exact
+EVALUATION_WEIGHTS = np.array([
+    [MIDDLEGAME_PIECE_SQUARES[piece][square], ENDGAME_PIECE_SQUARES[piece][square], PHASE_WEIGHTS[piece[1]]]
+    for piece in PIECE_PLANES for square in range(64)], dtype=np.float32)
+
+
+# Encoded positions : piece planes (N x 12 x 8 x 8), side to move (N, 1 for white) and en passant file (N x 8, one-hot)
+class PositionBatch:
+    def __init__(self, planes, whiteToMove, enPassantFiles):
+        self.planes = planes
+        self.whiteToMove = whiteToMove
+        self.enPassantFiles = enPassantFiles
+
+
+    def __len__(self):
+        return len(self.planes)
+
+
+    # Flat float features per position (12 * 64 piece squares, side to move, 8 en passant files), e.g. for training
+    def getFeatures(self, dtype=np.float32):
+        return np.concatenate((self.planes.reshape(len(self), len(PIECE_PLANES) * 64), self.whiteToMove[:, None], self.enPassantFiles), axis=1).astype(dtype)
+
+
+# Encoding many game states at once : every board is turned into bytes and all the squares are decoded by one lookup
+def encodePositions(gameStates):
+    gameStates = list(gameStates)
+    count = len(gameStates)
+    boardBytes = "".join("".join("".join(row) for row in gameState.board) for gameState in gameStates).encode("ascii")
+    squareCodes = np.frombuffer(boardBytes, dtype=">u2").reshape(count, 64)
+    planeIndices = SQUARE_CODE_TO_PLANE[squareCodes]
+
+    planes = (planeIndices[:, None, :] == np.arange(len(PIECE_PLANES), dtype=np.uint8)[None, :, None])
+    planes = planes.astype(np.uint8).reshape(count, len(PIECE_PLANES), 8, 8)
+
+    whiteToMove = np.fromiter((gameState.whiteToMove for gameState in gameStates), dtype=np.uint8, count=count)
+    enPassantFiles = np.zeros((count, 8), dtype=np.uint8)
+    for i, gameState in enumerate(gameStates):
+        if gameState.possibleEnPassant:
+            enPassantFiles[i, gameState.possibleEnPassant[1]] = 1
+    return PositionBatch(planes, whiteToMove, enPassantFiles)
+
+
+# Encoding positions given as FEN strings
+def encodeFens(fens, backend="mailbox"):
+    gameStates = []
+    for fen in fens:
+        gameState = createGameState(backend)
+        gameState.loadFen(fen)
+        gameStates.append(gameState)
+    return encodePositions(gameStates)
+
+
+# Evaluating every position of a batch, from the point of view of the player to move (same scores as Evaluation.evaluate)
+def evaluateBatch(batch):
+    terms = (batch.planes.reshape(len(batch), len(EVALUATION_WEIGHTS)).astype(np.float32) @ EVALUATION_WEIGHTS).astype(np.int64)
+    middlegameScores, endgameScores = terms[:, 0], terms[:, 1]
+    phases = np.minimum(terms[:, 2], MAX_PHASE)
+    scores = (middlegameScores * phases + endgameScores * (MAX_PHASE - phases)) // MAX_PHASE
+    return np.where(batch.whiteToMove == 1, scores, -scores)
+
+
+# Timing the batch encoding + evaluation against evaluating the same game states one board scan at a time
+def runBenchmark(positions=BENCHMARK_POSITIONS, count=10000):
+    gameStates = []
+    for i in range(count):
+        gameState = createGameState()
+        gameState.loadFen(positions[i % len(positions)])
+        gameStates.append(gameState)
+
+    startTime = time.perf_counter()
+    expected = [evaluateFromScratch(gameState) for gameState in gameStates]
+    scanSeconds = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    batch = encodePositions(gameStates)
+    encodeSeconds = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    scores = evaluateBatch(batch)
+    evaluateSeconds = time.perf_counter() - startTime
+
+    return {
+        "positions": count,
+        "matches": scores.tolist() == expected,
+        "scanPerSecond": count / scanSeconds if scanSeconds > 0 else 0.0,
+        "encodePerSecond": count / encodeSeconds if encodeSeconds > 0 else 0.0,
+        "evaluatePerSecond": count / evaluateSeconds if evaluateSeconds > 0 else 0.0,
+        "batchPerSecond": count / (encodeSeconds + evaluateSeconds),
+    }
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Batched NumPy position encoding and evaluation benchmark")
+    parser.add_argument("--count", type=int, default=10000, help="Number of positions in the batch")
+    args = parser.parse_args(arguments)
+
+    report = runBenchmark(count=args.count)
+    print(f"{report['positions']} positions, batch scores match the board scan : {report['matches']}")
+    print(f"Board scan        : {report['scanPerSecond']:.0f} positions/s")
+    print(f"Batch encoding    : {report['encodePerSecond']:.0f} positions/s")
+    print(f"Batch evaluation  : {report['evaluatePerSecond']:.0f} positions/s")
+    print(f"Encode + evaluate : {report['batchPerSecond']:.0f} positions/s")
+    return 0 if report["matches"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from ChessEngine import GameState
+
+# Endgames with a lone king against king + one piece, the tables are built for white holding the piece
+# KPK depends on KQK and KRK, which its promotions lead to
+TABLE_PIECES = {"KQK": 'Q', "KRK": 'R', "KPK": 'p'}
+TABLE_ORDER = ("KQK", "KRK", "KPK")
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+
+# Index of a position : ((sideToMove * 64 + strongKing) * 64 + weakKing) * 64 + pieceSquare
+# The squares are row * 8 + col like GameState.board, sideToMove is 0 when the side with the piece is to move
+STRONG_TO_MOVE, WEAK_TO_MOVE = 0, 1
+POSITION_COUNT = 2 * 64 * 64 * 64
+
+# On disk : a 16-byte header (magic, number of positions, number of wins), then one bit per position,
+# set when the side with the piece wins
+HEADER_FORMAT = struct.Struct("<8sII")
+MAGIC = b"MCEBBv01"
+
+# Results of a probe, from the point of view of the player to move
+WIN, DRAW, LOSS = 1, 0, -1
+
+# Status of a position during the generation
+UNKNOWN, WON, DRAWN, ILLEGAL = 0, 1, 2, 3
+
+
+def getIndex(sideToMove, strongKing, weakKing, pieceSquare):
+    return ((sideToMove * 64 + strongKing) * 64 + weakKing) * 64 + pieceSquare
+
+
+def getBitbasePath(directory, name):
+    return os.path.join(directory, f"{name}.bitbase")
+
+
+# Win / draw bitbases of KQK, KRK and KPK, each file is memory-mapped the first time it is needed
+class Bitbases:
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.tables = {}
+
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+
+    # Getting the mapped bits of a table, None when its file does not exist
+    def getTable(self, name):
+        if name not in self.tables:
+            path = getBitbasePath(self.directory, name)
+            table = None
+            if os.path.exists(path):
+                with open(path, "rb") as bitbaseFile:
+                    table = mmap.mmap(bitbaseFile.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, positionCount, _ = HEADER_FORMAT.unpack_from(table, 0)
+                if magic != MAGIC or positionCount != POSITION_COUNT:
+                    table.close()
+                    raise ValueError(f"Invalid bitbase file : {path}")
+            self.tables[name] = table
+        return self.tables[name]
+
+
+    # Whether the side with the piece wins the position of the given index
+    def isWin(self, name, index):
+        table = self.getTable(name)
+        return (table[HEADER_FORMAT.size + (index >> 3)] >> (index & 7)) & 1 == 1
+
+
+    # Probing a position given by its squares, with the piece held by white (constant time)
+    def probeSquares(self, name, whiteToMove, strongKing, weakKing, pieceSquare):
+        sideToMove = STRONG_TO_MOVE if whiteToMove else WEAK_TO_MOVE
+        if not self.isWin(name, getIndex(sideToMove, strongKing, weakKing, pieceSquare)):
+            return DRAW
+        return WIN if sideToMove == STRONG_TO_MOVE else LOSS
+
+
+    # Probing a game state : WIN, DRAW or LOSS for the player to move, None when the position is not covered
+    # When black holds the piece, the position is mirrored vertically with the colors swapped
+    def probe(self, gameState):
+        piece, pieceRow, pieceCol = None, 0, 0
+        for row in range(8):
+            for col in range(8):
+                square = gameState.board[row][col]
+                if square != "--" and square[1] != 'K':
+                    if piece is not None:
+                        return None
+                    piece, pieceRow, pieceCol = square, row, col
+        if piece is None:
+            return None
+        name = "K" + piece[1].upper() + "K"
+        if name not in TABLE_PIECES or self.getTable(name) is None:
+            return None
+
+        if piece[0] == 'w':
+            strongKing, weakKing = gameState.whiteKingLocation, gameState.blackKingLocation
+            return self.probeSquares(name, gameState.whiteToMove, strongKing[0] * 8 + strongKing[1],
+                                     weakKing[0] * 8 + weakKing[1], pieceRow * 8 + pieceCol)
+        strongKing, weakKing = gameState.blackKingLocation, gameState.whiteKingLocation
+        return self.probeSquares(name, not gameState.whiteToMove, (7 - strongKing[0]) * 8 + strongKing[1],
+                                 (7 - weakKing[0]) * 8 + weakKing[1], (7 - pieceRow) * 8 + pieceCol)
+
+
+# Generating the moves of every position with the strong king on the given squares
+# Returns (statuses, sources, targets) : the status of every position of the squares (UNKNOWN when it depends on
+# other positions) and the moves between UNKNOWN positions of the table as source / target index pairs
+def generatePositions(name, strongKingSquares, directory):
+    piece = 'w' + TABLE_PIECES[name]
+    # Promotions lead to the already built KQK / KRK tables, or to a draw with a minor piece
+    promotionTables = Bitbases(directory)
+    gameState = GameState()
+    board = [["--"] * 8 for _ in range(8)]
+    gameState.board = board
+    gameState.possibleEnPassant = ()
+
+    statuses = array('b')
+    sources, targets = array('i'), array('i')
+    for strongKing in strongKingSquares:
+        for sideToMove in (STRONG_TO_MOVE, WEAK_TO_MOVE):
+            # The positions of a strong king square and side to move are consecutive indices
+            for weakKing in range(64):
+                for pieceSquare in range(64):
+                    index = getIndex(sideToMove, strongKing, weakKing, pieceSquare)
+                    if not isPlausible(piece, strongKing, weakKing, pieceSquare):
+                        statuses.append(ILLEGAL)
+                        continue
+
+                    board[strongKing // 8][strongKing % 8] = 'wK'
+                    board[weakKing // 8][weakKing % 8] = 'bK'
+                    board[pieceSquare // 8][pieceSquare % 8] = piece
+                    gameState.whiteKingLocation = divmod(strongKing, 8)
+                    gameState.blackKingLocation = divmod(weakKing, 8)
+                    gameState.whiteToMove = sideToMove == STRONG_TO_MOVE
+                    statuses.append(getPositionStatus(gameState, index, promotionTables, sources, targets))
+                    board[strongKing // 8][strongKing % 8] = "--"
+                    board[weakKing // 8][weakKing % 8] = "--"
+                    board[pieceSquare // 8][pieceSquare % 8] = "--"
+    promotionTables.close()
+    return strongKingSquares, statuses, sources, targets
+
+
+# Positions with the pieces on distinct squares, kings not touching and no pawn on the first or last rank
+def isPlausible(piece, strongKing, weakKing, pieceSquare):
+    if len({strongKing, weakKing, pieceSquare}) < 3:
+        return False
+    if abs(strongKing // 8 - weakKing // 8) <= 1 and abs(strongKing % 8 - weakKing % 8) <= 1:
+        return False
+    return not (piece == 'wp' and pieceSquare // 8 in (0, 7))
+
+
+def getPositionStatus(gameState, index, promotionTables, sources, targets):
+    whiteToMove = gameState.whiteToMove
+    # The player who just moved cannot have left their king in check
+    if whiteToMove and gameState.getAttackers(*gameState.blackKingLocation, attackerColor='w', stopAtFirst=True):
+        return ILLEGAL
+
+    moves = gameState.getValidMoves()
+    if len(moves) == 0:
+        return WON if gameState.checkmate and not whiteToMove else DRAWN
+
+    strongKing = gameState.whiteKingLocation[0] * 8 + gameState.whiteKingLocation[1]
+    weakKing = gameState.blackKingLocation[0] * 8 + gameState.blackKingLocation[1]
+    successors = []
+    for move in moves:
+        endingSquare = move.endingRow * 8 + move.endingColumn
+        if not whiteToMove:
+            # Taking the piece leaves two kings : a draw the lone king can always choose
+            if move.capturedPiece != "--":
+                return DRAWN
+            successors.append(getIndex(STRONG_TO_MOVE, strongKing, endingSquare, (index & 63)))
+        elif move.promotionPiece:
+            promotionTable = "K" + move.promotionPiece[1] + "K"
+            if promotionTable in TABLE_PIECES and \
+               promotionTables.isWin(promotionTable, getIndex(WEAK_TO_MOVE, strongKing, weakKing, endingSquare)):
+                return WON
+        elif move.movedPiece == 'wK':
+            successors.append(getIndex(WEAK_TO_MOVE, endingSquare, weakKing, index & 63))
+        else:
+            successors.append(getIndex(WEAK_TO_MOVE, strongKing, weakKing, endingSquare))
+
+    if whiteToMove and not successors:
+        return DRAWN
+    for successor in successors:
+        sources.append(index)
+        targets.append(successor)
+    return UNKNOWN
+
+
+# Building a table : the moves of every position are generated by the engine (in parallel over the strong king squares),
+# then the wins are propagated backwards from the checkmates through the predecessors of every won position
+def buildTable(name, directory=DEFAULT_DIRECTORY, workers=None):
+    statuses = bytearray(POSITION_COUNT)
+    # Number of moves of the weak side that do not lead to a known win yet
+    remainingMoves = array('i', bytes(4 * POSITION_COUNT))
+    allSources, allTargets = array('i'), array('i')
+
+    chunks = [list(range(square, square + 8)) for square in range(0, 64, 8)]
+    with ProcessPoolExecutor(workers) as executor:
+        results = executor.map(generatePositions, [name] * len(chunks), chunks, [directory] * len(chunks))
+        for strongKingSquares, chunkStatuses, sources, targets in results:
+            position = 0
+            for strongKing in strongKingSquares:
+                for sideToMove in (STRONG_TO_MOVE, WEAK_TO_MOVE):
+                    start = getIndex(sideToMove, strongKing, 0, 0)
+                    statuses[start:start + 64 * 64] = bytes(chunkStatuses[position:position + 64 * 64])
+                    position += 64 * 64
+            allSources.extend(sources)
+            allTargets.extend(targets)
+
+    # Predecessor lists of every position, stored contiguously : predecessors[offsets[i]:offsets[i + 1]]
+    offsets = array('i', bytes(4 * (POSITION_COUNT + 1)))
+    for source, target in zip(allSources, allTargets):
+        offsets[target + 1] += 1
+        if source >= POSITION_COUNT // 2:
+            remainingMoves[source] += 1
+    for i in range(POSITION_COUNT):
+        offsets[i + 1] += offsets[i]
+    predecessors = array('i', bytes(4 * len(allSources)))
+    nextSlot = array('i', offsets)
+    for source, target in zip(allSources, allTargets):
+        predecessors[nextSlot[target]] = source
+        nextSlot[target] += 1
+    del allSources, allTargets, nextSlot
+
+    pending = [i for i in range(POSITION_COUNT) if statuses[i] == WON]
+    while pending:
+        position = pending.pop()
+        for predecessor in predecessors[offsets[position]:offsets[position + 1]]:
+            if statuses[predecessor] != UNKNOWN:
+                continue
+            # The strong side needs one winning move, the weak side loses once all of its moves lose
+            if predecessor < POSITION_COUNT // 2:
+                statuses[predecessor] = WON
+                pending.append(predecessor)
+            else:
+                remainingMoves[predecessor] -= 1
+                if remainingMoves[predecessor] == 0:
+                    statuses[predecessor] = WON
+                    pending.append(predecessor)
+
+    bits = bytearray(POSITION_COUNT // 8)
+    wins = 0
+    for i in range(POSITION_COUNT):
+        if statuses[i] == WON:
+            bits[i >> 3] |= 1 << (i & 7)
+            wins += 1
+    os.makedirs(directory, exist_ok=True)
+    with open(getBitbasePath(directory, name), "wb") as bitbaseFile:
+        bitbaseFile.write(HEADER_FORMAT.pack(MAGIC, POSITION_COUNT, wins))
+        bitbaseFile.write(bits)
+    legalPositions = sum(1 for status in statuses if status != ILLEGAL)
+    return {"name": name, "positions": legalPositions, "wins": wins}
+
+
+# Timing random probes of a table through probeSquares
+def benchmarkProbes(bitbases, name, probes=100000, seed=0):
+    rng = random.Random(seed)
+    squares = [(rng.random() < 0.5, rng.randrange(64), rng.randrange(64), rng.randrange(8, 56)) for _ in range(probes)]
+    bitbases.getTable(name)
+    startTime = time.perf_counter()
+    for whiteToMove, strongKing, weakKing, pieceSquare in squares:
+        bitbases.probeSquares(name, whiteToMove, strongKing, weakKing, pieceSquare)
+    return 1e6 * (time.perf_counter() - startTime) / probes
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Build and benchmark the KQK / KRK / KPK bitbases")
+    parser.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--build", action="store_true", help="Build the tables (KQK and KRK first, KPK depends on them)")
+    parser.add_argument("--fen", help="Probe a position")
+    args = parser.parse_args(arguments)
+
+    if args.build:
+        for name in TABLE_ORDER:
+            startTime = time.perf_counter()
+            report = buildTable(name, args.directory, args.workers)
+            print(f"{name} : {report['positions']} positions, {report['wins']} wins, built in {time.perf_counter() - startTime:.1f} s")
+
+    bitbases = Bitbases(args.directory)
+    if args.fen:
+        gameState = GameState()
+        gameState.loadFen(args.fen)
+        result = bitbases.probe(gameState)
+        print({WIN: "win", DRAW: "draw", LOSS: "loss", None: "not in the bitbases"}[result])
+        return 0
+
+    for name in TABLE_ORDER:
+        if bitbases.getTable(name) is not None:
+            print(f"{name} : {benchmarkProbes(bitbases, name):.2f} us per probe")
+    bitbases.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
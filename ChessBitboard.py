@@ -0,0 +1,452 @@
+from ChessEngine import GameState, Move, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, SLIDING_DIRECTIONS, KNIGHT_OFFSETS, KING_OFFSETS
+
+# Square indexing : square = row * 8 + col, so bit 0 is a8 and bit 63 is h1 (same orientation as GameState.board)
+FULL_BITBOARD = (1 << 64) - 1
+SQUARE_COORDINATES = [divmod(square, 8) for square in range(64)]
+FILE_A = sum(1 << (row * 8) for row in range(8))
+FILE_H = FILE_A << 7
+# Rows reached by a single pawn push from the starting row of each color
+WHITE_DOUBLE_PUSH_ROW = 0xFF << (5 * 8)
+BLACK_DOUBLE_PUSH_ROW = 0xFF << (2 * 8)
+# First and last rows, where the pawn pushes promote
+PROMOTION_ROWS = 0xFF | (0xFF << (7 * 8))
+ALL_PIECES = [color + piece for color in "wb" for piece in "pRNBQK"]
+
+
+# Building the table of the squares reached in one step from every square
+def buildStepAttacks(offsets):
+    table = []
+    for row, col in SQUARE_COORDINATES:
+        attacks = 0
+        for rowOffset, colOffset in offsets:
+            r, c = row + rowOffset, col + colOffset
+            if (0 <= r <= 7) and (0 <= c <= 7):
+                attacks |= 1 << (r * 8 + c)
+        table.append(attacks)
+    return table
+
+
+# Building the rays of every sliding direction : RAYS[directionIndex][square]
+def buildRays():
+    rays = []
+    for rowDirection, colDirection in SLIDING_DIRECTIONS:
+        table = []
+        for row, col in SQUARE_COORDINATES:
+            ray = 0
+            r, c = row + rowDirection, col + colDirection
+            while (0 <= r <= 7) and (0 <= c <= 7):
+                ray |= 1 << (r * 8 + c)
+                r, c = r + rowDirection, c + colDirection
+            table.append(ray)
+        rays.append(table)
+    return rays
+
+
+# Building the squares strictly between two aligned squares : BETWEEN[a * 64 + b] (0 when not aligned)
+def buildBetween():
+    between = [0] * (64 * 64)
+    for square, (row, col) in enumerate(SQUARE_COORDINATES):
+        for rowDirection, colDirection in SLIDING_DIRECTIONS:
+            squaresInBetween = 0
+            r, c = row + rowDirection, col + colDirection
+            while (0 <= r <= 7) and (0 <= c <= 7):
+                between[square * 64 + r * 8 + c] = squaresInBetween
+                squaresInBetween |= 1 << (r * 8 + c)
+                r, c = r + rowDirection, c + colDirection
+    return between
+
+
+KNIGHT_ATTACKS = buildStepAttacks(KNIGHT_OFFSETS)
+KING_ATTACKS = buildStepAttacks(KING_OFFSETS)
+# Squares attacked by a pawn of the given color standing on a square
+PAWN_ATTACKS = {'w': buildStepAttacks(((-1, -1), (-1, 1))), 'b': buildStepAttacks(((1, -1), (1, 1)))}
+RAYS = buildRays()
+# A ray is "positive" when it goes towards higher square indexes, so its nearest blocker is its lowest bit
+POSITIVE_RAYS = [rowDirection * 8 + colDirection > 0 for rowDirection, colDirection in SLIDING_DIRECTIONS]
+ROOK_RAYS = tuple(range(len(ROOK_DIRECTIONS)))
+BISHOP_RAYS = tuple(range(len(ROOK_DIRECTIONS), len(SLIDING_DIRECTIONS)))
+BETWEEN = buildBetween()
+
+
+# Getting the squares attacked by a slider on square, stopping each ray at its first occupied square
+def slidingAttacks(square, occupancy, rays):
+    attacks = 0
+    for direction in rays:
+        ray = RAYS[direction][square]
+        blockers = ray & occupancy
+        if blockers:
+            if POSITIVE_RAYS[direction]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[direction][blocker]
+        attacks |= ray
+    return attacks
+
+
+# Position representation with one 64-bit integer per piece type and color plus occupancy masks
+# The mailbox board is kept in sync so Move objects, the GUI and the inherited helpers keep working
+class BitboardGameState(GameState):
+    def __init__(self, fen=None):
+        super().__init__(fen)
+        self.syncBitboards()
+
+
+    def loadFen(self, fen):
+        super().loadFen(fen)
+        self.syncBitboards()
+
+
+    # Rebuilding every bitboard and the Zobrist key from the mailbox board (used after the board is set directly)
+    def syncBitboards(self):
+        self.bitboards = {piece: 0 for piece in ALL_PIECES}
+        self.occupancy = {'w': 0, 'b': 0}
+        for square, (row, col) in enumerate(SQUARE_COORDINATES):
+            piece = self.board[row][col]
+            if piece != "--":
+                self.bitboards[piece] |= 1 << square
+                self.occupancy[piece[0]] |= 1 << square
+        self.zobristKey = self.computeZobristKey()
+
+
+    def makeMove(self, move, isPawnPromotion = False, toPromoteToPiece = ''):
+        board, bitboards, occupancy = self.board, self.bitboards, self.occupancy
+        startingBit = 1 << (move.startingRow * 8 + move.startingColumn)
+        endingBit = 1 << (move.endingRow * 8 + move.endingColumn)
+        placedPiece = toPromoteToPiece if isPawnPromotion else (move.promotionPiece or move.movedPiece)
+        self.updateZobristKeyBeforeMove(move, placedPiece)
+        self.updateEvaluationBeforeMove(move, placedPiece)
+
+        # Moving the piece on the bitboards, then removing the captured piece
+        bitboards[move.movedPiece] ^= startingBit
+        bitboards[placedPiece] |= endingBit
+        occupancy[move.movedPiece[0]] ^= startingBit | endingBit
+        if move.capturedPiece != "--":
+            capturedBit = (1 << (move.startingRow * 8 + move.endingColumn)) if move.isEnPassantMove else endingBit
+            bitboards[move.capturedPiece] ^= capturedBit
+            occupancy[move.capturedPiece[0]] ^= capturedBit
+
+        # Making the same changes on the mailbox board
+        board[move.startingRow][move.startingColumn] = "--"
+        board[move.endingRow][move.endingColumn] = placedPiece
+        if move.isEnPassantMove:
+            board[move.startingRow][move.endingColumn] = "--"
+
+        if move.movedPiece == "wK":
+            self.whiteKingLocation = (move.endingRow, move.endingColumn)
+        elif move.movedPiece == "bK":
+            self.blackKingLocation = (move.endingRow, move.endingColumn)
+
+        # Updating the possible en passant variable
+        self.enPassantLog.append(self.possibleEnPassant)
+        if (move.movedPiece[1] == 'p') and (abs(move.startingRow - move.endingRow) == 2):
+            self.possibleEnPassant = ((move.startingRow + move.endingRow) // 2, move.startingColumn)
+        else:
+            self.possibleEnPassant = ()
+
+        self.moveLog.append(move)
+        self.whiteToMove = not self.whiteToMove
+        self.updateHalfmoveClock(move)
+        self.updateZobristKeyAfterMove()
+
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog.pop()
+            board, bitboards, occupancy = self.board, self.bitboards, self.occupancy
+            startingBit = 1 << (move.startingRow * 8 + move.startingColumn)
+            endingBit = 1 << (move.endingRow * 8 + move.endingColumn)
+            # The piece standing on the ending square differs from the moved one after a promotion
+            placedPiece = board[move.endingRow][move.endingColumn]
+
+            bitboards[placedPiece] ^= endingBit
+            bitboards[move.movedPiece] |= startingBit
+            occupancy[move.movedPiece[0]] ^= startingBit | endingBit
+            board[move.startingRow][move.startingColumn] = move.movedPiece
+            board[move.endingRow][move.endingColumn] = move.capturedPiece
+            if move.capturedPiece != "--":
+                if move.isEnPassantMove:
+                    capturedBit = 1 << (move.startingRow * 8 + move.endingColumn)
+                    board[move.endingRow][move.endingColumn] = "--"
+                    board[move.startingRow][move.endingColumn] = move.capturedPiece
+                else:
+                    capturedBit = endingBit
+                bitboards[move.capturedPiece] |= capturedBit
+                occupancy[move.capturedPiece[0]] |= capturedBit
+
+            if move.movedPiece == "wK":
+                self.whiteKingLocation = (move.startingRow, move.startingColumn)
+            elif move.movedPiece == "bK":
+                self.blackKingLocation = (move.startingRow, move.startingColumn)
+
+            self.possibleEnPassant = self.enPassantLog.pop()
+            self.zobristKey = self.zobristLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog.pop()
+            self.middlegameScore, self.endgameScore, self.phase = self.evaluationLog.pop()
+            self.whiteToMove = not self.whiteToMove
+
+
+    # Getting the bitboard of the pieces of color attacking square for the given occupancy
+    def attackersBitboard(self, square, color, occupancy):
+        bitboards = self.bitboards
+        enemyColor = 'b' if color == 'w' else 'w'
+        return (KNIGHT_ATTACKS[square] & bitboards[color + 'N']) | \
+               (KING_ATTACKS[square] & bitboards[color + 'K']) | \
+               (PAWN_ATTACKS[enemyColor][square] & bitboards[color + 'p']) | \
+               (slidingAttacks(square, occupancy, ROOK_RAYS) & (bitboards[color + 'R'] | bitboards[color + 'Q'])) | \
+               (slidingAttacks(square, occupancy, BISHOP_RAYS) & (bitboards[color + 'B'] | bitboards[color + 'Q']))
+
+
+    def isUnderAttack(self, row, col) -> bool:
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        return self.attackersBitboard(row * 8 + col, enemyColor, self.occupancy['w'] | self.occupancy['b']) != 0
+
+
+    def getAttackers(self, row, col, attackerColor=None, stopAtFirst=False):
+        if attackerColor is None:
+            attackerColor = 'b' if self.whiteToMove else 'w'
+        attackers = self.attackersBitboard(row * 8 + col, attackerColor, self.occupancy['w'] | self.occupancy['b'])
+        squares = []
+        while attackers:
+            lowestBit = attackers & -attackers
+            squares.append(SQUARE_COORDINATES[lowestBit.bit_length() - 1])
+            if stopAtFirst:
+                break
+            attackers ^= lowestBit
+        return squares
+
+
+    # Getting all the valid moves with set-wise generation, checks and pins are computed once per position
+    def getValidMoves(self):
+        pinsAndChecks = self.getPinsAndChecks()
+        moves = self.getBitboardMoves(pinsAndChecks, True, True)
+
+        # Checking for the edge cases (Checkmate or Stalemate)
+        if len(moves) == 0:
+            if pinsAndChecks[1]:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            self.checkmate, self.stalemate = False, False
+        self.updateDrawStatus()
+
+        return moves
+
+
+    # Getting (kingSquare, checkers, checkMask, pinMasks) : the bitboard of the pieces giving check, the squares a
+    # non-king piece can move to in order to capture or block a single checking piece, and for every pinned piece
+    # the squares between the king and the pinning piece (which it may capture)
+    def getPinsAndChecks(self):
+        bitboards = self.bitboards
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        allies, enemies = self.occupancy[allyColor], self.occupancy[enemyColor]
+        occupancy = allies | enemies
+        kingSquare = bitboards[allyColor + 'K'].bit_length() - 1
+        checkers = self.attackersBitboard(kingSquare, enemyColor, occupancy)
+        if checkers:
+            checkMask = BETWEEN[kingSquare * 64 + checkers.bit_length() - 1] | checkers
+        else:
+            checkMask = FULL_BITBOARD
+
+        pinMasks = {}
+        enemyRooks = bitboards[enemyColor + 'R'] | bitboards[enemyColor + 'Q']
+        enemyBishops = bitboards[enemyColor + 'B'] | bitboards[enemyColor + 'Q']
+        pinners = (slidingAttacks(kingSquare, enemies, ROOK_RAYS) & enemyRooks) | \
+                  (slidingAttacks(kingSquare, enemies, BISHOP_RAYS) & enemyBishops)
+        while pinners:
+            lowestBit = pinners & -pinners
+            squaresInBetween = BETWEEN[kingSquare * 64 + lowestBit.bit_length() - 1]
+            blockers = squaresInBetween & occupancy
+            if blockers and (blockers & (blockers - 1) == 0) and (blockers & allies):
+                pinMasks[blockers.bit_length() - 1] = squaresInBetween | lowestBit
+            pinners ^= lowestBit
+        return kingSquare, checkers, checkMask, pinMasks
+
+
+    # Getting the legal captures and promotions (en passant included) set-wise, for the staged move generation
+    def getCaptureMoves(self, pinsAndChecks=None):
+        return self.getBitboardMoves(pinsAndChecks or self.getPinsAndChecks(), True, False)
+
+
+    # Getting the legal moves that neither capture nor promote
+    def getQuietMoves(self, pinsAndChecks=None):
+        return self.getBitboardMoves(pinsAndChecks or self.getPinsAndChecks(), False, True)
+
+
+    # Getting the legal move with the given ID, or None, generating the moves of its piece only
+    def getLegalMove(self, moveID, pinsAndChecks=None):
+        startingSquare = moveID & 63
+        if not self.occupancy['w' if self.whiteToMove else 'b'] >> startingSquare & 1:
+            return None
+        for move in self.getBitboardMoves(pinsAndChecks or self.getPinsAndChecks(), True, True, 1 << startingSquare):
+            if move.moveID == moveID:
+                return move
+        return None
+
+
+    # Generating the legal moves of the pieces on pieceMask : the captures and promotions, the quiet moves or both
+    def getBitboardMoves(self, pinsAndChecks, captures, quiets, pieceMask=FULL_BITBOARD):
+        board, bitboards = self.board, self.bitboards
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        allies, enemies = self.occupancy[allyColor], self.occupancy[enemyColor]
+        occupancy = allies | enemies
+        empty = FULL_BITBOARD ^ occupancy
+        kingSquare, checkers, checkMask, pinMasks = pinsAndChecks
+        # The squares the pieces may move to in this stage
+        stageMask = (enemies if captures else 0) | (empty if quiets else 0)
+        moves = []
+
+        # King moves are checked against the enemy attacks with the king lifted from the board
+        if pieceMask >> kingSquare & 1:
+            kingCoordinates = SQUARE_COORDINATES[kingSquare]
+            occupancyWithoutKing = occupancy ^ (1 << kingSquare)
+            targets = KING_ATTACKS[kingSquare] & stageMask
+            while targets:
+                lowestBit = targets & -targets
+                target = lowestBit.bit_length() - 1
+                if not self.attackersBitboard(target, enemyColor, occupancyWithoutKing):
+                    endingSquare = SQUARE_COORDINATES[target]
+                    moves.append(Move(kingCoordinates, endingSquare, movedPiece=allyColor + 'K',
+                                      capturedPiece=board[endingSquare[0]][endingSquare[1]]))
+                targets ^= lowestBit
+
+        # Double check : only the king can move
+        if checkers & (checkers - 1) == 0:
+            targetMask = stageMask & checkMask
+            self.getPieceMoves(bitboards[allyColor + 'N'] & pieceMask, KNIGHT_ATTACKS, None, 0, targetMask, pinMasks, moves)
+            self.getPieceMoves((bitboards[allyColor + 'B'] | bitboards[allyColor + 'Q']) & pieceMask, None, BISHOP_RAYS, occupancy,
+                               targetMask, pinMasks, moves)
+            self.getPieceMoves((bitboards[allyColor + 'R'] | bitboards[allyColor + 'Q']) & pieceMask, None, ROOK_RAYS, occupancy,
+                               targetMask, pinMasks, moves)
+            self.getPawnBitboardMoves(allyColor, enemies, empty, checkMask, pinMasks, moves, captures, quiets, pieceMask)
+            if captures:
+                self.getEnPassantBitboardMoves(allyColor, enemyColor, kingSquare, occupancy, moves, pieceMask)
+        return moves
+
+
+    # Getting the moves of knights (stepAttacks) or sliders (rays) standing on the squares of pieces
+    def getPieceMoves(self, pieces, stepAttacks, rays, occupancy, targetMask, pinMasks, moves):
+        board = self.board
+        while pieces:
+            lowestBit = pieces & -pieces
+            square = lowestBit.bit_length() - 1
+            pieces ^= lowestBit
+            if stepAttacks is not None:
+                # A pinned knight can never move
+                if square in pinMasks:
+                    continue
+                targets = stepAttacks[square] & targetMask
+            else:
+                targets = slidingAttacks(square, occupancy, rays) & targetMask & pinMasks.get(square, FULL_BITBOARD)
+            start = SQUARE_COORDINATES[square]
+            piece = board[start[0]][start[1]]
+            while targets:
+                lowestBit = targets & -targets
+                endingSquare = SQUARE_COORDINATES[lowestBit.bit_length() - 1]
+                moves.append(Move(start, endingSquare, movedPiece=piece, capturedPiece=board[endingSquare[0]][endingSquare[1]]))
+                targets ^= lowestBit
+
+
+    # Getting the pawn pushes and captures of the whole pawn set at once
+    # captures : the captures and the promotions, quiets : the pushes that do not promote
+    def getPawnBitboardMoves(self, allyColor, enemies, empty, checkMask, pinMasks, moves, captures=True, quiets=True,
+                             pieceMask=FULL_BITBOARD):
+        pawns = self.bitboards[allyColor + 'p'] & pieceMask
+        # Each set holds the ending squares, paired with the offset back to the starting square
+        if allyColor == 'w':
+            singlePushes = (pawns >> 8) & empty
+            pushMask = (PROMOTION_ROWS if captures else 0) | (~PROMOTION_ROWS if quiets else 0)
+            targetSets = [
+                (singlePushes & checkMask & pushMask, 8),
+                (((singlePushes & WHITE_DOUBLE_PUSH_ROW) >> 8) & empty & checkMask if quiets else 0, 16),
+            ]
+            if captures:
+                targetSets += [
+                    (((pawns & ~FILE_A) >> 9) & enemies & checkMask, 9),
+                    (((pawns & ~FILE_H) >> 7) & enemies & checkMask, 7),
+                ]
+        else:
+            singlePushes = (pawns << 8) & empty
+            pushMask = (PROMOTION_ROWS if captures else 0) | (~PROMOTION_ROWS if quiets else 0)
+            targetSets = [
+                (singlePushes & checkMask & pushMask, -8),
+                (((singlePushes & BLACK_DOUBLE_PUSH_ROW) << 8) & empty & checkMask if quiets else 0, -16),
+            ]
+            if captures:
+                targetSets += [
+                    (((pawns & ~FILE_A) << 7) & enemies & checkMask, -7),
+                    (((pawns & ~FILE_H) << 9) & enemies & checkMask, -9),
+                ]
+
+        for targets, offset in targetSets:
+            while targets:
+                lowestBit = targets & -targets
+                target = lowestBit.bit_length() - 1
+                targets ^= lowestBit
+                start = target + offset
+                if (start in pinMasks) and not (pinMasks[start] & lowestBit):
+                    continue
+                self.addPawnMove(SQUARE_COORDINATES[start], SQUARE_COORDINATES[target], moves)
+
+
+    # Getting the en passant captures, verified by removing both pawns from the occupancy
+    def getEnPassantBitboardMoves(self, allyColor, enemyColor, kingSquare, occupancy, moves, pieceMask=FULL_BITBOARD):
+        if self.possibleEnPassant == ():
+            return
+        enPassantRow, enPassantCol = self.possibleEnPassant
+        # The capturing pawns are found by looking at the en passant square as an enemy pawn would
+        capturers = PAWN_ATTACKS[enemyColor][enPassantRow * 8 + enPassantCol] & self.bitboards[allyColor + 'p'] & pieceMask
+        while capturers:
+            lowestBit = capturers & -capturers
+            capturers ^= lowestBit
+            move = Move(SQUARE_COORDINATES[lowestBit.bit_length() - 1], self.possibleEnPassant, isEnPassantMove=True,
+                        movedPiece=allyColor + 'p')
+            if self.isEnPassantMoveSafe(move):
+                moves.append(move)
+
+
+    # The mailbox versions lift pieces from the board only, the attacks are computed here from the moved occupancy
+    def isKingMoveSafe(self, move):
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        occupancy = (self.occupancy['w'] | self.occupancy['b']) ^ (1 << (move.startingRow * 8 + move.startingColumn))
+        return not self.attackersBitboard(move.endingRow * 8 + move.endingColumn, enemyColor, occupancy)
+
+
+    def isEnPassantMoveSafe(self, move):
+        bitboards = self.bitboards
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        kingSquare = bitboards[allyColor + 'K'].bit_length() - 1
+        capturedBit = 1 << (move.startingRow * 8 + move.endingColumn)
+        resultingOccupancy = ((self.occupancy['w'] | self.occupancy['b']) ^ (1 << (move.startingRow * 8 + move.startingColumn))
+                              ^ capturedBit) | (1 << (move.endingRow * 8 + move.endingColumn))
+        enemyRooks = bitboards[enemyColor + 'R'] | bitboards[enemyColor + 'Q']
+        enemyBishops = bitboards[enemyColor + 'B'] | bitboards[enemyColor + 'Q']
+        return not ((KNIGHT_ATTACKS[kingSquare] & bitboards[enemyColor + 'N']) or
+                    (PAWN_ATTACKS[allyColor][kingSquare] & bitboards[enemyColor + 'p'] & ~capturedBit) or
+                    (slidingAttacks(kingSquare, resultingOccupancy, ROOK_RAYS) & enemyRooks) or
+                    (slidingAttacks(kingSquare, resultingOccupancy, BISHOP_RAYS) & enemyBishops))
+
+
+# Walking two game states of different backends in lockstep and collecting the move sequences after which
+# their valid moves differ
+def crossCheck(firstState, secondState, depth, path=None):
+    path = [] if path is None else path
+    firstMoves = firstState.getValidMoves()
+    secondMoves = secondState.getValidMoves()
+    firstIDs = sorted(move.moveID for move in firstMoves)
+    if firstIDs != sorted(move.moveID for move in secondMoves):
+        return [list(path)]
+
+    mismatches = []
+    if depth > 1:
+        for move in firstMoves:
+            secondMove = secondMoves[secondMoves.index(move)]
+            firstState.makeMove(move)
+            secondState.makeMove(secondMove)
+            path.append(move)
+            mismatches += crossCheck(firstState, secondState, depth - 1, path)
+            path.pop()
+            secondState.undoMove()
+            firstState.undoMove()
+    return mismatches
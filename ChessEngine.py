@@ -1,5 +1,81 @@
+from array import array
+import random
+
+from Evaluation import computeEvaluationTerms, getMoveEvaluationDelta
+
+# Directions and offsets used by the move generators (row, col)
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+SLIDING_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KNIGHT_OFFSETS = ((1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+# Getting the (row, col) squares reached from every square (row * 8 + col) with the given offsets, off-board ones left out
+def buildStepTargets(offsets):
+    return tuple(tuple((row + rowOffset, col + colOffset) for rowOffset, colOffset in offsets
+                       if (0 <= row + rowOffset <= 7) and (0 <= col + colOffset <= 7))
+                 for row in range(8) for col in range(8))
+
+
+# Getting the rays of every square as ((rowDirection, colDirection), squares ordered outward), empty rays left out
+def buildRays(directions):
+    rays = []
+    for row in range(8):
+        for col in range(8):
+            squareRays = []
+            for rowDirection, colDirection in directions:
+                ray = []
+                r, c = row + rowDirection, col + colDirection
+                while (0 <= r <= 7) and (0 <= c <= 7):
+                    ray.append((r, c))
+                    r, c = r + rowDirection, c + colDirection
+                if ray:
+                    squareRays.append(((rowDirection, colDirection), tuple(ray)))
+            rays.append(tuple(squareRays))
+    return tuple(rays)
+
+
+# Building every precomputed move table (run once at import, about 1 ms)
+def buildMoveTables():
+    rookRays, bishopRays = buildRays(ROOK_DIRECTIONS), buildRays(BISHOP_DIRECTIONS)
+    return {
+        "knightTargets": buildStepTargets(KNIGHT_OFFSETS),
+        "kingTargets": buildStepTargets(KING_OFFSETS),
+        # Squares attacked by a pawn of each color standing on the square
+        "pawnAttacks": {'w': buildStepTargets(((-1, -1), (-1, 1))), 'b': buildStepTargets(((1, -1), (1, 1)))},
+        "rookRays": rookRays,
+        "bishopRays": bishopRays,
+        # Rays of both kinds with the piece types attacking along them, for the attack checks
+        "sliderRays": tuple(tuple((ray, "RQ") for _, ray in rookRays[square]) + tuple((ray, "BQ") for _, ray in bishopRays[square])
+                            for square in range(64)),
+    }
+
+
+MOVE_TABLES = buildMoveTables()
+KNIGHT_TARGETS = MOVE_TABLES["knightTargets"]
+KING_TARGETS = MOVE_TABLES["kingTargets"]
+PAWN_ATTACKS = MOVE_TABLES["pawnAttacks"]
+ROOK_SQUARE_RAYS = MOVE_TABLES["rookRays"]
+BISHOP_SQUARE_RAYS = MOVE_TABLES["bishopRays"]
+SLIDER_SQUARE_RAYS = MOVE_TABLES["sliderRays"]
+# Ray tables walked by every kind of sliding piece
+SLIDER_TABLES = {'R': (ROOK_SQUARE_RAYS,), 'B': (BISHOP_SQUARE_RAYS,), 'Q': (ROOK_SQUARE_RAYS, BISHOP_SQUARE_RAYS)}
+
+# Zobrist keys : one random 64-bit number per (piece, square), en passant file and side to move
+# A fixed seed keeps the keys identical between runs and processes
+zobristRandom = random.Random(20240607)
+ZOBRIST_PIECES = {color + piece: [zobristRandom.getrandbits(64) for _ in range(64)] for color in "wb" for piece in "pRNBQK"}
+ZOBRIST_EN_PASSANT = [zobristRandom.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+
+# Plies without a capture or a pawn move after which the game is drawn (fifty moves by each player)
+FIFTY_MOVE_PLIES = 100
+
+
 class GameState:
-    def __init__(self):
+    # The game starts from the standard initial position, or from the given FEN
+    def __init__(self, fen=None):
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
@@ -18,13 +94,33 @@ class GameState:
         self.blackKingLocation = (0, 4)
         self.checkmate = False
         self.stalemate = False
+        # Draw by the rules ("threefold repetition" or "fifty-move rule"), set by getValidMoves like checkmate / stalemate
+        self.draw = False
+        self.drawReason = ''
+        # Plies since the last capture or pawn move, saved before every move so undoMove can restore it
+        self.halfmoveClock = 0
+        self.halfmoveClockLog = []
         self.possibleEnPassant = ()
+        self.enPassantLog = []
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = []
+        # Material and piece-square terms of the evaluation, kept up to date by makeMove / undoMove
+        self.middlegameScore, self.endgameScore, self.phase = computeEvaluationTerms(self.board)
+        self.evaluationLog = []
+        # Pinned pieces of the player to move : {(row, col): (rowDirection, colDirection)}
+        self.pins = {}
+        # Number of plies played before the first position of the game, read from the FEN full move number
+        self.startingPly = 0
+        if fen is not None:
+            self.loadFen(fen)
 
 
     def makeMove(self, move, isPawnPromotion = False, toPromoteToPiece = ''):
-        if isPawnPromotion:
+        self.updateZobristKeyBeforeMove(move, toPromoteToPiece if isPawnPromotion else move.promotionPiece)
+        self.updateEvaluationBeforeMove(move, toPromoteToPiece if isPawnPromotion else move.promotionPiece)
+        if isPawnPromotion or move.promotionPiece:
             self.board[move.startingRow][move.startingColumn] = "--"
-            self.board[move.endingRow][move.endingColumn] = toPromoteToPiece
+            self.board[move.endingRow][move.endingColumn] = toPromoteToPiece if isPawnPromotion else move.promotionPiece
         else:
             # Making changes on the board
             self.board[move.startingRow][move.startingColumn] = "--"
@@ -40,6 +136,7 @@ class GameState:
 
 
         # Updating the possible en passant variable
+        self.enPassantLog.append(self.possibleEnPassant)
         if (move.movedPiece[1] == 'p') and (abs(move.startingRow - move.endingRow) == 2):
             # Coordinates of the square of the possible en passant capture
             enPassantRow = (move.startingRow + move.endingRow) // 2
@@ -52,6 +149,8 @@ class GameState:
         self.moveLog.append(move)
         # Swapping between players
         self.whiteToMove = not self.whiteToMove
+        self.updateHalfmoveClock(move)
+        self.updateZobristKeyAfterMove()
 
 
     def undoMove(self):
@@ -72,42 +171,416 @@ class GameState:
             if move.isEnPassantMove:
                 self.board[move.endingRow][move.endingColumn] = "--"
                 self.board[move.startingRow][move.endingColumn] = move.capturedPiece
-                self.possibleEnPassant = (move.endingRow, move.endingColumn)
 
-            # Undoing a 2-square pawn advance
-            if (abs(move.startingRow - move.endingRow) == 2) and (move.movedPiece[1] == 'p'):
-                self.possibleEnPassant = ()
+            # Restoring the en passant square and the key of the previous position
+            self.possibleEnPassant = self.enPassantLog.pop()
+            self.zobristKey = self.zobristLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog.pop()
+            self.middlegameScore, self.endgameScore, self.phase = self.evaluationLog.pop()
             # Swapping back turns
             self.whiteToMove = not self.whiteToMove
 
 
+    # Loading a position from a FEN string
+    # Castling rights are ignored (castling is not implemented)
+    def loadFen(self, fen):
+        fields = fen.split()
+        rows = fields[0].split('/') if fields else []
+        if len(rows) != 8:
+            raise ValueError(f"Invalid FEN, expected 8 rows : {fen}")
+
+        board = []
+        kingLocations = {}
+        for r, rowText in enumerate(rows):
+            row = []
+            for char in rowText:
+                if char.isdigit():
+                    row += ["--"] * int(char)
+                elif char.upper() in "PRNBQK":
+                    color, piece = ('w' if char.isupper() else 'b'), char.upper()
+                    # A pawn on the first or last rank has no moves the generator could make
+                    if piece == 'P' and r in (0, 7):
+                        raise ValueError(f"Invalid FEN, pawn on the first or last rank : {fen}")
+                    if piece == 'K':
+                        kingLocations[color] = (r, len(row))
+                    row.append(color + ('p' if piece == 'P' else piece))
+                else:
+                    raise ValueError(f"Invalid FEN piece '{char}' : {fen}")
+            if len(row) != 8:
+                raise ValueError(f"Invalid FEN, row {r + 1} does not have 8 squares : {fen}")
+            board.append(row)
+        if len(kingLocations) != 2:
+            raise ValueError(f"Invalid FEN, both kings are needed : {fen}")
+
+        sideToMove = fields[1] if len(fields) > 1 else 'w'
+        if sideToMove not in ('w', 'b'):
+            raise ValueError(f"Invalid FEN side to move '{sideToMove}' : {fen}")
+        enPassant = fields[3] if len(fields) > 3 else '-'
+        if enPassant != '-' and (len(enPassant) != 2 or enPassant[0] not in Move.filesToCols or enPassant[1] not in "36"):
+            raise ValueError(f"Invalid FEN en passant square '{enPassant}' : {fen}")
+        halfmoveClock = fields[4] if len(fields) > 4 else '0'
+        if not halfmoveClock.isdigit():
+            raise ValueError(f"Invalid FEN halfmove clock '{halfmoveClock}' : {fen}")
+        fullMoveNumber = fields[5] if len(fields) > 5 else '1'
+        if not fullMoveNumber.isdigit() or int(fullMoveNumber) < 1:
+            raise ValueError(f"Invalid FEN full move number '{fullMoveNumber}' : {fen}")
+
+        self.board = board
+        self.whiteKingLocation, self.blackKingLocation = kingLocations['w'], kingLocations['b']
+        self.whiteToMove = sideToMove == 'w'
+        self.startingPly = 2 * (int(fullMoveNumber) - 1) + (0 if self.whiteToMove else 1)
+        self.possibleEnPassant = () if enPassant == '-' else (Move.ranksToRows[enPassant[1]], Move.filesToCols[enPassant[0]])
+        self.moveLog = []
+        self.enPassantLog = []
+        self.zobristLog = []
+        self.evaluationLog = []
+        self.checkmate, self.stalemate = False, False
+        self.draw, self.drawReason = False, ''
+        self.halfmoveClock = int(halfmoveClock)
+        self.halfmoveClockLog = []
+        self.zobristKey = self.computeZobristKey()
+        self.middlegameScore, self.endgameScore, self.phase = computeEvaluationTerms(self.board)
+
+
+    # Writing the position as a FEN string
+    # The engine does not castle, so the castling field is always '-'
+    def getFen(self):
+        rows = []
+        for row in self.board:
+            rowText, emptySquares = "", 0
+            for piece in row:
+                if piece == "--":
+                    emptySquares += 1
+                    continue
+                if emptySquares:
+                    rowText += str(emptySquares)
+                    emptySquares = 0
+                rowText += piece[1].upper() if piece[0] == 'w' else piece[1].lower()
+            rows.append(rowText + (str(emptySquares) if emptySquares else ""))
+
+        enPassant = '-'
+        if self.possibleEnPassant != ():
+            enPassant = Move.colsToFiles[self.possibleEnPassant[1]] + Move.rowsToRanks[self.possibleEnPassant[0]]
+        fullMoveNumber = (self.startingPly + len(self.moveLog)) // 2 + 1
+        return f"{'/'.join(rows)} {'w' if self.whiteToMove else 'b'} - {enPassant} {self.halfmoveClock} {fullMoveNumber}"
+
+
+    # Writing a valid move in standard algebraic notation (e.g. Nbd7, exd6, e8=Q+, Qh4#)
+    # The moves of the position can be given when they are already known, to avoid generating them again
+    def getSanNotation(self, move, validMoves=None):
+        if validMoves is None:
+            validMoves = self.getValidMoves()
+        piece = move.movedPiece[1]
+        destination = move.getRankFile(move.endingRow, move.endingColumn)
+        if piece == 'p':
+            san = (move.colsToFiles[move.startingColumn] + 'x' if move.capturedPiece != "--" else "") + destination + move.getPromotionSuffix()
+        else:
+            # Disambiguating between the pieces of the same kind going to the same square, by file first then by rank
+            rivals = [other for other in validMoves if other.movedPiece == move.movedPiece and other.moveID != move.moveID
+                      and (other.endingRow, other.endingColumn) == (move.endingRow, move.endingColumn)]
+            disambiguation = ""
+            if rivals:
+                if all(other.startingColumn != move.startingColumn for other in rivals):
+                    disambiguation = move.colsToFiles[move.startingColumn]
+                elif all(other.startingRow != move.startingRow for other in rivals):
+                    disambiguation = move.rowsToRanks[move.startingRow]
+                else:
+                    disambiguation = move.getRankFile(move.startingRow, move.startingColumn)
+            san = piece + disambiguation + ('x' if move.capturedPiece != "--" else "") + destination
+
+        # Playing the move to know if it gives check or checkmate, the end of game flags are left as they were
+        endFlags = (self.checkmate, self.stalemate, self.draw, self.drawReason)
+        self.makeMove(move)
+        if self.isInCheck():
+            san += '#' if not self.getValidMoves() else '+'
+        self.undoMove()
+        self.checkmate, self.stalemate, self.draw, self.drawReason = endFlags
+        return san
+
+
+    # Finding the valid move written in standard algebraic notation, None when the notation does not match
+    # exactly one valid move (castling, which the engine does not play, is never found)
+    def parseSan(self, san, validMoves=None):
+        san = san.strip().rstrip("+#!?")
+        if len(san) < 2 or san.startswith("O-O") or san.startswith("0-0"):
+            return None
+        if validMoves is None:
+            validMoves = self.getValidMoves()
+
+        promotionType = ''
+        if san[-1].upper() in "QRBN" and san[-2:-1] in ('=', '1', '8'):
+            promotionType = san[-1].upper()
+            san = san[:-2] if san[-2] == '=' else san[:-1]
+        piece = san[0] if san[0] in "RNBQK" else 'p'
+        destination = san[-2:]
+        if destination[0] not in Move.filesToCols or destination[1] not in Move.ranksToRows:
+            return None
+        endingSquare = (Move.ranksToRows[destination[1]], Move.filesToCols[destination[0]])
+        disambiguation = san[(1 if piece != 'p' else 0):-2].replace('x', '')
+
+        matches = []
+        for move in validMoves:
+            if move.movedPiece[1] != piece or (move.endingRow, move.endingColumn) != endingSquare \
+               or move.promotionPiece[1:] != promotionType:
+                continue
+            if any(char != (move.colsToFiles[move.startingColumn] if char in Move.filesToCols else move.rowsToRanks[move.startingRow])
+                   for char in disambiguation):
+                continue
+            matches.append(move)
+        return matches[0] if len(matches) == 1 else None
+
+
+    # Saving the halfmove clock and counting the move, a capture or a pawn move starting it again
+    def updateHalfmoveClock(self, move):
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if move.movedPiece[1] == 'p' or move.capturedPiece != "--":
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+
+
+    # Counting the earlier occurrences of the position in the game, from the key history (zobristLog)
+    # Only the positions since the last capture or pawn move can be the same, and only one in two has the same player
+    # to move, so at most halfmoveClock / 2 keys are compared. The scan stops once maxCount occurrences are found
+    def getRepetitionCount(self, maxCount=None):
+        zobristLog, key = self.zobristLog, self.zobristKey
+        oldest = max(0, len(zobristLog) - self.halfmoveClock)
+        count = 0
+        for i in range(len(zobristLog) - 2, oldest - 1, -2):
+            if zobristLog[i] == key:
+                count += 1
+                if count == maxCount:
+                    break
+        return count
+
+
+    # Checking if the position already occurred in the game (used by the search, which scores a repetition as a draw)
+    def isRepetition(self):
+        return self.getRepetitionCount(1) > 0
+
+
+    # Setting the draw flags of the position (a checkmate on the last move of the fifty still wins)
+    def updateDrawStatus(self):
+        if self.checkmate:
+            self.draw, self.drawReason = False, ''
+        elif self.halfmoveClock >= FIFTY_MOVE_PLIES:
+            self.draw, self.drawReason = True, "fifty-move rule"
+        elif self.halfmoveClock >= 4 and self.getRepetitionCount(2) >= 2:
+            self.draw, self.drawReason = True, "threefold repetition"
+        else:
+            self.draw, self.drawReason = False, ''
+
+
+    # Computing the Zobrist key of the position from scratch (used to validate the incremental key)
+    def computeZobristKey(self):
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][row * 8 + col]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ self.getEnPassantZobrist()
+
+
+    # Getting the en passant part of the key, which only counts when a pawn of the player to move stands
+    # next to the pawn that just advanced two squares (so the capture is at least pseudo-legal)
+    def getEnPassantZobrist(self):
+        if self.possibleEnPassant == ():
+            return 0
+        enPassantRow, enPassantCol = self.possibleEnPassant
+        pawnRow = enPassantRow + 1 if self.whiteToMove else enPassantRow - 1
+        capturingPawn = 'wp' if self.whiteToMove else 'bp'
+        for col in (enPassantCol - 1, enPassantCol + 1):
+            if (0 <= col <= 7) and self.board[pawnRow][col] == capturingPawn:
+                return ZOBRIST_EN_PASSANT[enPassantCol]
+        return 0
+
+
+    # Removing the en passant part of the key and applying the piece changes of the move (before the board changes)
+    def updateZobristKeyBeforeMove(self, move, promotionPiece):
+        self.zobristLog.append(self.zobristKey)
+        key = self.zobristKey ^ self.getEnPassantZobrist()
+        key ^= ZOBRIST_PIECES[move.movedPiece][move.startingRow * 8 + move.startingColumn]
+        key ^= ZOBRIST_PIECES[promotionPiece or move.movedPiece][move.endingRow * 8 + move.endingColumn]
+        if move.capturedPiece != "--":
+            capturedRow = move.startingRow if move.isEnPassantMove else move.endingRow
+            key ^= ZOBRIST_PIECES[move.capturedPiece][capturedRow * 8 + move.endingColumn]
+        self.zobristKey = key
+
+
+    # Applying the material and piece-square changes of the move to the evaluation terms (before the board changes)
+    def updateEvaluationBeforeMove(self, move, promotionPiece):
+        self.evaluationLog.append((self.middlegameScore, self.endgameScore, self.phase))
+        middlegameDelta, endgameDelta, phaseDelta = getMoveEvaluationDelta(move, promotionPiece or move.movedPiece)
+        self.middlegameScore += middlegameDelta
+        self.endgameScore += endgameDelta
+        self.phase += phaseDelta
+
+
+    # Swapping the side to move and adding the new en passant part of the key (after the board changes)
+    def updateZobristKeyAfterMove(self):
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE ^ self.getEnPassantZobrist()
+
+
     # Getting all the valid moves considering checks
+    # Checks and pins are computed once, so every generated move is legal without having to make / undo it
     def getValidMoves(self):
-        tempPossibleEnPassant = self.possibleEnPassant
-        moves = self.getAllPossibleMoves()
-
-        for i in range(len(moves) - 1, -1, -1):
-            self.makeMove(moves[i])
-            # makeMove switches turns, so we have to switch them back to see if that move made the king vulnerable
-            self.whiteToMove = not self.whiteToMove
-            if self.isInCheck():
-                moves.remove(moves[i])
-            # Reverting back into the initial conditions
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
+        inCheck, self.pins, checks = self.checkForPinsAndChecks()
+        pseudoLegalMoves = self.getAllPossibleMoves()
+        self.pins = {}
+        moves = self.filterLegalMoves(pseudoLegalMoves, checks)
 
         # Checking for the edge cases (Checkmate or Stalemate)
         if len(moves) == 0:
-            if self.isInCheck():
+            if inCheck:
                 self.checkmate = True
             else:
                 self.stalemate = True
         else:
             self.checkmate, self.stalemate = False, False
+        self.updateDrawStatus()
 
-        self.possibleEnPassant = tempPossibleEnPassant
         return moves
 
+
+    # Getting the pins and checks the staged generation of a node shares between its stages
+    # (the result of checkForPinsAndChecks here, the bitboard backend has its own)
+    def getPinsAndChecks(self):
+        return self.checkForPinsAndChecks()
+
+
+    # Getting the legal captures and promotions (en passant included), without touching the checkmate / stalemate flags
+    # pinsAndChecks is the result of getPinsAndChecks() for the position, when the caller already has it
+    def getCaptureMoves(self, pinsAndChecks=None):
+        return self.getLegalSubset(self.getAllPossibleCaptures, pinsAndChecks)
+
+
+    # Getting the legal moves that neither capture nor promote
+    def getQuietMoves(self, pinsAndChecks=None):
+        return self.getLegalSubset(self.getAllPossibleQuiets, pinsAndChecks)
+
+
+    def getLegalSubset(self, generator, pinsAndChecks):
+        _, self.pins, checks = pinsAndChecks or self.checkForPinsAndChecks()
+        pseudoLegalMoves = generator()
+        self.pins = {}
+        return self.filterLegalMoves(pseudoLegalMoves, checks)
+
+
+    # Getting the legal move with the given ID, or None, generating the moves of its piece only
+    # (used to check a hash or killer move before the moves of the position are generated)
+    def getLegalMove(self, moveID, pinsAndChecks=None):
+        startingRow, startingColumn = divmod(moveID & 63, 8)
+        piece = self.board[startingRow][startingColumn]
+        if piece == "--" or piece[0] != ('w' if self.whiteToMove else 'b'):
+            return None
+        _, self.pins, checks = pinsAndChecks or self.checkForPinsAndChecks()
+        pieceMoves = []
+        self.moveFunctions[piece[1]](startingRow, startingColumn, pieceMoves)
+        self.pins = {}
+        moves = self.filterLegalMoves([move for move in pieceMoves if move.moveID == moveID], checks)
+        return moves[0] if moves else None
+
+
+    # Keeping the pseudo-legal moves that do not leave the king in check, checks being given by checkForPinsAndChecks()
+    # The pins are already taken into account by the generators
+    def filterLegalMoves(self, pseudoLegalMoves, checks):
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+
+        # Squares a non-king piece can move to in order to capture or block a single checking piece
+        validSquares = None
+        if len(checks) == 1:
+            checkRow, checkCol, rowDirection, colDirection = checks[0]
+            if self.board[checkRow][checkCol][1] == 'N':
+                validSquares = {(checkRow, checkCol)}
+            else:
+                validSquares = set()
+                for i in range(1, 8):
+                    square = (kingRow + rowDirection * i, kingCol + colDirection * i)
+                    validSquares.add(square)
+                    if square == (checkRow, checkCol):
+                        break
+
+        moves = []
+        for move in pseudoLegalMoves:
+            if move.startingRow == kingRow and move.startingColumn == kingCol:
+                if self.isKingMoveSafe(move):
+                    moves.append(move)
+            elif len(checks) > 1:
+                # Double check : only the king can move
+                continue
+            elif move.isEnPassantMove:
+                # Removing two pawns from the same row can expose the king, so it is verified on the board
+                if self.isEnPassantMoveSafe(move):
+                    moves.append(move)
+            elif (validSquares is None) or ((move.endingRow, move.endingColumn) in validSquares):
+                moves.append(move)
+        return moves
+
+
+    # Getting the pins on the player's pieces and the checks on the player's king
+    # Returns (inCheck, pins, checks) where pins maps a pinned square to the direction of its pin
+    # and checks holds (row, col, rowDirection, colDirection) for every checking piece
+    def checkForPinsAndChecks(self):
+        allyColor = 'w' if self.whiteToMove else 'b'
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        board = self.board
+        pins = {}
+
+        # Looking outward from the king for an allied piece followed by an enemy slider on the same ray
+        for squareRays, sliders in ((ROOK_SQUARE_RAYS, "RQ"), (BISHOP_SQUARE_RAYS, "BQ")):
+            for direction, ray in squareRays[kingRow * 8 + kingCol]:
+                possiblePin = None
+                for row, col in ray:
+                    piece = board[row][col]
+                    if piece != "--":
+                        if piece[0] == allyColor:
+                            if possiblePin is not None:
+                                # Two allied pieces in a row : no pin in this direction
+                                break
+                            possiblePin = (row, col)
+                        else:
+                            if (possiblePin is not None) and (piece[1] in sliders):
+                                pins[possiblePin] = direction
+                            break
+
+        checks = []
+        for checkRow, checkCol in self.getAttackers(kingRow, kingCol):
+            rowDirection, colDirection = checkRow - kingRow, checkCol - kingCol
+            if self.board[checkRow][checkCol][1] != 'N':
+                # Reducing the offset of a sliding piece (or pawn) to the unit direction of its ray
+                rowDirection = (rowDirection > 0) - (rowDirection < 0)
+                colDirection = (colDirection > 0) - (colDirection < 0)
+            checks.append((checkRow, checkCol, rowDirection, colDirection))
+
+        return len(checks) > 0, pins, checks
+
+
+    # Checking if the king would still be attacked after playing the given king move
+    def isKingMoveSafe(self, move):
+        # The king is lifted from the board so it cannot shield its target square from a slider
+        self.board[move.startingRow][move.startingColumn] = "--"
+        isSafe = not self.isUnderAttack(move.endingRow, move.endingColumn)
+        self.board[move.startingRow][move.startingColumn] = move.movedPiece
+        return isSafe
+
+
+    # Checking if the king would still be attacked after playing the given en passant move
+    def isEnPassantMoveSafe(self, move):
+        self.board[move.startingRow][move.startingColumn] = "--"
+        self.board[move.startingRow][move.endingColumn] = "--"
+        self.board[move.endingRow][move.endingColumn] = move.movedPiece
+
+        isSafe = not self.isInCheck()
+
+        self.board[move.endingRow][move.endingColumn] = "--"
+        self.board[move.startingRow][move.endingColumn] = move.capturedPiece
+        self.board[move.startingRow][move.startingColumn] = move.movedPiece
+        return isSafe
+
+
     # Checking if player's king is in a check state
     def isInCheck(self):
         if self.whiteToMove:
@@ -120,17 +593,54 @@ class GameState:
 
     # Checking if the square (row, col) is under attack by any of the opponent's pieces
     def isUnderAttack(self, row, col) -> bool:
-        # Switching to the opponent
-        self.whiteToMove = not self.whiteToMove
-        # Generating all his possible moves
-        opponentMoves = self.getAllPossibleMoves()
-        # Before checking, the player's turn should be reverted back
-        self.whiteToMove = not self.whiteToMove
-        for move in opponentMoves:
-            if (move.endingRow == row) and (move.endingColumn == col):
-                return True
-
-        return False
+        return len(self.getAttackers(row, col, stopAtFirst=True)) > 0
+
+
+    # Getting the squares of all the pieces of attackerColor (the opponent by default) attacking (row, col)
+    # The search looks outward from the target square, so no move is generated and the turn is left untouched
+    def getAttackers(self, row, col, attackerColor=None, stopAtFirst=False):
+        if attackerColor is None:
+            attackerColor = 'b' if self.whiteToMove else 'w'
+        board = self.board
+        square = row * 8 + col
+        attackers = []
+
+        # Knights
+        knight = attackerColor + 'N'
+        for r, c in KNIGHT_TARGETS[square]:
+            if board[r][c] == knight:
+                attackers.append((r, c))
+                if stopAtFirst:
+                    return attackers
+
+        # Pawns : they stand on the squares a pawn of the other color on the target square would attack
+        pawn = attackerColor + 'p'
+        for r, c in PAWN_ATTACKS['b' if attackerColor == 'w' else 'w'][square]:
+            if board[r][c] == pawn:
+                attackers.append((r, c))
+                if stopAtFirst:
+                    return attackers
+
+        # King
+        king = attackerColor + 'K'
+        for r, c in KING_TARGETS[square]:
+            if board[r][c] == king:
+                attackers.append((r, c))
+                if stopAtFirst:
+                    return attackers
+
+        # Sliding pieces : the first piece met on each ray is the only one that can attack along it
+        for ray, sliders in SLIDER_SQUARE_RAYS[square]:
+            for r, c in ray:
+                piece = board[r][c]
+                if piece != "--":
+                    if piece[0] == attackerColor and piece[1] in sliders:
+                        attackers.append((r, c))
+                        if stopAtFirst:
+                            return attackers
+                    break
+
+        return attackers
 
 
     # Getting all the possible moves without considering checks
@@ -147,171 +657,206 @@ class GameState:
         return moves
 
 
+    # Getting the pseudo-legal captures and promotions only, for the staged move generation
+    def getAllPossibleCaptures(self):
+        board = self.board
+        allyColor, enemyColor = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        moves = []
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != allyColor:
+                    continue
+                kind = piece[1]
+                if kind == 'p':
+                    self.getPawnCaptures(r, c, moves)
+                elif kind in "NK":
+                    if kind == 'N' and (r, c) in self.pins:
+                        continue
+                    for target in (KNIGHT_TARGETS if kind == 'N' else KING_TARGETS)[r * 8 + c]:
+                        targetPiece = board[target[0]][target[1]]
+                        if targetPiece[0] == enemyColor:
+                            moves.append(Move((r, c), target, movedPiece=piece, capturedPiece=targetPiece))
+                else:
+                    isPinned = (r, c) in self.pins
+                    for squareRays in SLIDER_TABLES[kind]:
+                        for (rowDirection, colDirection), ray in squareRays[r * 8 + c]:
+                            if isPinned and not self.isMoveAlongPin(r, c, rowDirection, colDirection):
+                                continue
+                            for target in ray:
+                                targetPiece = board[target[0]][target[1]]
+                                if targetPiece != "--":
+                                    if targetPiece[0] == enemyColor:
+                                        moves.append(Move((r, c), target, movedPiece=piece, capturedPiece=targetPiece))
+                                    break
+        return moves
+
+
+    # Getting the pseudo-legal moves that neither capture nor promote, for the staged move generation
+    def getAllPossibleQuiets(self):
+        board = self.board
+        allyColor = 'w' if self.whiteToMove else 'b'
+        moves = []
+        for r in range(8):
+            for c in range(8):
+                piece = board[r][c]
+                if piece[0] != allyColor:
+                    continue
+                kind = piece[1]
+                if kind == 'p':
+                    self.getPawnQuiets(r, c, moves)
+                elif kind in "NK":
+                    if kind == 'N' and (r, c) in self.pins:
+                        continue
+                    for target in (KNIGHT_TARGETS if kind == 'N' else KING_TARGETS)[r * 8 + c]:
+                        if board[target[0]][target[1]] == "--":
+                            moves.append(Move((r, c), target, movedPiece=piece))
+                else:
+                    isPinned = (r, c) in self.pins
+                    for squareRays in SLIDER_TABLES[kind]:
+                        for (rowDirection, colDirection), ray in squareRays[r * 8 + c]:
+                            if isPinned and not self.isMoveAlongPin(r, c, rowDirection, colDirection):
+                                continue
+                            for target in ray:
+                                if board[target[0]][target[1]] != "--":
+                                    break
+                                moves.append(Move((r, c), target, movedPiece=piece))
+        return moves
+
+
+    # Getting the captures (en passant included) and the promotions of a pawn
+    def getPawnCaptures(self, r, c, moves):
+        rowDirection, enemyColor, lastRow = (-1, 'b', 0) if self.whiteToMove else (1, 'w', 7)
+        if r + rowDirection == lastRow and self.board[r + rowDirection][c] == "--" and self.isMoveAlongPin(r, c, rowDirection, 0):
+            self.addPawnMove((r, c), (r + rowDirection, c), moves)
+        for colDirection in (-1, 1):
+            if 0 <= c + colDirection <= 7 and self.isMoveAlongPin(r, c, rowDirection, colDirection):
+                target = (r + rowDirection, c + colDirection)
+                if self.board[target[0]][target[1]][0] == enemyColor:
+                    self.addPawnMove((r, c), target, moves)
+                elif target == self.possibleEnPassant:
+                    moves.append(Move((r, c), target, isEnPassantMove=True, movedPiece=self.board[r][c]))
+
+
+    # Getting the pushes of a pawn that do not promote
+    def getPawnQuiets(self, r, c, moves):
+        rowDirection, startRow, lastRow = (-1, 6, 0) if self.whiteToMove else (1, 1, 7)
+        if r + rowDirection != lastRow and self.board[r + rowDirection][c] == "--" and self.isMoveAlongPin(r, c, rowDirection, 0):
+            piece = self.board[r][c]
+            moves.append(Move((r, c), (r + rowDirection, c), movedPiece=piece))
+            if r == startRow and self.board[r + 2 * rowDirection][c] == "--":
+                moves.append(Move((r, c), (r + 2 * rowDirection, c), movedPiece=piece))
+
+
+    # Checking if the piece on (r, c) can move in the given direction without breaking its pin
+    def isMoveAlongPin(self, r, c, rowDirection, colDirection):
+        pinDirection = self.pins.get((r, c))
+        if pinDirection is None:
+            return True
+        return pinDirection == (rowDirection, colDirection) or pinDirection == (-rowDirection, -colDirection)
+
+
+    # Adding a pawn move, which becomes one move per promotion piece when it reaches the last row
+    def addPawnMove(self, startingSquare, endingSquare, moves):
+        movedPiece = self.board[startingSquare[0]][startingSquare[1]]
+        capturedPiece = self.board[endingSquare[0]][endingSquare[1]]
+        if endingSquare[0] == 0 or endingSquare[0] == 7:
+            for promotionType in PROMOTION_TYPES[1:]:
+                moves.append(Move(startingSquare, endingSquare, promotionPiece=movedPiece[0] + promotionType,
+                                  movedPiece=movedPiece, capturedPiece=capturedPiece))
+        else:
+            moves.append(Move(startingSquare, endingSquare, movedPiece=movedPiece, capturedPiece=capturedPiece))
+
+
     # Getting all the possible moves for a pawn
     def getPawnMoves(self, r, c, moves):
         if self.whiteToMove:
-            if self.board[r - 1][c] == "--": # Advancing one square
-                moves.append(Move((r, c), (r - 1, c), self.board))
+            if self.board[r - 1][c] == "--" and self.isMoveAlongPin(r, c, -1, 0): # Advancing one square
+                self.addPawnMove((r, c), (r - 1, c), moves)
                 if (r == 6) and (self.board[r - 2][c] == "--"): # Advancing two squares
-                    moves.append(Move((r, c), (r - 2, c), self.board))
-            if (c - 1) >= 0: # Capturing to the left
+                    self.addPawnMove((r, c), (r - 2, c), moves)
+            if (c - 1) >= 0 and self.isMoveAlongPin(r, c, -1, -1): # Capturing to the left
                 if self.board[r - 1][c - 1][0] == 'b':
-                    moves.append(Move((r, c), (r - 1, c - 1), self.board))
+                    self.addPawnMove((r, c), (r - 1, c - 1), moves)
                 elif (r - 1, c - 1) == self.possibleEnPassant:
-                    moves.append(Move((r, c), (r - 1, c - 1), self.board, isEnPassantMove=True))
-            if (c + 1) <= 7: # Capturing to the right
+                    moves.append(Move((r, c), (r - 1, c - 1), isEnPassantMove=True, movedPiece="wp"))
+            if (c + 1) <= 7 and self.isMoveAlongPin(r, c, -1, 1): # Capturing to the right
                 if self.board[r - 1][c + 1][0] == 'b':
-                    moves.append(Move((r, c), (r - 1, c + 1), self.board))
+                    self.addPawnMove((r, c), (r - 1, c + 1), moves)
                 elif (r - 1, c + 1) == self.possibleEnPassant:
-                    moves.append(Move((r, c), (r - 1, c + 1), self.board, isEnPassantMove=True))
+                    moves.append(Move((r, c), (r - 1, c + 1), isEnPassantMove=True, movedPiece="wp"))
         else:
-            if self.board[r + 1][c] == "--": # Advancing one square
-                moves.append(Move((r, c), (r + 1, c), self.board))
+            if self.board[r + 1][c] == "--" and self.isMoveAlongPin(r, c, 1, 0): # Advancing one square
+                self.addPawnMove((r, c), (r + 1, c), moves)
                 if (r == 1) and (self.board[r + 2][c] == "--"): # Advancing two squares
-                    moves.append(Move((r, c), (r + 2, c), self.board))
-            if (c - 1) >= 0: # Capturing to the left
+                    self.addPawnMove((r, c), (r + 2, c), moves)
+            if (c - 1) >= 0 and self.isMoveAlongPin(r, c, 1, -1): # Capturing to the left
                 if self.board[r + 1][c - 1][0] == 'w':
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board))
+                    self.addPawnMove((r, c), (r + 1, c - 1), moves)
                 elif (r + 1, c - 1) == self.possibleEnPassant:
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board, isEnPassantMove=True))
-            if (c + 1) <= 7: # Capturing to the right
+                    moves.append(Move((r, c), (r + 1, c - 1), isEnPassantMove=True, movedPiece="bp"))
+            if (c + 1) <= 7 and self.isMoveAlongPin(r, c, 1, 1): # Capturing to the right
                 if self.board[r + 1][c + 1][0] == 'w':
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board))
+                    self.addPawnMove((r, c), (r + 1, c + 1), moves)
                 elif (r + 1, c + 1) == self.possibleEnPassant:
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board, isEnPassantMove=True))
+                    moves.append(Move((r, c), (r + 1, c + 1), isEnPassantMove=True, movedPiece="bp"))
 
     # Getting all the possible moves for a rook
     def getRookMoves(self, r, c, moves):
-        enemyColor = 'b' if self.whiteToMove else 'w'
-
-        # Check moves to the right
-        col_idx = c + 1
-        while col_idx <= 7:
-            if self.board[r][col_idx] == "--":
-                moves.append(Move((r, c), (r, col_idx), self.board))
-                col_idx += 1
-            elif self.board[r][col_idx][0] == enemyColor:
-                moves.append(Move((r, c), (r, col_idx), self.board))
-                break
-            else:
-                break
-
-        # Check moves to the left
-        col_idx = c - 1
-        while col_idx >= 0:
-            if self.board[r][col_idx] == "--":
-                moves.append(Move((r, c), (r, col_idx), self.board))
-                col_idx -= 1
-            elif self.board[r][col_idx][0] == enemyColor:
-                moves.append(Move((r, c), (r, col_idx), self.board))
-                break
-            else:
-                break
-
-        # Check moves upwards
-        row_idx = r - 1
-        while row_idx >= 0:
-            if self.board[row_idx][c] == "--":
-                moves.append(Move((r, c), (row_idx, c), self.board))
-                row_idx -= 1
-            elif self.board[row_idx][c][0] == enemyColor:
-                moves.append(Move((r, c), (row_idx, c), self.board))
-                break
-            else:
-                break
-
-        # Check moves downwards
-        row_idx = r + 1
-        while row_idx <= 7:
-            if self.board[row_idx][c] == "--":
-                moves.append(Move((r, c), (row_idx, c), self.board))
-                row_idx += 1
-            elif self.board[row_idx][c][0] == enemyColor:
-                moves.append(Move((r, c), (row_idx, c), self.board))
-                break
-            else:
-                break
+        self.getSlidingMoves(r, c, ROOK_SQUARE_RAYS, moves)
 
 
     # Getting all the possible moves for a bishop
     def getBishopMoves(self, r, c, moves):
-        enemyColor = 'b' if self.whiteToMove else 'w'
+        self.getSlidingMoves(r, c, BISHOP_SQUARE_RAYS, moves)
 
-        # Checking for moves : Up - Right
-        row_idx, col_idx = r - 1, c + 1
-        while (row_idx >= 0) and (col_idx <= 7):
-            if self.board[row_idx][col_idx] == "--":
-                moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                row_idx, col_idx = row_idx - 1, col_idx + 1
-            elif self.board[row_idx][col_idx][0] == enemyColor:
-                moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                break
-            else:
-                break
-
-        # Checking for moves : Up - Left
-        row_idx, col_idx = r - 1, c - 1
-        while (row_idx >= 0) and (col_idx >= 0):
-            if self.board[row_idx][col_idx] == "--":
-                moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                row_idx, col_idx = row_idx - 1, col_idx - 1
-            elif self.board[row_idx][col_idx][0] == enemyColor:
-                moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                break
-            else:
-                break
-
-        # Checking for moves : Down - Right
-        row_idx, col_idx = r + 1, c + 1
-        while (row_idx <= 7) and (col_idx <= 7):
-            if self.board[row_idx][col_idx] == "--":
-                moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                row_idx, col_idx = row_idx + 1, col_idx + 1
-            elif self.board[row_idx][col_idx][0] == enemyColor:
-                moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                break
-            else:
-                break
-
-        # Checking for moves : Down - Left
-        row_idx, col_idx = r + 1, c - 1
-        while (row_idx <= 7) and (col_idx >= 0):
-            if self.board[row_idx][col_idx] == "--":
-                moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                row_idx, col_idx = row_idx + 1, col_idx - 1
-            elif self.board[row_idx][col_idx][0] == enemyColor:
-                moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                break
-            else:
-                break
+
+    # Getting all the possible moves of a sliding piece along the rays of the given table (ROOK_SQUARE_RAYS or BISHOP_SQUARE_RAYS)
+    def getSlidingMoves(self, r, c, squareRays, moves):
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        board = self.board
+        piece = board[r][c]
+        isPinned = (r, c) in self.pins
+
+        for (rowDirection, colDirection), ray in squareRays[r * 8 + c]:
+            # A pinned piece can only slide along its pin
+            if isPinned and not self.isMoveAlongPin(r, c, rowDirection, colDirection):
+                continue
+            for target in ray:
+                targetPiece = board[target[0]][target[1]]
+                if targetPiece == "--":
+                    moves.append(Move((r, c), target, movedPiece=piece))
+                else:
+                    if targetPiece[0] == enemyColor:
+                        moves.append(Move((r, c), target, movedPiece=piece, capturedPiece=targetPiece))
+                    break
 
 
     # Getting all the possible moves for a knight
     def getKnightMoves(self, r, c, moves):
-        enemyColor = 'b' if self.whiteToMove else 'w'
-        knightMoves = [(1, 2), (1, -2), (-1, 2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)]
-
-        for knightMove in knightMoves:
-            row_idx, col_idx = r + knightMove[0], c + knightMove[1]
-            if (0 <= row_idx <= 7) and (0 <= col_idx <= 7):
-                if self.board[row_idx][col_idx] == "--":
-                    moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                elif self.board[row_idx][col_idx][0] == enemyColor:
-                    moves.append(Move((r, c), (row_idx, col_idx), self.board))
+        # A pinned knight can never move
+        if (r, c) in self.pins:
+            return
+        self.getStepMoves(r, c, KNIGHT_TARGETS, moves)
 
 
     # Getting all the possible moves for a king
     def getKingMoves(self, r, c, moves):
+        self.getStepMoves(r, c, KING_TARGETS, moves)
+
+
+    # Getting all the possible moves of a knight or king to the squares of the given table (KNIGHT_TARGETS or KING_TARGETS)
+    def getStepMoves(self, r, c, targets, moves):
         enemyColor = 'b' if self.whiteToMove else 'w'
-        kingMoves = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+        board = self.board
+        piece = board[r][c]
 
-        for kingMove in kingMoves:
-            row_idx, col_idx = r + kingMove[0], c + kingMove[1]
-            if (0 <= row_idx <= 7) and (0 <= col_idx <= 7):
-                if self.board[row_idx][col_idx] == "--":
-                    moves.append(Move((r, c), (row_idx, col_idx), self.board))
-                elif self.board[row_idx][col_idx][0] == enemyColor:
-                    moves.append(Move((r, c), (row_idx, col_idx), self.board))
+        for target in targets[r * 8 + c]:
+            targetPiece = board[target[0]][target[1]]
+            if targetPiece == "--":
+                moves.append(Move((r, c), target, movedPiece=piece))
+            elif targetPiece[0] == enemyColor:
+                moves.append(Move((r, c), target, movedPiece=piece, capturedPiece=targetPiece))
 
 
     # Getting all the possible moves for a queen
@@ -320,26 +865,55 @@ class GameState:
         self.getRookMoves(r, c, moves)
 
 
+# Packed move encoding : the starting square (row * 8 + col) in bits 0-5, the ending square in bits 6-11,
+# the promotion piece type in bits 12-14 and the en passant flag in bit 15, so a move fits in an array('H')
+SQUARE_BITS = 6
+SQUARES_MASK = (1 << (2 * SQUARE_BITS)) - 1
+PROMOTION_SHIFT = 2 * SQUARE_BITS
+EN_PASSANT_FLAG = 1 << 15
+PROMOTION_TYPES = ('', 'Q', 'R', 'B', 'N')
+
+
 class Move:
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rowsToRanks = {v: k for k, v in ranksToRows.items()}
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
-
-    def __init__(self, startingSquare, endingSquare, board):
-        self.startingRow = startingSquare[0]
-        self.startingColumn = startingSquare[1]
-        self.endingRow = endingSquare[0]
-        self.endingColumn = endingSquare[1]
-        self.movedPiece = board[self.startingRow][self.startingColumn]
-        self.capturedPiece = board[self.endingRow][self.endingColumn]
+    __slots__ = ("startingRow", "startingColumn", "endingRow", "endingColumn", "movedPiece", "capturedPiece",
+                 "promotionPiece", "isPawnPromotion", "isEnPassantMove", "moveID")
+
+    # The pieces can either be read from a board or be given directly by the generators, which already know them
+    def __init__(self, startingSquare, endingSquare, board=None, isEnPassantMove=False, promotionPiece='',
+                 movedPiece="--", capturedPiece="--"):
+        self.startingRow, self.startingColumn = startingSquare
+        self.endingRow, self.endingColumn = endingSquare
+        if board is not None:
+            movedPiece = board[self.startingRow][self.startingColumn]
+            capturedPiece = board[self.endingRow][self.endingColumn]
+        self.movedPiece = movedPiece
+        self.capturedPiece = capturedPiece
         # Attributes related to pawns
-        self.isPawnPromotion = (self.movedPiece == 'wp' and self.endingRow == 0) or (self.movedPiece == 'bp' and self.endingRow == 7)
+        self.isPawnPromotion = (movedPiece == 'wp' and self.endingRow == 0) or (movedPiece == 'bp' and self.endingRow == 7)
+        self.promotionPiece = promotionPiece
         self.isEnPassantMove = isEnPassantMove
-        if self.isEnPassantMove:
-            self.capturedPiece = "bp" if self.movedPiece == "wp" else "wp"
-        # Generating a unique ID for the move using a hashing function
-        self.moveID = (self.startingRow * 1000) + (self.startingColumn * 100) + (self.endingRow * 10) + self.endingColumn
+        if isEnPassantMove:
+            self.capturedPiece = "bp" if movedPiece == "wp" else "wp"
+        # Packing the move into a unique integer ID
+        self.moveID = (self.startingRow * 8 + self.startingColumn) | ((self.endingRow * 8 + self.endingColumn) << SQUARE_BITS)
+        if promotionPiece:
+            self.moveID |= PROMOTION_TYPES.index(promotionPiece[1]) << PROMOTION_SHIFT
+        if isEnPassantMove:
+            self.moveID |= EN_PASSANT_FLAG
+
+    # Rebuilding a move from its packed ID, the pieces are read from the board of the position it is played in
+    @classmethod
+    def fromMoveID(cls, moveID, board):
+        startingSquare = divmod(moveID & 63, 8)
+        endingSquare = divmod((moveID >> SQUARE_BITS) & 63, 8)
+        promotionType = PROMOTION_TYPES[(moveID >> PROMOTION_SHIFT) & 7]
+        movedPiece = board[startingSquare[0]][startingSquare[1]]
+        promotionPiece = movedPiece[0] + promotionType if promotionType else ''
+        return cls(startingSquare, endingSquare, board, isEnPassantMove=bool(moveID & EN_PASSANT_FLAG), promotionPiece=promotionPiece)
 
     def __eq__(self, other):
         if isinstance(other, Move):
@@ -348,25 +922,44 @@ class Move:
         return False
 
 
+    def __hash__(self):
+        return self.moveID
+
+
+    # Checking if both moves go between the same squares, whatever the promotion piece
+    def hasSameSquares(self, other):
+        return (self.moveID & SQUARES_MASK) == (other.moveID & SQUARES_MASK)
+
+
     def __repr__(self):
-        return f"Move : from {self.getRankFile(self.startingRow, self.startingColumn)} to {self.getRankFile(self.endingRow, self.endingColumn)}"
+        return f"Move : from {self.getRankFile(self.startingRow, self.startingColumn)} to {self.getRankFile(self.endingRow, self.endingColumn)}{self.getPromotionSuffix()}"
 
 
     def __str__(self):
-        return f"{self.getRankFile(self.startingRow, self.startingColumn)} {self.getRankFile(self.endingRow, self.endingColumn)}"
+        return f"{self.getRankFile(self.startingRow, self.startingColumn)} {self.getRankFile(self.endingRow, self.endingColumn)}{self.getPromotionSuffix()}"
 
 
     def getRankFile(self, row, col):
         return self.colsToFiles[col] + self.rowsToRanks[row]
 
 
+    # Long algebraic notation used by UCI and perft divide outputs (e.g. e2e4, e7e8q)
+    def getUciNotation(self):
+        promotion = self.promotionPiece[1].lower() if self.promotionPiece else ''
+        return self.getRankFile(self.startingRow, self.startingColumn) + self.getRankFile(self.endingRow, self.endingColumn) + promotion
+
+
+    def getPromotionSuffix(self):
+        return '=' + self.promotionPiece[1] if self.promotionPiece else ''
+
+
     def getChessNotation(self):
         # Handling the pawn's moves
         if self.movedPiece[1] == 'p':
             if self.capturedPiece != '--':  # If the pawn captures a piece
-                return self.getRankFile(self.endingRow, self.endingColumn)
-            else:  # If the pawn captures a piece
-                return self.colsToFiles[self.startingColumn] + 'x' + self.getRankFile(self.endingRow, self.endingColumn)
+                return self.colsToFiles[self.startingColumn] + 'x' + self.getRankFile(self.endingRow, self.endingColumn) + self.getPromotionSuffix()
+            else:  # If the pawn only advances
+                return self.getRankFile(self.endingRow, self.endingColumn) + self.getPromotionSuffix()
 
         # Handling other pieces' moves
         piece = self.movedPiece[1]
@@ -374,3 +967,24 @@ class Move:
             return piece + 'x' + self.getRankFile(self.endingRow, self.endingColumn)
         else:
             return piece + self.getRankFile(self.endingRow, self.endingColumn)
+
+
+# Packing a list of moves into a compact buffer of move IDs
+def encodeMoves(moves):
+    return array('H', [move.moveID for move in moves])
+
+
+# Rebuilding the moves of a buffer of move IDs against the board of the position they are played in
+def decodeMoves(moveIDs, board):
+    return [Move.fromMoveID(moveID, board) for moveID in moveIDs]
+
+
+# Creating a game state backed by the requested board representation ("mailbox" or "bitboard")
+# starting from the initial position, or from the given FEN
+def createGameState(backend="mailbox", fen=None):
+    if backend == "mailbox":
+        return GameState(fen)
+    if backend == "bitboard":
+        from ChessBitboard import BitboardGameState
+        return BitboardGameState(fen)
+    raise ValueError(f"Unknown game state backend : {backend}")
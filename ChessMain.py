@@ -1,7 +1,12 @@
-from ChessEngine import GameState, Move
+import time
+
+from ChessEngine import GameState, Move, decodeMoves
+from EngineWorker import EngineWorker, VALID_MOVES_JOB, SEARCH_JOB, PROGRESS_MESSAGE, DONE_MESSAGE, ERROR_MESSAGE
 from consts import *
 import pygame as pg
 
+MOVE_LOG_RECT = pg.Rect(BOARD_WIDTH + FULL_LEFT_PART_WIDTH, SQUARE_SIZE, MOVE_LOG_DISPLAY_WIDTH, BOARD_HEIGHT - SQUARE_SIZE)
+
 
 def loadImages():
     allPieces = ['wp', 'wR', 'wN', 'wB', 'wK', 'wQ', 'bp', 'bR', 'bN', 'bB', 'bK', 'bQ']
@@ -16,17 +21,12 @@ def drawBoard(screen):
     for r in range(DIMENSION):
         for c in range(DIMENSION):
             color = colors[(r + c) % 2]
-            pg.draw.rect(screen, color, pg.Rect(((c * SQUARE_SIZE) + FULL_LEFT_PART_WIDTH), (r * SQUARE_SIZE), SQUARE_SIZE, SQUARE_SIZE))
+            pg.draw.rect(screen, color, getSquareRect(r, c))
 
 
-# Drawing the pieces on the board.
-def drawPieces(screen, board):
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            # Draw the piece only if it is not an empty square
-            if board[r][c] != '--':
-                screen.blit(IMAGES[board[r][c]],
-                            pg.Rect(((c * SQUARE_SIZE) + FULL_LEFT_PART_WIDTH), (r * SQUARE_SIZE), SQUARE_SIZE, SQUARE_SIZE))
+# Getting the window rectangle of a board square
+def getSquareRect(row, col):
+    return pg.Rect((col * SQUARE_SIZE) + FULL_LEFT_PART_WIDTH, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
 
 
 # Drawing the left menu and the right move log menu
@@ -50,12 +50,11 @@ def drawLeftMenu(screen, pawnPromotionHappening = False, promotingPlayer = ''):
     pg.draw.rect(screen, pg.Color(BLACK_COLOR), lowerBorderDimensions)
 
 
-def drawRightMenu(screen):
+def drawRightMenu(screen, font):
     # Drawing the moves log title text
     x, y = BOARD_WIDTH + FULL_LEFT_PART_WIDTH, 0
     width, height = MOVE_LOG_DISPLAY_WIDTH, SQUARE_SIZE
     pg.draw.rect(screen, pg.Color(TEAL_COLOR), pg.Rect(BOARD_WIDTH + FULL_LEFT_PART_WIDTH, 0, MOVE_LOG_DISPLAY_WIDTH, SQUARE_SIZE))
-    font = pg.font.Font(None, 45)
     moves_log_text = font.render("Moves Log", True, (WHITE_COLOR))
     text_rect = moves_log_text.get_rect(center=(x + width / 2, y + height / 2))
     screen.blit(moves_log_text, text_rect)
@@ -106,130 +105,292 @@ def drawPawnPromotionOptions(screen, thereIsPawnPromotion = False, pawnPromotion
             idx += 1
 
 
-def getPawnPromotionOption(screen, color):
-    selectedPieceRow, selectedPieceColumn = 0, 0
+# Getting the promotion piece clicked by the player, or None when the click is not on one of their options
+def getPawnPromotionOption(mousePosition, color):
     piecesPositions = {(0, 0): 'Q', (0, 1): 'R', (1, 0): 'N', (1, 1): 'B'}
     heightOffset = BOARD_HEIGHT - (2 * SQUARE_SIZE) if color == 'w' else 0
-
-    drawPawnPromotionOptions(screen, color)
-    running = True
-    while running:
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                running = not running
-            elif event.type == pg.MOUSEBUTTONDOWN:
-                # Getting only the valid mouse clicks' position
-                mouse_pos_x, mouse_pos_y = pg.mouse.get_pos()
-                while not ((0 <= mouse_pos_x <= LEFT_MENU_WIDTH) and (heightOffset <= mouse_pos_y <= heightOffset + (2 * SQUARE_SIZE))):
-                    mouse_pos_x, mouse_pos_y = pg.mouse.get_pos()
-
-                selectedPieceRow, selectedPieceColumn = (mouse_pos_y - heightOffset) // SQUARE_SIZE, mouse_pos_x // SQUARE_SIZE
-                running = not running
-                break
-
-    return color + piecesPositions[(selectedPieceRow, selectedPieceColumn)]
-
-
-def highlightValidSquares(screen, gameState, validMoves, squareSelected):
-    # Highlighting the last played move
-    if len(gameState.moveLog) > 0:
-        lastPlayedMove = gameState.moveLog[-1]
-        surface = pg.Surface((SQUARE_SIZE, SQUARE_SIZE))
-        # Defining the opacity of the highlighting
-        surface.set_alpha(100)
-        surface.fill(pg.Color(MEDIUM_BLUE_COLOR))
-        screen.blit(surface, ((lastPlayedMove.endingColumn * SQUARE_SIZE) + FULL_LEFT_PART_WIDTH, lastPlayedMove.endingRow * SQUARE_SIZE))
-
-    # Highlighting the selected square and all the valid squares that the player can move his piece to
-    if squareSelected != ():
-        selectedRow, selectedCol = squareSelected
-        if (gameState.board[selectedRow][selectedCol][0] == ('w' if gameState.whiteToMove else 'b')):
-            # Highlighting the selected square
-            surface = pg.Surface((SQUARE_SIZE, SQUARE_SIZE))
-            surface.set_alpha(100)
-            surface.fill(pg.Color(TURQUOISE_COLOR))
-            screen.blit(surface, ((selectedCol * SQUARE_SIZE) + FULL_LEFT_PART_WIDTH, selectedRow * SQUARE_SIZE))
-
-            # Highlighting the valid squares
-            surface.fill((pg.Color(DARK_WASHED_RED_COLOR)))
-            selectedPieceValidMoves = [move for move in validMoves if (move.startingColumn == selectedCol) and (move.startingRow == selectedRow)]
-            for move in selectedPieceValidMoves:
-                screen.blit(surface, ((move.endingColumn * SQUARE_SIZE) + FULL_LEFT_PART_WIDTH, move.endingRow * SQUARE_SIZE))
-
-
-def displayMoveLog(screen, gameState, font):
-    moveLogRect = pg.Rect(BOARD_WIDTH + FULL_LEFT_PART_WIDTH, SQUARE_SIZE, MOVE_LOG_DISPLAY_WIDTH, BOARD_HEIGHT - SQUARE_SIZE)
-    move_log = gameState.moveLog
-    move_texts = []
-    for i in range(0, len(move_log), 2):
-        move_string = str(i // 2 + 1) + '. ' + str(move_log[i]) + " "
-        if i + 1 < len(move_log):
-            move_string += "|| " + str(move_log[i + 1]) + "  "
-        move_texts.append(move_string)
-
-    moves_per_row = 1
-    padding = 5
-    line_spacing = 2
-    text_y = padding
-    for i in range(0, len(move_texts), moves_per_row):
-        text = ""
-        for j in range(moves_per_row):
-            if i + j < len(move_texts):
-                text += move_texts[i + j]
-
-        text_object = font.render(text, True, pg.Color(WHITE_COLOR))
-        text_location = moveLogRect.move(padding, text_y)
-        screen.blit(text_object, text_location)
-        text_y += text_object.get_height() + line_spacing
-
-# Draw the current game state.
-def drawGameState(screen, gameState, validMoves, squareSelected, font, color='', isPawnPromotion=False):
-    drawBoard(screen)
-    highlightValidSquares(screen, gameState, validMoves, squareSelected)
-    drawPieces(screen, gameState.board)
-    drawRightMenu(screen)
-    displayMoveLog(screen, gameState, font)
-
-    if isPawnPromotion:
-        drawLeftMenu(screen, pawnPromotionHappening=True, promotingPlayer=color)
-        toPromoteToPiece = getPawnPromotionOption(screen, color)
-        while toPromoteToPiece is None:
-            toPromoteToPiece = getPawnPromotionOption(screen, color)
-        return toPromoteToPiece  # Return the selected piece
-    else:
-        drawLeftMenu(screen)
-
-    return None  # Return None if no selection is made yet
+    mouse_pos_x, mouse_pos_y = mousePosition
+    if not ((0 <= mouse_pos_x < LEFT_MENU_WIDTH) and (heightOffset <= mouse_pos_y < heightOffset + (2 * SQUARE_SIZE))):
+        return None
+    return color + piecesPositions[((mouse_pos_y - heightOffset) // SQUARE_SIZE, mouse_pos_x // SQUARE_SIZE)]
+
+
+# Move log panel : every line (one full move) is rendered once and its surface kept until the move changes
+# Only the lines that fit in the panel are drawn, and the mouse wheel scrolls through the older ones
+class MoveLogView:
+    def __init__(self, rect, font, padding=5, lineSpacing=2):
+        self.rect = rect
+        self.font = font
+        self.padding = padding
+        self.lineHeight = font.get_linesize() + lineSpacing
+        self.visibleLines = max(1, (rect.height - 2 * padding) // self.lineHeight)
+        self.moves = []
+        self.lineSurfaces = []
+        self.firstVisibleLine = 0
+        self.needsRedraw = True
+
+
+    def getLineText(self, lineIndex):
+        text = str(lineIndex + 1) + '. ' + str(self.moves[2 * lineIndex]) + " "
+        if 2 * lineIndex + 1 < len(self.moves):
+            text += "|| " + str(self.moves[2 * lineIndex + 1]) + "  "
+        return text
+
+
+    def getMaxFirstVisibleLine(self):
+        return max(0, len(self.lineSurfaces) - self.visibleLines)
+
+
+    # Following the move log of the game, only the lines of the moves that were made or undone are rendered again
+    def update(self, moveLog):
+        # makeMove / undoMove only change the end of the log, so the comparison stops at the first unchanged move
+        unchangedMoves = min(len(self.moves), len(moveLog))
+        while unchangedMoves > 0 and self.moves[unchangedMoves - 1] is not moveLog[unchangedMoves - 1]:
+            unchangedMoves -= 1
+        if unchangedMoves == len(self.moves) == len(moveLog):
+            return
+
+        wasScrolledToEnd = self.firstVisibleLine >= self.getMaxFirstVisibleLine()
+        self.moves = list(moveLog)
+        del self.lineSurfaces[unchangedMoves // 2:]
+        for lineIndex in range(unchangedMoves // 2, (len(self.moves) + 1) // 2):
+            self.lineSurfaces.append(self.font.render(self.getLineText(lineIndex), True, pg.Color(WHITE_COLOR)))
+
+        # Keeping the last move in sight, unless the player scrolled back to look at older ones
+        if wasScrolledToEnd:
+            self.firstVisibleLine = self.getMaxFirstVisibleLine()
+        self.firstVisibleLine = min(self.firstVisibleLine, self.getMaxFirstVisibleLine())
+        self.needsRedraw = True
+
+
+    # Scrolling by a number of lines (negative to go back to the first moves)
+    def scroll(self, lines):
+        firstVisibleLine = max(0, min(self.firstVisibleLine + lines, self.getMaxFirstVisibleLine()))
+        if firstVisibleLine != self.firstVisibleLine:
+            self.firstVisibleLine = firstVisibleLine
+            self.needsRedraw = True
+
+
+    def draw(self, screen):
+        pg.draw.rect(screen, pg.Color(BLACK_COLOR), self.rect)
+        textY = self.rect.y + self.padding
+        for lineSurface in self.lineSurfaces[self.firstVisibleLine:self.firstVisibleLine + self.visibleLines]:
+            screen.blit(lineSurface, (self.rect.x + self.padding, textY))
+            textY += self.lineHeight
+
+        # Scroll bar, only when some lines are hidden
+        if len(self.lineSurfaces) > self.visibleLines:
+            barHeight = max(self.padding, self.rect.height * self.visibleLines // len(self.lineSurfaces))
+            barY = self.rect.y + (self.rect.height - barHeight) * self.firstVisibleLine // self.getMaxFirstVisibleLine()
+            pg.draw.rect(screen, pg.Color(TEAL_COLOR), pg.Rect(self.rect.right - self.padding, barY, self.padding, barHeight))
+        self.needsRedraw = False
+
+
+# Render times of the frames, to check how much work the renderer does per frame
+class FrameStats:
+    def __init__(self):
+        self.reset()
+
+
+    def reset(self):
+        self.frames = 0
+        self.idleFrames = 0
+        self.totalSeconds = 0.0
+        self.maxSeconds = 0.0
+        self.dirtyRects = 0
+
+
+    def record(self, seconds, dirtyRects):
+        self.frames += 1
+        self.totalSeconds += seconds
+        self.maxSeconds = max(self.maxSeconds, seconds)
+        self.dirtyRects += dirtyRects
+        if dirtyRects == 0:
+            self.idleFrames += 1
+
+
+    def getStats(self):
+        return {
+            "frames": self.frames,
+            "idleFrames": self.idleFrames,
+            "averageRenderMs": 1000 * self.totalSeconds / self.frames if self.frames else 0.0,
+            "maxRenderMs": 1000 * self.maxSeconds,
+            "averageDirtyRects": self.dirtyRects / self.frames if self.frames else 0.0,
+        }
+
+
+# Drawing the game while keeping the static layers (board, menus, highlights, fonts) in memory
+# Only the squares and panels that changed since the last frame are redrawn and sent to the display
+class GameRenderer:
+    def __init__(self, screen, moveLogFont):
+        self.screen = screen
+        self.moveLogView = MoveLogView(MOVE_LOG_RECT, moveLogFont)
+        self.titleFont = pg.font.Font(None, 45)
+        self.frameStats = FrameStats()
+
+        # Everything that never changes : the board squares, the black borders and the moves log title
+        self.background = pg.Surface((WINDOW_WIDTH, BOARD_HEIGHT))
+        self.background.fill(pg.Color(BLACK_COLOR))
+        drawBoard(self.background)
+        drawRightMenu(self.background, self.titleFont)
+
+        # Highlights drawn over the squares, in the order they are stacked
+        self.highlightSurfaces = {
+            "lastMove": createHighlightSurface(MEDIUM_BLUE_COLOR, LIGHT_HIGHLIGHTING),
+            "selected": createHighlightSurface(TURQUOISE_COLOR, LIGHT_HIGHLIGHTING),
+            "validMove": createHighlightSurface(DARK_WASHED_RED_COLOR, LIGHT_HIGHLIGHTING),
+        }
+
+        # The left menu with no promotion ('') and while white or black is promoting
+        self.leftMenuSurfaces = {}
+        for color in ('', 'w', 'b'):
+            surface = pg.Surface((LEFT_MENU_WIDTH, BOARD_HEIGHT))
+            if color:
+                drawPawnPromotionOptions(surface, True, color)
+                drawLeftMenu(surface, pawnPromotionHappening=True, promotingPlayer=color)
+            else:
+                drawLeftMenu(surface)
+                drawPawnPromotionOptions(surface)
+            self.leftMenuSurfaces[color] = surface
+        self.invalidate()
+
+
+    # Forcing the next frame to redraw the whole window
+    def invalidate(self):
+        self.squareStates = [None] * (DIMENSION * DIMENSION)
+        self.leftMenuState = None
+        self.moveLogView.needsRedraw = True
+        self.needsFullRedraw = True
+
+
+    # Getting the highlights of every highlighted square, as {(row, col): [highlight, ...]}
+    def getHighlights(self, gameState, validMoves, squareSelected):
+        highlights = {}
+        if len(gameState.moveLog) > 0:
+            lastPlayedMove = gameState.moveLog[-1]
+            highlights.setdefault((lastPlayedMove.endingRow, lastPlayedMove.endingColumn), []).append("lastMove")
+
+        if squareSelected != ():
+            selectedRow, selectedCol = squareSelected
+            if gameState.board[selectedRow][selectedCol][0] == ('w' if gameState.whiteToMove else 'b'):
+                highlights.setdefault(squareSelected, []).append("selected")
+                for move in validMoves:
+                    if (move.startingRow == selectedRow) and (move.startingColumn == selectedCol):
+                        highlights.setdefault((move.endingRow, move.endingColumn), []).append("validMove")
+        return highlights
+
+
+    def drawSquare(self, row, col, piece, highlights):
+        squareRect = getSquareRect(row, col)
+        self.screen.blit(self.background, squareRect, squareRect)
+        for highlight in highlights:
+            self.screen.blit(self.highlightSurfaces[highlight], squareRect)
+        if piece != '--':
+            self.screen.blit(IMAGES[piece], squareRect)
+        return squareRect
+
+
+    # Drawing what changed since the last frame, promotionColor being the color of the player choosing a promotion piece
+    def render(self, gameState, validMoves, squareSelected, promotionColor=''):
+        startTime = time.perf_counter()
+        dirtyRects = []
+        if self.needsFullRedraw:
+            self.screen.blit(self.background, (0, 0))
+
+        highlights = self.getHighlights(gameState, validMoves, squareSelected)
+        for row in range(DIMENSION):
+            for col in range(DIMENSION):
+                squareState = (gameState.board[row][col], highlights.get((row, col), ()))
+                if squareState != self.squareStates[row * DIMENSION + col]:
+                    self.squareStates[row * DIMENSION + col] = squareState
+                    dirtyRects.append(self.drawSquare(row, col, *squareState))
+
+        if promotionColor != self.leftMenuState:
+            self.leftMenuState = promotionColor
+            dirtyRects.append(self.screen.blit(self.leftMenuSurfaces[promotionColor], (0, 0)))
+
+        self.moveLogView.update(gameState.moveLog)
+        if self.moveLogView.needsRedraw:
+            self.moveLogView.draw(self.screen)
+            dirtyRects.append(self.moveLogView.rect)
+
+        if self.needsFullRedraw:
+            self.needsFullRedraw = False
+            pg.display.flip()
+        elif dirtyRects:
+            pg.display.update(dirtyRects)
+        self.frameStats.record(time.perf_counter() - startTime, len(dirtyRects))
+
+
+def createHighlightSurface(color, opacity):
+    surface = pg.Surface((SQUARE_SIZE, SQUARE_SIZE))
+    # Defining the opacity of the highlighting
+    surface.set_alpha(opacity)
+    surface.fill(pg.Color(color))
+    return surface
+
+
+# Window title with the state of the game and of the engine
+def getCaption(gameStatus='', engineStatus=''):
+    return " - ".join(["My Chess Engine"] + [status for status in (gameStatus, engineStatus) if status])
+
+
+# Describing a search progress / result of the engine worker
+def getEngineStatus(summary, isAnalysis):
+    pv = ' '.join(summary["pv"][:6])
+    return f"{'Analysis' if isAnalysis else 'Thinking'} : depth {summary['depth']}, score {summary['score']}, " \
+           f"{summary['nps']:.0f} nodes/s, {pv}"
 
 
 # Main Function
 def main():
     # Setting up the board's graphics
-    global pawnPromotionColor
     pg.init()
     screen = pg.display.set_mode((WINDOW_WIDTH, BOARD_HEIGHT))
-    pg.display.set_caption("My Chess Engine")
+    pg.display.set_caption(getCaption())
     clock = pg.time.Clock()
     screen.fill("black")
     MOVE_LOG_FONT = pg.font.SysFont("Arial", 25, False, False)
     # Loading the pieces' images
     loadImages()
+    renderer = GameRenderer(screen, MOVE_LOG_FONT)
     gameState = GameState()
-    validMoves = gameState.getValidMoves()
+    # The valid moves, searches and analyses are computed by the engine worker, the window never waits for them
+    engine = EngineWorker()
+    validMoves = []
+    validMovesRequestID = engine.submit(VALID_MOVES_JOB, [])
+    searchRequestID, isAnalysis = None, False
+    gameStatus, engineStatus = '', ''
     moveMade = False  # Flag to detect changes whenever a move is made
     squareSelected = ()  # contains a tuple (x, y) of the selected square
     playerClicks = []  # contains at most 2 tuples : (x, y)
     running = True
-    pawnPromotionMade = False
+    pawnPromotionMade, pawnPromotionColor = False, ''
     while running:
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 running = not running
-            elif event.type == pg.MOUSEBUTTONDOWN:
+            elif event.type == pg.MOUSEWHEEL:
+                # Scrolling the move log when the mouse is over it
+                if renderer.moveLogView.rect.collidepoint(pg.mouse.get_pos()):
+                    renderer.moveLogView.scroll(-event.y)
+            elif event.type == pg.MOUSEBUTTONDOWN and event.button not in (4, 5):  # The wheel is handled above
                 # Get the mouse position in (x, y) format
                 mouse_pos_x, mouse_pos_y = pg.mouse.get_pos()
+                if pawnPromotionMade:
+                    # Only a click on one of the promotion options of the player completes the move
+                    toPromoteToPiece = getPawnPromotionOption((mouse_pos_x, mouse_pos_y), pawnPromotionColor)
+                    if toPromoteToPiece is not None:
+                        for validMove in validMoves:
+                            if validMove.hasSameSquares(move) and validMove.promotionPiece == toPromoteToPiece:
+                                gameState.makeMove(validMove)
+                                break
+                        pawnPromotionMade, pawnPromotionColor = False, ''
+                        squareSelected = ()
+                        playerClicks = []
+                        moveMade = True
                 # In case the click was on the board
-                if FULL_LEFT_PART_WIDTH < mouse_pos_x < WINDOW_WIDTH:
+                elif FULL_LEFT_PART_WIDTH < mouse_pos_x < FULL_LEFT_PART_WIDTH + BOARD_WIDTH:
                     col, row = (mouse_pos_x - FULL_LEFT_PART_WIDTH) // SQUARE_SIZE, mouse_pos_y // SQUARE_SIZE
                     # Check if the last selected square is the same as the one selected now : Undo the selection
                     if squareSelected == (row, col):
@@ -241,7 +402,8 @@ def main():
                         if len(playerClicks) == 2:  # After the 2nd move
                             move = Move(playerClicks[0], playerClicks[1], gameState.board)
                             for i in range(len(validMoves)):
-                                if move == validMoves[i]:
+                                # Promotion moves also carry their piece, so only their squares are compared
+                                if move.hasSameSquares(validMoves[i]):
                                     if validMoves[i].isPawnPromotion: # the move is a pawn promotion
                                         pawnPromotionMade, pawnPromotionColor = True, 'w' if gameState.whiteToMove else 'b'
                                         break
@@ -250,35 +412,69 @@ def main():
                                         moveMade = True
                                         squareSelected = ()  # Deselect the selected square
                                         playerClicks = []  # Clear the clicks
+                                        break
                             if (not moveMade) and (not pawnPromotionMade):
                                 playerClicks = [squareSelected]
             elif event.type == pg.KEYDOWN:
                 if event.key == pg.K_z:
-                    gameState.undoMove()
-                    moveMade = True
-
-        if not pawnPromotionMade:
-            drawGameState(screen, gameState, validMoves, squareSelected, MOVE_LOG_FONT)
-            drawPawnPromotionOptions(screen)
-        else:
-            # Draw and wait for a valid selection
-            toPromoteToPiece = drawGameState(screen, gameState, validMoves, squareSelected, MOVE_LOG_FONT, color=pawnPromotionColor, isPawnPromotion=True)
-
-            # If a valid selection is made, make the move
-            if toPromoteToPiece is not None:
-                gameState.makeMove(Move(playerClicks[0], playerClicks[1], gameState.board), True, toPromoteToPiece)
-                pawnPromotionMade, pawnPromotionColor = False, ''
-                squareSelected = ()
-                playerClicks = []
-                moveMade = True
+                    if len(gameState.moveLog) > 0:
+                        gameState.undoMove()
+                        moveMade = True
+                    pawnPromotionMade, pawnPromotionColor = False, ''
+                    squareSelected, playerClicks = (), []
+                elif event.key in (pg.K_e, pg.K_a) and searchRequestID is None and not gameStatus:
+                    # e : the engine plays the side to move, a : analysis of the position until it is cancelled
+                    isAnalysis = event.key == pg.K_a
+                    parameters = {} if isAnalysis else {"timeLimit": ENGINE_THINKING_TIME}
+                    searchRequestID = engine.submit(SEARCH_JOB, [move.moveID for move in gameState.moveLog], **parameters)
+                    engineStatus = "Analysis" if isAnalysis else "Thinking"
+                elif event.key == pg.K_ESCAPE:
+                    if searchRequestID is not None:
+                        engine.cancel(searchRequestID)
+                    elif pawnPromotionMade:
+                        pawnPromotionMade, pawnPromotionColor = False, ''
+                        squareSelected, playerClicks = (), []
+
+        for kind, requestID, data in engine.poll():
+            if kind == ERROR_MESSAGE:
+                print(data)
+            if requestID == validMovesRequestID and kind == DONE_MESSAGE:
+                validMoves = decodeMoves(data["moveIDs"], gameState.board)
+                gameStatus = "Checkmate" if data["checkmate"] else "Stalemate" if data["stalemate"] else ''
+                if data["drawReason"]:
+                    # The game is over, only undoing a move is still possible
+                    validMoves = []
+                    gameStatus = f"Draw by {data['drawReason']}"
+            elif requestID == searchRequestID:
+                if kind == PROGRESS_MESSAGE:
+                    engineStatus = getEngineStatus(data, isAnalysis)
+                else:
+                    searchRequestID, engineStatus = None, ''
+                    if kind == DONE_MESSAGE and not isAnalysis and data["bestMoveID"] is not None:
+                        gameState.makeMove(Move.fromMoveID(data["bestMoveID"], gameState.board))
+                        pawnPromotionMade, pawnPromotionColor = False, ''
+                        squareSelected, playerClicks = (), []
+                        moveMade = True
 
         if moveMade:
-            validMoves = gameState.getValidMoves()
+            # A search of the previous position is no longer of any use
+            if searchRequestID is not None:
+                engine.cancel(searchRequestID)
+                searchRequestID, engineStatus = None, ''
+            validMoves = []
+            validMovesRequestID = engine.submit(VALID_MOVES_JOB, [move.moveID for move in gameState.moveLog])
             moveMade = False
 
-        # drawPawnPromotionOptions(screen, pawnPromotionColor)
+        caption = getCaption(gameStatus, engineStatus)
+        if caption != pg.display.get_caption()[0]:
+            pg.display.set_caption(caption)
+        renderer.render(gameState, validMoves, squareSelected, promotionColor=pawnPromotionColor)
         clock.tick(MAX_FPS)
-        pg.display.flip()
+
+    engine.close()
+    stats = renderer.frameStats.getStats()
+    print(f"{stats['frames']} frames ({stats['idleFrames']} idle), render time {stats['averageRenderMs']:.2f} ms on average, "
+          f"{stats['maxRenderMs']:.2f} ms at most, {stats['averageDirtyRects']:.1f} dirty rectangles per frame")
 
 
 if __name__ == "__main__":
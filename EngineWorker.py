@@ -0,0 +1,164 @@
+import queue
+import threading
+import traceback
+
+from ChessEngine import createGameState, encodeMoves
+from Search import Search
+from TranspositionTable import TranspositionTable
+
+# Kinds of jobs the worker runs
+VALID_MOVES_JOB = "validMoves"
+SEARCH_JOB = "search"
+
+# Kinds of the messages sent back to the GUI : (kind, requestID, data)
+PROGRESS_MESSAGE = "progress"
+DONE_MESSAGE = "done"
+CANCELLED_MESSAGE = "cancelled"
+ERROR_MESSAGE = "error"
+
+
+# Engine work (valid moves, search, analysis) running on a background thread, so the GUI event loop never blocks
+# Jobs are sent with submit() and the GUI collects the progress / done / cancelled / error messages with poll()
+# The worker keeps its own game state, replayed from the move IDs of the GUI game, so both never share a board
+class EngineWorker:
+    # startFen is the position the games of the GUI start from (the standard start position when None)
+    def __init__(self, backend="mailbox", hashSizeInMB=16, startFen=None):
+        self.backend = backend
+        self.gameState = createGameState(backend)
+        if startFen is not None:
+            self.gameState.loadFen(startFen)
+        self.stopEvent = threading.Event()
+        self.search = Search(transpositionTable=TranspositionTable(hashSizeInMB), stopEvent=self.stopEvent)
+        self.requests = queue.Queue()
+        self.messages = queue.Queue()
+        self.lastRequestID = 0
+        # Every request up to cancelledUpTo is cancelled, plus the ones in cancelledRequestIDs
+        self.cancelledUpTo = 0
+        self.cancelledRequestIDs = set()
+        self.runningRequestID = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    # Queuing a job on the position reached by playing moveIDs from the start position, returning its request ID
+    # A search job takes the maxDepth / timeLimit / nodeLimit of Search.search, without limits it runs until cancelled
+    def submit(self, kind, moveIDs, **parameters):
+        with self.lock:
+            self.lastRequestID += 1
+            requestID = self.lastRequestID
+        self.requests.put((kind, requestID, list(moveIDs), parameters))
+        return requestID
+
+
+    # Cancelling a queued or running job, or every job when no request ID is given
+    def cancel(self, requestID=None):
+        with self.lock:
+            if requestID is None:
+                self.cancelledUpTo = self.lastRequestID
+            else:
+                self.cancelledRequestIDs.add(requestID)
+            if self.runningRequestID is not None and self.isCancelled(self.runningRequestID):
+                self.stopEvent.set()
+
+
+    # Getting the messages sent since the last call, without waiting
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+        self.thread.join()
+
+
+    # Called with the lock held
+    def isCancelled(self, requestID):
+        return requestID <= self.cancelledUpTo or requestID in self.cancelledRequestIDs
+
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            kind, requestID, moveIDs, parameters = request
+            with self.lock:
+                if self.isCancelled(requestID):
+                    self.cancelledRequestIDs.discard(requestID)
+                    self.messages.put((CANCELLED_MESSAGE, requestID, None))
+                    continue
+                self.runningRequestID = requestID
+                self.stopEvent.clear()
+
+            try:
+                self.setPosition(moveIDs)
+                if kind == VALID_MOVES_JOB:
+                    result = self.getValidMoves()
+                elif kind == SEARCH_JOB:
+                    result = self.runSearch(requestID, parameters)
+                else:
+                    raise ValueError(f"Unknown engine job : {kind}")
+                message = (DONE_MESSAGE, requestID, result)
+            except Exception:
+                message = (ERROR_MESSAGE, requestID, traceback.format_exc())
+
+            with self.lock:
+                if self.isCancelled(requestID):
+                    message = (CANCELLED_MESSAGE, requestID, message[2])
+                self.runningRequestID = None
+                self.cancelledRequestIDs.discard(requestID)
+            self.messages.put(message)
+
+
+    # Bringing the worker game state to the position of the job, only undoing / playing the moves that differ
+    def setPosition(self, moveIDs):
+        playedMoveIDs = [move.moveID for move in self.gameState.moveLog]
+        commonMoves = 0
+        while commonMoves < min(len(playedMoveIDs), len(moveIDs)) and playedMoveIDs[commonMoves] == moveIDs[commonMoves]:
+            commonMoves += 1
+        for _ in range(len(playedMoveIDs) - commonMoves):
+            self.gameState.undoMove()
+        for moveID in moveIDs[commonMoves:]:
+            move = next((move for move in self.gameState.getValidMoves() if move.moveID == moveID), None)
+            if move is None:
+                raise ValueError(f"Illegal move ID {moveID} after {len(self.gameState.moveLog)} moves")
+            self.gameState.makeMove(move)
+
+
+    # The moves are sent back as move IDs, the GUI rebuilds them against its own board with decodeMoves
+    def getValidMoves(self):
+        moves = self.gameState.getValidMoves()
+        return {
+            "moveIDs": encodeMoves(moves),
+            "checkmate": self.gameState.checkmate,
+            "stalemate": self.gameState.stalemate,
+            "drawReason": self.gameState.drawReason,
+        }
+
+
+    def runSearch(self, requestID, parameters):
+        def onIteration(result):
+            self.messages.put((PROGRESS_MESSAGE, requestID, getResultSummary(result)))
+
+        result = self.search.search(self.gameState, parameters.get("maxDepth", 64), parameters.get("timeLimit"),
+                                    parameters.get("nodeLimit"), onIteration)
+        return getResultSummary(result)
+
+
+# Plain data of a search result, safe to hand over to the GUI thread
+def getResultSummary(result):
+    return {
+        "bestMoveID": result.bestMove.moveID if result.bestMove else None,
+        "score": result.score,
+        "depth": result.depth,
+        "pv": [move.getUciNotation() for move in result.pv],
+        "nodes": result.nodes,
+        "nps": result.nps,
+    }
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from ChessEngine import createGameState
+from Perft import perft
+from Search import Search
+from TranspositionTable import TranspositionTable
+
+# Outcomes of a suite position
+PASSED = "passed"
+FAILED = "failed"
+SKIPPED = "skipped"
+ERROR = "error"
+
+# Settings of the worker processes, set once by initializeWorker
+workerSettings = {}
+workerSearch = None
+
+
+# Splitting the operations of an EPD record ("bm Nf3; id \"test 1\";") into {opcode: [operands]}
+# The semicolons and spaces inside quoted operands do not split them
+def parseOperations(text):
+    operations = {}
+    tokens, token, inQuotes, hasToken = [], "", False, False
+    for char in text + ';':
+        if char == '"':
+            inQuotes = not inQuotes
+            hasToken = True
+        elif inQuotes:
+            token += char
+        elif char.isspace() or char == ';':
+            if hasToken:
+                tokens.append(token)
+                token, hasToken = "", False
+            if char == ';' and tokens:
+                operations[tokens[0]] = tokens[1:]
+                tokens = []
+        else:
+            token += char
+            hasToken = True
+    if inQuotes:
+        raise ValueError("Unterminated quoted operand")
+    return operations
+
+
+# Parsing an EPD line into (fen, castling field, operations)
+# Full FENs are accepted too, the move counters then come before the operations (as in the usual perft suites)
+def parseEpdLine(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("Expected the board, side to move, castling and en passant fields")
+    rest = fields[4] if len(fields) > 4 else ""
+    counters = rest.split(';', 1)[0].split()
+    if len(counters) == 2 and all(counter.isdigit() for counter in counters):
+        fen = " ".join(fields[:4] + counters)
+        rest = rest.split(';', 1)[1] if ';' in rest else ""
+    else:
+        fen = " ".join(fields[:4]) + " 0 1"
+    return fen, fields[2], parseOperations(rest)
+
+
+# Reading the suite one line at a time, yielding (line number, line) without loading the file
+def readEpdFile(path):
+    with open(path, encoding="utf-8", errors="replace") as epdFile:
+        for lineNumber, line in enumerate(epdFile, 1):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield lineNumber, line
+
+
+def initializeWorker(settings):
+    global workerSearch
+    workerSettings.update(settings)
+    workerSearch = Search(transpositionTable=TranspositionTable(settings["hashSizeInMB"]))
+
+
+# Checking the perft counts (D1 ... Dn operations) up to the deepest one within the perft depth
+def runPerftCheck(gameState, castling, operations, result):
+    counts = {int(opcode[1:]): int(operands[0]) for opcode, operands in operations.items()
+              if opcode[:1] == 'D' and opcode[1:].isdigit() and operands}
+    depths = [depth for depth in counts if depth <= workerSettings["perftDepth"]]
+    if not depths:
+        return None
+    if castling != '-':
+        return "castling rights in a perft position (castling is not implemented)"
+    depth = max(depths)
+    nodes = perft(gameState, depth)
+    result["nodes"] += nodes
+    result["perft"] = {"depth": depth, "nodes": nodes, "expected": counts[depth]}
+    if nodes != counts[depth]:
+        result["status"] = FAILED
+        result["reason"] = f"perft {depth} : {nodes} nodes, expected {counts[depth]}"
+    return ""
+
+
+# Checking the move found by the search against the best moves (bm) and avoided moves (am)
+def runBestMoveCheck(gameState, operations, result):
+    if "bm" not in operations and "am" not in operations:
+        return None
+    validMoves = gameState.getValidMoves()
+    bestMoves = [gameState.parseSan(san, validMoves) for san in operations.get("bm", [])]
+    avoidMoves = [gameState.parseSan(san, validMoves) for san in operations.get("am", [])]
+    if None in bestMoves or None in avoidMoves:
+        return "bm / am move not valid in the position (castling is not implemented)"
+
+    workerSearch.transpositionTable.clear()
+    workerSearch.moveOrdering.clear()
+    searchResult = workerSearch.search(gameState, workerSettings["depth"], workerSettings["timeLimit"])
+    result["nodes"] += searchResult.nodes
+    found = searchResult.bestMove
+    result["move"] = gameState.getSanNotation(found, validMoves) if found else None
+    if (bestMoves and found not in bestMoves) or found in avoidMoves:
+        result["status"] = FAILED
+        expected = f"bm {' '.join(operations['bm'])}" if bestMoves else f"am {' '.join(operations['am'])}"
+        result["reason"] = f"played {result['move']}, expected {expected}"
+    return ""
+
+
+# Running the checks of one suite position, any problem with the line is reported as an error instead of raised
+def runPosition(lineNumber, line):
+    result = {"line": lineNumber, "id": None, "status": PASSED, "reason": "", "nodes": 0}
+    startTime = time.perf_counter()
+    try:
+        fen, castling, operations = parseEpdLine(line)
+        result["id"] = " ".join(operations.get("id", [])) or None
+        gameState = createGameState(workerSettings["backend"], fen)
+        perftSkip = runPerftCheck(gameState, castling, operations, result)
+        bestMoveSkip = runBestMoveCheck(gameState, operations, result) if result["status"] == PASSED else ""
+        # A position is only skipped when none of its checks could run
+        if perftSkip != "" and bestMoveSkip != "":
+            result["status"] = SKIPPED
+            result["reason"] = perftSkip or bestMoveSkip or "no bm, am or perft operation"
+    except (ValueError, IndexError, KeyError) as error:
+        result["status"] = ERROR
+        result["reason"] = str(error) or type(error).__name__
+    result["seconds"] = time.perf_counter() - startTime
+    return result
+
+
+def runBatch(batch):
+    return [runPosition(lineNumber, line) for lineNumber, line in batch]
+
+
+# Grouping the lines into batches, so that every task sent to a worker is worth its inter-process overhead
+def getBatches(lines, batchSize):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) == batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Running the suite and yielding the result of every position as soon as it is known
+# Only a few batches per worker are in flight at a time, so the memory used does not grow with the suite size
+def runSuite(path, workers=None, depth=4, timeLimit=None, perftDepth=3, backend="mailbox", hashSizeInMB=4, batchSize=16):
+    settings = {"depth": depth, "timeLimit": timeLimit, "perftDepth": perftDepth, "backend": backend,
+                "hashSizeInMB": hashSizeInMB}
+    batches = getBatches(readEpdFile(path), batchSize)
+    workers = workers or os.cpu_count() or 1
+
+    # A single worker runs in this process, a pool would only add its overhead
+    if workers == 1:
+        initializeWorker(settings)
+        for batch in batches:
+            yield from runBatch(batch)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=initializeWorker, initargs=(settings,)) as executor:
+        pending = set()
+        for batch in batches:
+            pending.add(executor.submit(runBatch, batch))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in pending:
+            yield from future.result()
+
+
+# Aggregating the results : pass rate over the checked positions, nodes and timing
+class SuiteSummary:
+    def __init__(self):
+        self.counts = {PASSED: 0, FAILED: 0, SKIPPED: 0, ERROR: 0}
+        self.nodes = 0
+        self.cpuSeconds = 0.0
+        self.failures = []
+        self.startTime = time.perf_counter()
+
+
+    def add(self, result):
+        self.counts[result["status"]] += 1
+        self.nodes += result["nodes"]
+        self.cpuSeconds += result["seconds"]
+        if result["status"] in (FAILED, ERROR):
+            self.failures.append(result)
+
+
+    def getReport(self):
+        seconds = time.perf_counter() - self.startTime
+        positions = sum(self.counts.values())
+        checked = self.counts[PASSED] + self.counts[FAILED]
+        return {
+            "positions": positions,
+            **self.counts,
+            "passRate": self.counts[PASSED] / checked if checked else 0.0,
+            "nodes": self.nodes,
+            "seconds": seconds,
+            "cpuSeconds": self.cpuSeconds,
+            "positionsPerSecond": positions / seconds if seconds > 0 else 0.0,
+            "nps": self.nodes / self.cpuSeconds if self.cpuSeconds > 0 else 0.0,
+            "failures": self.failures,
+        }
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Run an EPD test suite (bm / am best moves and D1 ... Dn perft counts)")
+    parser.add_argument("suite", help="EPD file, read one line at a time")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (the number of CPUs by default)")
+    parser.add_argument("--depth", type=int, default=4, help="Search depth of the best move checks")
+    parser.add_argument("--time", type=float, help="Time limit in seconds of every best move search")
+    parser.add_argument("--perft-depth", type=int, default=3, help="Deepest perft count checked")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    parser.add_argument("--hash", type=int, default=4, help="Transposition table size in MB of every worker")
+    parser.add_argument("--batch-size", type=int, default=16, help="Number of positions sent to a worker at once")
+    parser.add_argument("--verbose", action="store_true", help="Print every failure and error as it happens")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(arguments)
+
+    summary = SuiteSummary()
+    for result in runSuite(args.suite, args.workers, args.depth, args.time, args.perft_depth, args.backend,
+                           args.hash, max(1, args.batch_size)):
+        summary.add(result)
+        if args.verbose and result["status"] in (FAILED, ERROR):
+            print(f"line {result['line']}{' (' + result['id'] + ')' if result['id'] else ''} : "
+                  f"{result['status']}, {result['reason']}", file=sys.stderr)
+
+    report = summary.getReport()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['positions']} positions : {report['passed']} passed, {report['failed']} failed, "
+              f"{report['skipped']} skipped, {report['error']} errors ({report['passRate']:.1%} pass rate)")
+        print(f"{report['nodes']} nodes in {report['seconds']:.2f} s, {report['positionsPerSecond']:.1f} positions/s, "
+              f"{report['nps']:.0f} nodes/s per worker")
+    return 0 if report["failed"] == 0 and report["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# Piece values in centipawns (used for move ordering)
+PIECE_VALUES = {'p': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+
+# Material of the middlegame and of the endgame, the evaluation is blended between both depending on the phase
+MIDDLEGAME_VALUES = {'p': 82, 'N': 337, 'B': 365, 'R': 477, 'Q': 1025, 'K': 0}
+ENDGAME_VALUES = {'p': 94, 'N': 281, 'B': 297, 'R': 512, 'Q': 936, 'K': 0}
+# Weight of every piece in the game phase : 24 with all the pieces on the board, 0 with pawns and kings only
+PHASE_WEIGHTS = {'p': 0, 'N': 1, 'B': 1, 'R': 2, 'Q': 4, 'K': 0}
+MAX_PHASE = 24
+
+# When enabled, every evaluation checks the incremental terms against a full recompute of the board
+DEBUG_EVALUATION = False
+
+# Piece-square tables from white's point of view, laid out like GameState.board (first row is the 8th rank)
+PAWN_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+PAWN_ENDGAME_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    20, 20, 20, 20, 20, 20, 20, 20,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+ROOK_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+]
+QUEEN_TABLE = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+]
+KING_TABLE = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+]
+KING_ENDGAME_TABLE = [
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+
+# Building the signed value (material + square bonus) of every piece on every square (row * 8 + col)
+# White pieces count positively, black pieces negatively on the vertically mirrored square
+def buildPieceSquareValues(values, tables):
+    pieceSquareValues = {}
+    for piece, table in tables.items():
+        pieceSquareValues['w' + piece] = [values[piece] + table[square] for square in range(64)]
+        pieceSquareValues['b' + piece] = [-(values[piece] + table[(7 - square // 8) * 8 + square % 8]) for square in range(64)]
+    return pieceSquareValues
+
+
+MIDDLEGAME_PIECE_SQUARES = buildPieceSquareValues(MIDDLEGAME_VALUES, {
+    'p': PAWN_TABLE, 'N': KNIGHT_TABLE, 'B': BISHOP_TABLE, 'R': ROOK_TABLE, 'Q': QUEEN_TABLE, 'K': KING_TABLE})
+ENDGAME_PIECE_SQUARES = buildPieceSquareValues(ENDGAME_VALUES, {
+    'p': PAWN_ENDGAME_TABLE, 'N': KNIGHT_TABLE, 'B': BISHOP_TABLE, 'R': ROOK_TABLE, 'Q': QUEEN_TABLE, 'K': KING_ENDGAME_TABLE})
+
+
+# Computing the (middlegame, endgame, phase) terms of a board from scratch
+def computeEvaluationTerms(board):
+    middlegameScore, endgameScore, phase = 0, 0, 0
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece != "--":
+                middlegameScore += MIDDLEGAME_PIECE_SQUARES[piece][row * 8 + col]
+                endgameScore += ENDGAME_PIECE_SQUARES[piece][row * 8 + col]
+                phase += PHASE_WEIGHTS[piece[1]]
+    return middlegameScore, endgameScore, phase
+
+
+# Getting the change of the (middlegame, endgame, phase) terms made by a move
+def getMoveEvaluationDelta(move, placedPiece):
+    startingSquare = move.startingRow * 8 + move.startingColumn
+    endingSquare = move.endingRow * 8 + move.endingColumn
+    middlegameDelta = MIDDLEGAME_PIECE_SQUARES[placedPiece][endingSquare] - MIDDLEGAME_PIECE_SQUARES[move.movedPiece][startingSquare]
+    endgameDelta = ENDGAME_PIECE_SQUARES[placedPiece][endingSquare] - ENDGAME_PIECE_SQUARES[move.movedPiece][startingSquare]
+    phaseDelta = PHASE_WEIGHTS[placedPiece[1]] - PHASE_WEIGHTS[move.movedPiece[1]]
+    if move.capturedPiece != "--":
+        capturedRow = move.startingRow if move.isEnPassantMove else move.endingRow
+        capturedSquare = capturedRow * 8 + move.endingColumn
+        middlegameDelta -= MIDDLEGAME_PIECE_SQUARES[move.capturedPiece][capturedSquare]
+        endgameDelta -= ENDGAME_PIECE_SQUARES[move.capturedPiece][capturedSquare]
+        phaseDelta -= PHASE_WEIGHTS[move.capturedPiece[1]]
+    return middlegameDelta, endgameDelta, phaseDelta
+
+
+# Blending the middlegame and endgame scores by the game phase
+def taperScore(middlegameScore, endgameScore, phase):
+    phase = min(phase, MAX_PHASE)
+    return (middlegameScore * phase + endgameScore * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+# Evaluating the position from the point of view of the player to move, using the terms kept by makeMove / undoMove
+def evaluate(gameState):
+    if DEBUG_EVALUATION:
+        expectedTerms = computeEvaluationTerms(gameState.board)
+        actualTerms = (gameState.middlegameScore, gameState.endgameScore, gameState.phase)
+        assert actualTerms == expectedTerms, f"Incremental evaluation {actualTerms} differs from the board {expectedTerms}"
+    score = taperScore(gameState.middlegameScore, gameState.endgameScore, gameState.phase)
+    return score if gameState.whiteToMove else -score
+
+
+# Evaluating the position by scanning the whole board (slower, independent of the incremental terms)
+def evaluateFromScratch(gameState):
+    score = taperScore(*computeEvaluationTerms(gameState.board))
+    return score if gameState.whiteToMove else -score
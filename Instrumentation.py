@@ -0,0 +1,207 @@
+import argparse
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+from ChessEngine import GameState, Move, createGameState
+from Search import Search, BENCHMARK_POSITIONS
+from TranspositionTable import TranspositionTable
+
+# GameState methods counted (and timed) while the instrumentation is enabled
+# getLegalMove, getCaptureMoves and getQuietMoves are the move generation of the staged search (MoveOrdering.generateMoves)
+INSTRUMENTED_METHODS = ("getValidMoves", "getAllPossibleMoves", "getLegalMove", "getCaptureMoves", "getQuietMoves",
+                        "isUnderAttack", "makeMove", "undoMove")
+# Name of the counter of the Move objects created
+MOVE_COUNTER = "Move"
+
+# The instrumentation enabled at the moment, only one can patch the classes at a time
+activeInstrumentation = None
+
+
+# Opt-in counters and timers of the GameState hot paths
+# Enabling it replaces the instrumented methods of the game state classes by counting wrappers, disabling it puts the
+# original methods back : nothing is left in the engine code paths, so a disabled instrumentation costs nothing
+class Instrumentation:
+    # timed : also measuring the wall-clock time spent in every method (the counters alone are cheaper)
+    # onSnapshot : called with the final snapshot when the instrumentation is disabled
+    def __init__(self, timed=True, onSnapshot=None):
+        self.timed = timed
+        self.onSnapshot = onSnapshot
+        self.patches = []
+        self.reset()
+
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+
+    def __exit__(self, *exceptionInfo):
+        self.disable()
+
+
+    def reset(self):
+        self.counters = {name: 0 for name in INSTRUMENTED_METHODS + (MOVE_COUNTER,)}
+        self.timers = {name: 0.0 for name in INSTRUMENTED_METHODS}
+        self.phaseCounts = {}
+        self.startTime = time.perf_counter()
+        self.stopTime = None
+
+
+    @property
+    def enabled(self):
+        return activeInstrumentation is self
+
+
+    # Wrapping the instrumented methods of the game state classes (both backends by default) and Move.__init__
+    def enable(self, classes=None):
+        global activeInstrumentation
+        if self.enabled:
+            return
+        if activeInstrumentation is not None:
+            raise RuntimeError("Another instrumentation is already enabled")
+        if classes is None:
+            from ChessBitboard import BitboardGameState
+            classes = (GameState, BitboardGameState)
+
+        for cls in classes:
+            for name in INSTRUMENTED_METHODS:
+                # Only the methods a class defines itself, the inherited ones are wrapped on their own class
+                if name in cls.__dict__:
+                    self.patch(cls, name, self.wrapMethod(cls.__dict__[name], name))
+        self.patch(Move, "__init__", self.wrapConstructor(Move.__init__))
+        activeInstrumentation = self
+        self.startTime = time.perf_counter()
+        self.stopTime = None
+
+
+    # Putting the original methods back and sending the final snapshot to the hook
+    def disable(self):
+        global activeInstrumentation
+        if not self.enabled:
+            return
+        for cls, name, original in reversed(self.patches):
+            setattr(cls, name, original)
+        self.patches = []
+        self.stopTime = time.perf_counter()
+        snapshot = self.snapshot()
+        activeInstrumentation = None
+        if self.onSnapshot is not None:
+            self.onSnapshot(snapshot)
+
+
+    def patch(self, cls, name, wrapper):
+        self.patches.append((cls, name, cls.__dict__[name]))
+        setattr(cls, name, wrapper)
+
+
+    def wrapMethod(self, method, name):
+        counters, timers = self.counters, self.timers
+        if not self.timed:
+            def countingWrapper(*args, **kwargs):
+                counters[name] += 1
+                return method(*args, **kwargs)
+            return countingWrapper
+
+        perfCounter = time.perf_counter
+
+        def timingWrapper(*args, **kwargs):
+            startTime = perfCounter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                counters[name] += 1
+                timers[name] += perfCounter() - startTime
+        return timingWrapper
+
+
+    def wrapConstructor(self, constructor):
+        counters = self.counters
+
+        def countingConstructor(*args, **kwargs):
+            counters[MOVE_COUNTER] += 1
+            constructor(*args, **kwargs)
+        return countingConstructor
+
+
+    # Timing a phase of the caller's own code (e.g. "search", "book lookup") : with instrumentation.phase("search"): ...
+    @contextmanager
+    def phase(self, name):
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phaseCounts[name] = self.phaseCounts.get(name, 0) + 1
+            self.timers[name] = self.timers.get(name, 0.0) + time.perf_counter() - startTime
+
+
+    # Getting a copy of the counters and timers, with the rates over the time the instrumentation was enabled
+    # The timers are inclusive : the time of getValidMoves also holds the isUnderAttack calls it makes
+    def snapshot(self):
+        seconds = (self.stopTime or time.perf_counter()) - self.startTime
+        return {
+            "enabled": self.enabled,
+            "timed": self.timed,
+            "seconds": seconds,
+            "counters": dict(self.counters),
+            "timers": dict(self.timers) if self.timed else {name: self.timers[name] for name in self.phaseCounts},
+            "phases": dict(self.phaseCounts),
+            "callsPerSecond": {name: count / seconds if seconds > 0 else 0.0 for name, count in self.counters.items()},
+        }
+
+
+    def toJson(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent)
+
+
+# Searching the benchmark positions without instrumentation, then with counters only, then with counters and timers
+def measureOverhead(depth=3, backend="mailbox", positions=BENCHMARK_POSITIONS):
+    def runSearches(instrumentation=None):
+        nodes = 0
+        startTime = time.perf_counter()
+        for fen in positions:
+            search = Search(transpositionTable=TranspositionTable(16))
+            gameState = createGameState(backend, fen)
+            if instrumentation is None:
+                nodes += search.search(gameState, depth).nodes
+            else:
+                with instrumentation.phase("search"):
+                    nodes += search.search(gameState, depth).nodes
+        seconds = time.perf_counter() - startTime
+        return {"seconds": seconds, "nodes": nodes, "nps": nodes / seconds if seconds > 0 else 0.0}
+
+    report = {"disabled": runSearches()}
+    for name, timed in (("counters", False), ("timers", True)):
+        with Instrumentation(timed) as instrumentation:
+            report[name] = runSearches(instrumentation)
+        report[name]["snapshot"] = instrumentation.snapshot()
+    return report
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Count and time the GameState calls made by searches of the benchmark positions")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(arguments)
+
+    report = measureOverhead(args.depth, args.backend)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    snapshot = report["timers"]["snapshot"]
+    print(f"{'Counter':<22}{'Calls':>12}{'Seconds':>10}{'us/call':>10}")
+    for name, count in snapshot["counters"].items():
+        seconds = snapshot["timers"].get(name)
+        print(f"{name:<22}{count:>12}" + (f"{seconds:>10.3f}{1e6 * seconds / max(1, count):>10.2f}" if seconds is not None else ""))
+    for name, count in snapshot["phases"].items():
+        print(f"{'phase ' + name:<22}{count:>12}{snapshot['timers'][name]:>10.3f}")
+    for name in ("disabled", "counters", "timers"):
+        print(f"{name:<10} {report[name]['seconds']:>8.3f} s, {report[name]['nodes']} nodes, {report[name]['nps']:.0f} nodes/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+from Evaluation import PIECE_VALUES
+
+# Ordering scores : the hash move first, then the captures / promotions, the killer moves and the quiet moves
+HASH_MOVE_SCORE = 10000000
+CAPTURE_SCORE = 1000000
+KILLER_SCORES = (900000, 800000)
+# History scores are halved when one of them reaches this value, so they always stay below the killers
+MAX_HISTORY_SCORE = 500000
+KILLERS_PER_PLY = len(KILLER_SCORES)
+
+
+# Most valuable victim first, then least valuable attacker first
+def getMvvLvaScore(move):
+    victim = move.promotionPiece if move.capturedPiece == "--" else move.capturedPiece
+    return 10 * PIECE_VALUES[victim[1]] - PIECE_VALUES[move.movedPiece[1]] // 100
+
+
+# Ordering of the moves of a search, learning from the beta cutoffs it records
+class MoveOrdering:
+    def __init__(self, maxPly=128):
+        self.maxPly = maxPly
+        self.clear()
+
+
+    # Forgetting everything (e.g. for a new game)
+    def clear(self):
+        self.history = {color + piece: [0] * 64 for color in "wb" for piece in "pRNBQK"}
+        self.killers = [[0] * KILLERS_PER_PLY for _ in range(self.maxPly + 1)]
+        self.resetStats()
+
+
+    # Starting a new search : the killers belong to the previous tree and the history is aged
+    def newSearch(self):
+        self.killers = [[0] * KILLERS_PER_PLY for _ in range(self.maxPly + 1)]
+        self.ageHistory()
+        self.resetStats()
+
+
+    def resetStats(self):
+        self.orderedNodes = 0
+        # Moves produced by the move generation of the ordered nodes (with staged generation, the ones of every stage reached)
+        self.generatedMoves = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.cutoffIndexSum = 0
+
+
+    def ageHistory(self):
+        for table in self.history.values():
+            for square in range(64):
+                table[square] //= 2
+
+
+    def scoreMove(self, move, hashMoveID, ply):
+        if move.moveID == hashMoveID:
+            return HASH_MOVE_SCORE
+        if move.capturedPiece != "--" or move.promotionPiece:
+            return CAPTURE_SCORE + getMvvLvaScore(move)
+        killers = self.killers[ply]
+        for i in range(KILLERS_PER_PLY):
+            if move.moveID == killers[i]:
+                return KILLER_SCORES[i]
+        return self.history[move.movedPiece][move.endingRow * 8 + move.endingColumn]
+
+
+    # Sorting the moves of a node from the most to the least promising one
+    def orderMoves(self, moves, hashMoveID=0, ply=0):
+        self.orderedNodes += 1
+        self.generatedMoves += len(moves)
+        moves.sort(key=lambda move: self.scoreMove(move, hashMoveID, ply), reverse=True)
+
+
+    # Sorting captures / promotions only (quiescence search)
+    # generatedMoves : the number of moves generated to find them, when they were filtered from all the valid moves
+    def orderCaptures(self, moves, generatedMoves=None):
+        self.orderedNodes += 1
+        self.generatedMoves += len(moves) if generatedMoves is None else generatedMoves
+        moves.sort(key=getMvvLvaScore, reverse=True)
+
+
+    # Staged move generation : the legal moves of a node are produced one stage at a time, each stage being generated only
+    # once the previous one is exhausted, so a cutoff on the hash move or a capture saves generating the quiet moves
+    # Stages : hash move, captures / promotions (MVV-LVA), killer moves, quiet moves (history)
+    # capturesOnly stops after the captures (quiescence search), the hash move then only counts if it is a capture
+    def generateMoves(self, gameState, hashMoveID=0, ply=0, capturesOnly=False):
+        self.orderedNodes += 1
+        # The pins and checks of the node, computed once for every stage
+        pinsAndChecks = gameState.getPinsAndChecks()
+        hashMove = gameState.getLegalMove(hashMoveID, pinsAndChecks) if hashMoveID else None
+        if hashMove is not None and (not capturesOnly or hashMove.capturedPiece != "--" or hashMove.promotionPiece):
+            self.generatedMoves += 1
+            yield hashMove
+        else:
+            hashMoveID = 0
+
+        captures = gameState.getCaptureMoves(pinsAndChecks)
+        self.generatedMoves += len(captures)
+        captures.sort(key=getMvvLvaScore, reverse=True)
+        for move in captures:
+            if move.moveID != hashMoveID:
+                yield move
+        if capturesOnly:
+            return
+
+        killerIDs = []
+        for killerID in self.killers[ply]:
+            if killerID and killerID != hashMoveID:
+                killer = gameState.getLegalMove(killerID, pinsAndChecks)
+                # Killers are quiet moves, a capturing one was already searched with the captures
+                if killer is not None and killer.capturedPiece == "--" and not killer.promotionPiece:
+                    self.generatedMoves += 1
+                    killerIDs.append(killerID)
+                    yield killer
+
+        quiets = gameState.getQuietMoves(pinsAndChecks)
+        self.generatedMoves += len(quiets)
+        history = self.history
+        quiets.sort(key=lambda move: history[move.movedPiece][move.endingRow * 8 + move.endingColumn], reverse=True)
+        for move in quiets:
+            if move.moveID != hashMoveID and move.moveID not in killerIDs:
+                yield move
+
+
+    # Recording the move that caused a beta cutoff, moveIndex being its position in the ordered list
+    def recordCutoff(self, move, ply, depth, moveIndex):
+        self.cutoffs += 1
+        self.cutoffIndexSum += moveIndex
+        if moveIndex == 0:
+            self.firstMoveCutoffs += 1
+
+        # Only quiet moves are remembered, captures are already ordered first
+        if move.capturedPiece != "--" or move.promotionPiece:
+            return
+        killers = self.killers[ply]
+        if killers[0] != move.moveID:
+            killers[1:] = killers[:-1]
+            killers[0] = move.moveID
+
+        table = self.history[move.movedPiece]
+        square = move.endingRow * 8 + move.endingColumn
+        table[square] += depth * depth
+        if table[square] >= MAX_HISTORY_SCORE:
+            self.ageHistory()
+
+
+    def getStats(self):
+        return {
+            "orderedNodes": self.orderedNodes,
+            "generatedMovesPerNode": self.generatedMoves / self.orderedNodes if self.orderedNodes else 0.0,
+            "cutoffs": self.cutoffs,
+            "firstMoveCutoffRate": self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0,
+            "averageCutoffIndex": self.cutoffIndexSum / self.cutoffs if self.cutoffs else 0.0,
+        }
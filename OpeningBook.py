@@ -0,0 +1,233 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+from ChessEngine import createGameState
+from PolyglotRandom import POLYGLOT_RANDOM
+
+# Every entry is 16 big-endian bytes : position key (64 bits), move (16), weight (16), learn (32)
+# The entries of a book are sorted by key, so the moves of a position are next to each other
+ENTRY_FORMAT = struct.Struct(">QHHI")
+KEY_FORMAT = struct.Struct(">Q")
+ENTRY_SIZE = ENTRY_FORMAT.size
+
+# Offsets of the non-piece random numbers
+CASTLING_OFFSET = 768
+EN_PASSANT_OFFSET = 772
+TURN_OFFSET = 780
+
+# Kind of a piece in the Polyglot order : black pawn 0, white pawn 1, black knight 2, ... white king 11
+POLYGLOT_PIECE_KINDS = {color + piece: 2 * i + (color == 'w') for i, piece in enumerate("pNBRQK") for color in "bw"}
+# Promotion pieces of a Polyglot move (0 means no promotion)
+POLYGLOT_PROMOTIONS = ('', 'N', 'B', 'R', 'Q')
+
+# Castling rights (white kingside, white queenside, black kingside, black queenside) : king and rook home squares
+CASTLING_SQUARES = (((7, 4), (7, 7)), ((7, 4), (7, 0)), ((0, 4), (0, 7)), ((0, 4), (0, 0)))
+
+
+# Getting the castling rights of the position, in the Polyglot order
+# The engine does not play castling, so a right is kept while its king and rook have not left their home squares
+def getCastlingRights(gameState):
+    touchedSquares = set()
+    for move in gameState.moveLog:
+        touchedSquares.add((move.startingRow, move.startingColumn))
+        touchedSquares.add((move.endingRow, move.endingColumn))
+    rights = []
+    for (kingSquare, rookSquare), color in zip(CASTLING_SQUARES, "wwbb"):
+        rights.append(gameState.board[kingSquare[0]][kingSquare[1]] == color + 'K' and
+                      gameState.board[rookSquare[0]][rookSquare[1]] == color + 'R' and
+                      kingSquare not in touchedSquares and rookSquare not in touchedSquares)
+    return rights
+
+
+# Computing the Polyglot key of a position (not GameState.zobristKey, the books use their own random numbers)
+def getPolyglotKey(gameState):
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = gameState.board[row][col]
+            if piece != "--":
+                # Polyglot squares start from a1, the board rows start from the 8th rank
+                key ^= POLYGLOT_RANDOM[64 * POLYGLOT_PIECE_KINDS[piece] + 8 * (7 - row) + col]
+
+    for i, hasRight in enumerate(getCastlingRights(gameState)):
+        if hasRight:
+            key ^= POLYGLOT_RANDOM[CASTLING_OFFSET + i]
+
+    # Like the Zobrist key, the en passant file only counts when a pawn of the player to move can capture
+    if gameState.possibleEnPassant != ():
+        enPassantRow, enPassantCol = gameState.possibleEnPassant
+        pawnRow = enPassantRow + (1 if gameState.whiteToMove else -1)
+        pawn = ('w' if gameState.whiteToMove else 'b') + 'p'
+        if any(0 <= col < 8 and gameState.board[pawnRow][col] == pawn for col in (enPassantCol - 1, enPassantCol + 1)):
+            key ^= POLYGLOT_RANDOM[EN_PASSANT_OFFSET + enPassantCol]
+
+    if gameState.whiteToMove:
+        key ^= POLYGLOT_RANDOM[TURN_OFFSET]
+    return key
+
+
+# Packing a move into its Polyglot encoding : to file, to rank, from file, from rank (3 bits each) and promotion
+def encodePolyglotMove(move):
+    promotion = POLYGLOT_PROMOTIONS.index(move.promotionPiece[1]) if move.promotionPiece else 0
+    return move.endingColumn | ((7 - move.endingRow) << 3) | (move.startingColumn << 6) | ((7 - move.startingRow) << 9) | (promotion << 12)
+
+
+# Getting the (startingSquare, endingSquare, promotionType) of a Polyglot move, the squares being (row, col)
+def decodePolyglotMove(polyglotMove):
+    endingSquare = (7 - ((polyglotMove >> 3) & 7), polyglotMove & 7)
+    startingSquare = (7 - ((polyglotMove >> 9) & 7), (polyglotMove >> 6) & 7)
+    return startingSquare, endingSquare, POLYGLOT_PROMOTIONS[(polyglotMove >> 12) & 7]
+
+
+# Polyglot .bin opening book, memory-mapped read-only : nothing is loaded up front, the lookups only touch the pages
+# they need, and the processes opening the same book share its pages through the page cache
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size % ENTRY_SIZE != 0:
+            self.file.close()
+            raise ValueError(f"Invalid Polyglot book, its size is not a multiple of {ENTRY_SIZE} bytes : {path}")
+        self.entryCount = size // ENTRY_SIZE
+        # An empty file cannot be mapped
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exceptionInfo):
+        self.close()
+
+
+    def __len__(self):
+        return self.entryCount
+
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+
+    # Getting (key, move, weight, learn) of the entry at the index
+    def getEntry(self, index):
+        return ENTRY_FORMAT.unpack_from(self.map, index * ENTRY_SIZE)
+
+
+    # Binary search of the first entry whose key is not lower than the given key
+    def findFirstEntry(self, key):
+        low, high = 0, self.entryCount
+        while low < high:
+            middle = (low + high) // 2
+            if KEY_FORMAT.unpack_from(self.map, middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+    # Getting the (polyglotMove, weight) entries stored for a position key
+    def getEntries(self, key):
+        entries = []
+        index = self.findFirstEntry(key)
+        while index < self.entryCount:
+            entryKey, polyglotMove, weight, _ = self.getEntry(index)
+            if entryKey != key:
+                break
+            entries.append((polyglotMove, weight))
+            index += 1
+        return entries
+
+
+    # Getting the (move, weight) book moves of the position as moves of GameState.getValidMoves()
+    # Castling moves, which the engine does not play, and moves not valid in the position are left out
+    def getBookMoves(self, gameState):
+        entries = self.getEntries(getPolyglotKey(gameState))
+        if not entries:
+            return []
+        validMoves = gameState.getValidMoves()
+        bookMoves = []
+        for polyglotMove, weight in entries:
+            startingSquare, endingSquare, promotionType = decodePolyglotMove(polyglotMove)
+            for move in validMoves:
+                if (move.startingRow, move.startingColumn) == startingSquare and (move.endingRow, move.endingColumn) == endingSquare \
+                   and move.promotionPiece[1:] == promotionType:
+                    bookMoves.append((move, weight))
+                    break
+        return bookMoves
+
+
+    # Choosing a book move at random, in proportion to the weights (None when the position is not in the book)
+    def chooseMove(self, gameState, rng=random):
+        bookMoves = [(move, weight) for move, weight in self.getBookMoves(gameState) if weight > 0]
+        if not bookMoves:
+            return None
+        return rng.choices([move for move, _ in bookMoves], weights=[weight for _, weight in bookMoves])[0]
+
+
+# Writing a Polyglot book from (key, polyglotMove, weight, learn) entries, sorted as the format requires
+def writeBook(path, entries):
+    with open(path, "wb") as bookFile:
+        for entry in sorted(entries):
+            bookFile.write(ENTRY_FORMAT.pack(*entry))
+
+
+# Timing the lookups of the positions of random games, which follow the book moves while there are some
+def runBenchmark(book, games=100, plies=12, seed=0):
+    rng = random.Random(seed)
+    keys = []
+    for _ in range(games):
+        gameState = createGameState()
+        for _ in range(plies):
+            keys.append(getPolyglotKey(gameState))
+            moves = [move for move, _ in book.getBookMoves(gameState)] or gameState.getValidMoves()
+            if not moves:
+                break
+            gameState.makeMove(rng.choice(moves))
+
+    startTime = time.perf_counter()
+    found = sum(1 for key in keys if book.getEntries(key))
+    seconds = time.perf_counter() - startTime
+    return {
+        "entries": len(book),
+        "lookups": len(keys),
+        "found": found,
+        "microsecondsPerLookup": 1e6 * seconds / max(1, len(keys)),
+    }
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Look up a position in a Polyglot opening book")
+    parser.add_argument("book", help="Polyglot .bin book")
+    parser.add_argument("--fen", help="Position to look up (the start position when omitted)")
+    parser.add_argument("--benchmark", action="store_true", help="Time the lookups of random game positions")
+    args = parser.parse_args(arguments)
+
+    with OpeningBook(args.book) as book:
+        if args.benchmark:
+            report = runBenchmark(book)
+            print(f"{report['entries']} entries, {report['found']} / {report['lookups']} positions found, "
+                  f"{report['microsecondsPerLookup']:.1f} us per lookup")
+            return 0
+
+        gameState = createGameState()
+        if args.fen:
+            gameState.loadFen(args.fen)
+        bookMoves = book.getBookMoves(gameState)
+        totalWeight = sum(weight for _, weight in bookMoves)
+        print(f"key {getPolyglotKey(gameState):016x}, {len(bookMoves)} book move(s)")
+        for move, weight in sorted(bookMoves, key=lambda bookMove: -bookMove[1]):
+            print(f"{move.getUciNotation():<6}{weight:>6}{weight / totalWeight if totalWeight else 0.0:>8.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from ChessEngine import createGameState, Move
+from Search import Search, SearchResult, SearchAborted, INFINITE_SCORE, MATE_THRESHOLD, BENCHMARK_POSITIONS
+from TranspositionTable import TranspositionTable
+
+SEARCH_MODES = ("lazysmp", "rootsplit")
+
+# Search of the worker process, attached to the shared transposition table by initializeWorker
+workerState = {}
+
+
+def initializeWorker(sharedMemoryName, stopEvent):
+    # The workers share the resource tracker of the parent, which unlinks the block in close()
+    sharedMemory = shared_memory.SharedMemory(name=sharedMemoryName)
+    workerState["sharedMemory"] = sharedMemory
+    workerState["search"] = Search(transpositionTable=TranspositionTable(buffer=sharedMemory.buf), stopEvent=stopEvent)
+
+
+def getWorkerPid(workerIndex):
+    return os.getpid()
+
+
+# Lazy SMP : every worker searches the whole tree and they help each other through the shared table
+# Every other helper searches one ply deeper, so the workers spread over different depths
+def lazySmpWorker(gameState, workerIndex, maxDepth, timeLimit, nodeLimit):
+    depth = maxDepth + (workerIndex % 2)
+    result = workerState["search"].search(gameState, depth, timeLimit, nodeLimit)
+    return {
+        "workerIndex": workerIndex,
+        "moveID": result.bestMove.moveID if result.bestMove else 0,
+        "score": result.score,
+        "depth": result.depth,
+        "pv": [move.moveID for move in result.pv],
+        "nodes": result.nodes,
+    }
+
+
+# Root splitting : the worker searches the subtree of each of the given root moves, deepening them together
+# The first move gets the full window and its score is the alpha of the others, which are searched with a null window
+# and only searched again with an open window when they beat it. The time and node limits hold for the whole chunk
+def rootSplitWorker(gameState, moveIDs, maxDepth, timeLimit, nodeLimit):
+    search = workerState["search"]
+    search.startSearch(gameState, timeLimit, nodeLimit)
+    moves = [Move.fromMoveID(moveID, gameState.board) for moveID in moveIDs]
+    search.moveOrdering.orderMoves(moves)
+    # Results of the last completed depth, the static evaluation until the first one completes
+    results = []
+    for move in moves:
+        gameState.makeMove(move)
+        results.append({"moveID": move.moveID, "score": -search.evaluate(gameState), "depth": 0, "pv": [move.moveID]})
+        gameState.undoMove()
+
+    for depth in range(1, max(1, maxDepth - 1) + 1):
+        iterationResults = []
+        alpha = -INFINITE_SCORE
+        try:
+            for move in moves:
+                gameState.makeMove(move)
+                # The child is searched at ply 1, so its mate scores already count the root move
+                if not iterationResults:
+                    score = -search.negamax(gameState, depth, -INFINITE_SCORE, INFINITE_SCORE, 1)
+                else:
+                    score = -search.negamax(gameState, depth, -alpha - 1, -alpha, 1)
+                    if score > alpha:
+                        score = -search.negamax(gameState, depth, -INFINITE_SCORE, -alpha, 1)
+                gameState.undoMove()
+                # The moves failing low only have an upper bound, below the best score of the chunk
+                pv = [move.moveID] + ([pvMove.moveID for pvMove in search.pvTable[1]] if score > alpha else [])
+                alpha = max(alpha, score)
+                iterationResults.append({"moveID": move.moveID, "score": score, "depth": depth + 1, "pv": pv})
+        except SearchAborted:
+            while len(gameState.moveLog) > search.rootPly:
+                gameState.undoMove()
+            break
+
+        results = iterationResults
+        # The best moves of this depth are searched first at the next one
+        order = sorted(range(len(moves)), key=lambda i: -results[i]["score"])
+        moves, results = [moves[i] for i in order], [results[i] for i in order]
+        if abs(results[0]["score"]) >= MATE_THRESHOLD:
+            break
+
+    # The nodes of the chunk are counted once, on its first result
+    for i, result in enumerate(results):
+        result["nodes"] = search.nodes + len(moves) if i == 0 else 0
+    return results
+
+
+# Search spread over a pool of worker processes sharing one transposition table
+class ParallelSearch:
+    def __init__(self, workers=None, hashSizeInMB=64, mode="lazysmp"):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown parallel search mode : {mode}")
+        self.workers = workers or os.cpu_count() or 1
+        self.mode = mode
+        self.sharedMemory = shared_memory.SharedMemory(create=True, size=hashSizeInMB * 1024 * 1024)
+        self.stopEvent = multiprocessing.Event()
+        self.executor = ProcessPoolExecutor(self.workers, initializer=initializeWorker,
+                                            initargs=(self.sharedMemory.name, self.stopEvent))
+        # Starting every worker now, so the process startup is not counted in the first search
+        list(self.executor.map(getWorkerPid, range(self.workers)))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exceptionInfo):
+        self.close()
+
+
+    def close(self):
+        self.stopEvent.set()
+        self.executor.shutdown()
+        self.sharedMemory.close()
+        self.sharedMemory.unlink()
+
+
+    # Asking the workers to stop as soon as possible
+    def stop(self):
+        self.stopEvent.set()
+
+
+    def search(self, gameState, maxDepth=64, timeLimit=None, nodeLimit=None):
+        self.stopEvent.clear()
+        startTime = time.perf_counter()
+        rootMoves = gameState.getValidMoves()
+        if len(rootMoves) == 0:
+            return SearchResult()
+
+        if self.mode == "lazysmp":
+            workerNodeLimit = None if nodeLimit is None else max(1, nodeLimit // self.workers)
+            futures = [self.executor.submit(lazySmpWorker, gameState, workerIndex, maxDepth, timeLimit, workerNodeLimit)
+                       for workerIndex in range(self.workers)]
+            # The main worker decides when the search is over, the helpers are then stopped
+            futures[0].result()
+            self.stopEvent.set()
+            results = [future.result() for future in futures]
+            best = max(results, key=lambda result: (result["depth"], result["workerIndex"] == 0))
+        else:
+            rootMoveIDs = [move.moveID for move in rootMoves]
+            chunks = [rootMoveIDs[i::self.workers] for i in range(self.workers) if rootMoveIDs[i::self.workers]]
+            # The node budget is shared between the chunks, every worker spreading its share over the moves of its chunk
+            chunkNodeLimit = None if nodeLimit is None else max(1, nodeLimit // len(chunks))
+            futures = [self.executor.submit(rootSplitWorker, gameState, chunk, maxDepth, timeLimit, chunkNodeLimit)
+                       for chunk in chunks]
+            results = [result for future in futures for result in future.result()]
+            best = max(results, key=lambda result: result["score"])
+            best["depth"] = min(result["depth"] for result in results)
+
+        return SearchResult(Move.fromMoveID(best["moveID"], gameState.board), best["score"], best["depth"],
+                            decodePrincipalVariation(gameState, best["pv"]), sum(result["nodes"] for result in results),
+                            time.perf_counter() - startTime)
+
+
+# Rebuilding the moves of a principal variation by playing its move IDs from the root
+def decodePrincipalVariation(gameState, moveIDs):
+    pv = []
+    for moveID in moveIDs:
+        move = Move.fromMoveID(moveID, gameState.board)
+        if move not in gameState.getValidMoves():
+            break
+        gameState.makeMove(move)
+        pv.append(move)
+    for _ in pv:
+        gameState.undoMove()
+    return pv
+
+
+# Searching the positions to a fixed depth with the sequential Search, then with 1 and the given number of workers
+# speedup is the ratio of the sequential time to depth to the parallel one and efficiency the speedup per worker,
+# so the overhead of the parallel search itself is counted (the 1 worker timing shows it)
+def measureSpeedup(positions=BENCHMARK_POSITIONS, depth=4, workers=None, mode="lazysmp", hashSizeInMB=64):
+    workers = workers or os.cpu_count() or 1
+
+    def runSearches(search):
+        startTime = time.perf_counter()
+        nodes = 0
+        for fen in positions:
+            gameState = createGameState()
+            gameState.loadFen(fen)
+            nodes += search(gameState).nodes
+        seconds = time.perf_counter() - startTime
+        return {"seconds": seconds, "nodes": nodes, "nps": nodes / seconds if seconds > 0 else 0.0}
+
+    sequentialSearch = Search(transpositionTable=TranspositionTable(hashSizeInMB))
+    sequential = runSearches(lambda gameState: sequentialSearch.search(gameState, depth))
+    sequentialSearch.transpositionTable.release()
+    timings = {}
+    for workerCount in sorted({1, workers}):
+        with ParallelSearch(workerCount, hashSizeInMB, mode) as parallelSearch:
+            timings[workerCount] = runSearches(lambda gameState: parallelSearch.search(gameState, depth))
+
+    speedup = sequential["seconds"] / timings[workers]["seconds"] if timings[workers]["seconds"] > 0 else 0.0
+    return {"mode": mode, "depth": depth, "workers": workers, "sequential": sequential, "timings": timings,
+            "speedup": speedup, "efficiency": speedup / workers}
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Multi-process search")
+    parser.add_argument("--fen", help="Position to search (measures the speedup on the benchmark positions when omitted)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="lazysmp")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--time", type=float, help="Time limit in seconds for --fen")
+    parser.add_argument("--hash", type=int, default=64, help="Shared transposition table size in MB")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(arguments)
+
+    if args.fen:
+        gameState = createGameState()
+        gameState.loadFen(args.fen)
+        with ParallelSearch(args.workers, args.hash, args.mode) as parallelSearch:
+            result = parallelSearch.search(gameState, args.depth, args.time)
+        pv = ' '.join(move.getUciNotation() for move in result.pv)
+        print(f"depth {result.depth} score {result.score} nodes {result.nodes} time {result.seconds:.3f} nps {result.nps:.0f} pv {pv}")
+        print(f"bestmove {result.bestMove.getUciNotation() if result.bestMove else '(none)'}")
+        return 0
+
+    report = measureSpeedup(depth=args.depth, workers=args.workers, mode=args.mode, hashSizeInMB=args.hash)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        sequential = report["sequential"]
+        print(f"sequential  : {sequential['seconds']:.3f} s, {sequential['nodes']} nodes, {sequential['nps']:.0f} nodes/s")
+        for workerCount, timing in sorted(report["timings"].items()):
+            print(f"{workerCount:>3} worker(s) : {timing['seconds']:.3f} s, {timing['nodes']} nodes, {timing['nps']:.0f} nodes/s")
+        print(f"Speedup {report['speedup']:.2f}, efficiency {report['efficiency']:.1%} ({report['mode']}, depth {report['depth']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import argparse
+import json
+import sys
+import time
+
+from ChessEngine import createGameState, buildMoveTables
+
+# Standard perft positions with their known node counts per depth
+# None of them has castling rights, since castling is not implemented by the engine
+PERFT_SUITE = [
+    {"name": "Initial position", "fen": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1",
+     "nodes": {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}},
+    {"name": "Rook and pawns endgame", "fen": "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     "nodes": {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}},
+    {"name": "Middlegame after castling", "fen": "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     "nodes": {1: 46, 2: 2079, 3: 89890, 4: 3894594}},
+    {"name": "Promotions", "fen": "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1",
+     "nodes": {1: 24, 2: 496, 3: 9483, 4: 182838, 5: 3605103}},
+    {"name": "En passant discovered check", "fen": "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     "nodes": {1: 15, 2: 126, 3: 1928, 4: 13931, 5: 206379, 6: 1440467}},
+    {"name": "En passant capture giving check", "fen": "8/5bk1/8/2Pp4/8/1K6/8/8 w - d6 0 1",
+     "nodes": {1: 8, 2: 104, 3: 736, 4: 9287, 5: 62297, 6: 824064}},
+    {"name": "Illegal en passant (horizontal pin)", "fen": "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     "nodes": {1: 18, 2: 92, 3: 1670, 4: 10138, 5: 185429, 6: 1134888}},
+    {"name": "Avoid illegal king moves", "fen": "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+     "nodes": {1: 29, 2: 165, 3: 5160, 4: 31961, 5: 1004658}},
+    {"name": "Self stalemate", "fen": "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     "nodes": {1: 2, 2: 6, 3: 13, 4: 63, 5: 382, 6: 2217, 7: 15453}},
+    {"name": "Stalemate and checkmate", "fen": "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     "nodes": {1: 10, 2: 25, 3: 268, 4: 926, 5: 10857, 6: 43261, 7: 567584}},
+    {"name": "Double check", "fen": "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+     "nodes": {1: 37, 2: 183, 3: 6559, 4: 23527, 5: 811573}},
+    {"name": "Promote out of check", "fen": "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     "nodes": {1: 11, 2: 133, 3: 1442, 4: 19174, 5: 266199, 6: 3821001}},
+    {"name": "Promote to give check", "fen": "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     "nodes": {1: 9, 2: 40, 3: 472, 4: 2661, 5: 38983, 6: 217342, 7: 3742283}},
+]
+
+
+# Counting the leaf nodes of the move generation tree (the last ply is counted without being played)
+def perft(gameState, depth):
+    if depth == 0:
+        return 1
+    moves = gameState.getValidMoves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        gameState.makeMove(move)
+        nodes += perft(gameState, depth - 1)
+        gameState.undoMove()
+    return nodes
+
+
+# Counting the leaf nodes below every valid move : {uci move: nodes}
+def divide(gameState, depth):
+    counts = {}
+    for move in gameState.getValidMoves():
+        gameState.makeMove(move)
+        counts[move.getUciNotation()] = perft(gameState, depth - 1)
+        gameState.undoMove()
+    return counts
+
+
+# Choosing the depth to run a suite position at : the requested one, or the deepest one within the node budget
+def getSuiteDepth(position, depth=None, maxNodes=100000):
+    knownDepths = sorted(position["nodes"])
+    if depth is not None:
+        return min(depth, knownDepths[-1])
+    withinBudget = [d for d in knownDepths if position["nodes"][d] <= maxNodes]
+    return withinBudget[-1] if withinBudget else knownDepths[0]
+
+
+# Running the suite and returning one result per position
+def runSuite(backend="mailbox", depth=None, maxNodes=100000, positions=PERFT_SUITE):
+    results = []
+    for position in positions:
+        gameState = createGameState(backend)
+        gameState.loadFen(position["fen"])
+        positionDepth = getSuiteDepth(position, depth, maxNodes)
+
+        startTime = time.perf_counter()
+        nodes = perft(gameState, positionDepth)
+        elapsed = time.perf_counter() - startTime
+
+        results.append({
+            "name": position["name"],
+            "fen": position["fen"],
+            "depth": positionDepth,
+            "nodes": nodes,
+            "expected": position["nodes"][positionDepth],
+            "passed": nodes == position["nodes"][positionDepth],
+            "seconds": elapsed,
+            "nps": nodes / elapsed if elapsed > 0 else 0.0,
+        })
+    return results
+
+
+# Timing the move generation alone : getValidMoves on every suite position, repeated, plus the build of the move tables
+def runGenerationBenchmark(backend="mailbox", repetitions=200, positions=PERFT_SUITE):
+    results = []
+    for position in positions:
+        gameState = createGameState(backend, position["fen"])
+        startTime = time.perf_counter()
+        for _ in range(repetitions):
+            moves = gameState.getValidMoves()
+        seconds = time.perf_counter() - startTime
+        results.append({"name": position["name"], "moves": len(moves), "microsecondsPerCall": 1e6 * seconds / repetitions})
+
+    startTime = time.perf_counter()
+    buildMoveTables()
+    tableSeconds = time.perf_counter() - startTime
+    return {
+        "backend": backend,
+        "results": results,
+        "averageMicroseconds": sum(result["microsecondsPerCall"] for result in results) / len(results),
+        "tableBuildMilliseconds": 1000 * tableSeconds,
+    }
+
+
+def summarize(results, backend):
+    totalNodes = sum(result["nodes"] for result in results)
+    totalSeconds = sum(result["seconds"] for result in results)
+    return {
+        "backend": backend,
+        "results": results,
+        "totalNodes": totalNodes,
+        "totalSeconds": totalSeconds,
+        "nps": totalNodes / totalSeconds if totalSeconds > 0 else 0.0,
+        "passed": all(result["passed"] for result in results),
+    }
+
+
+def printSummary(summary):
+    print(f"{'Position':<38}{'Depth':>6}{'Nodes':>12}{'Seconds':>10}{'Nodes/s':>12}  Result")
+    for result in summary["results"]:
+        status = "OK" if result["passed"] else f"FAIL (expected {result['expected']})"
+        print(f"{result['name']:<38}{result['depth']:>6}{result['nodes']:>12}{result['seconds']:>10.3f}{result['nps']:>12.0f}  {status}")
+    print(f"{'Total':<38}{'':>6}{summary['totalNodes']:>12}{summary['totalSeconds']:>10.3f}{summary['nps']:>12.0f}  "
+          f"{'OK' if summary['passed'] else 'FAIL'}")
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Perft benchmark and move generation correctness suite")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    parser.add_argument("--depth", type=int, help="Depth to run every suite position at (capped to the known counts)")
+    parser.add_argument("--max-nodes", type=int, default=100000, help="Node budget used to choose the depth when --depth is not given")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--divide", type=int, metavar="DEPTH", help="Print the node count below every move of --fen")
+    parser.add_argument("--fen", help="Position used by --divide (the initial position by default)")
+    parser.add_argument("--generation", action="store_true", help="Time getValidMoves alone on every suite position")
+    args = parser.parse_args(arguments)
+
+    if args.generation:
+        benchmark = runGenerationBenchmark(args.backend)
+        if args.json:
+            print(json.dumps(benchmark, indent=2))
+        else:
+            print(f"{'Position':<38}{'Moves':>6}{'us/call':>10}")
+            for result in benchmark["results"]:
+                print(f"{result['name']:<38}{result['moves']:>6}{result['microsecondsPerCall']:>10.1f}")
+            print(f"{'Average':<38}{'':>6}{benchmark['averageMicroseconds']:>10.1f}")
+            print(f"Move tables built in {benchmark['tableBuildMilliseconds']:.2f} ms")
+        return 0
+
+    if args.divide is not None:
+        gameState = createGameState(args.backend)
+        if args.fen:
+            gameState.loadFen(args.fen)
+        counts = divide(gameState, args.divide)
+        if args.json:
+            print(json.dumps({"depth": args.divide, "moves": counts, "nodes": sum(counts.values())}, indent=2))
+        else:
+            for move, nodes in sorted(counts.items()):
+                print(f"{move}: {nodes}")
+            print(f"\nMoves: {len(counts)}\nNodes: {sum(counts.values())}")
+        return 0
+
+    summary = summarize(runSuite(args.backend, args.depth, args.max_nodes), args.backend)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        printSummary(summary)
+    return 0 if summary["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from ChessEngine import createGameState
+
+# Size of the reads from the PGN file, the games are split from the buffered lines
+CHUNK_SIZE = 1 << 20
+
+TAG_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Movetext tokens : comments, NAGs, variations, results, move numbers and moves (an unmatched '{' is kept as an error)
+MOVETEXT_PATTERN = re.compile(r'\{[^}]*\}|\{|;[^\n]*|\$\d+|[()]|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s{}();$]+')
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+class PgnGame:
+    def __init__(self, offset, tags, moveText):
+        # Byte offset of the game in the file
+        self.offset = offset
+        self.tags = tags
+        self.moveText = moveText
+        self.result = tags.get("Result", "*")
+        # Moves of the game, resolved against the valid moves of every position by replay()
+        self.moves = []
+        # Why the game could not be replayed, None when it is valid
+        self.error = None
+
+
+    def __repr__(self):
+        return f"PgnGame({self.tags.get('White', '?')} - {self.tags.get('Black', '?')}, {len(self.moves)} moves, {self.result})"
+
+
+    # Getting the SAN moves of the main line, without the comments, NAGs, variations and move numbers
+    def getSanMoves(self):
+        sanMoves = []
+        variationDepth = 0
+        for token in MOVETEXT_PATTERN.findall(self.moveText):
+            if token == '(':
+                variationDepth += 1
+            elif token == ')':
+                if variationDepth == 0:
+                    raise ValueError("closing a variation that was not opened")
+                variationDepth -= 1
+            elif token == '{':
+                raise ValueError("unterminated comment")
+            elif variationDepth > 0 or token[0] in "{;$" or token[0].isdigit() and token[-1] == '.':
+                continue
+            elif token in RESULTS:
+                self.result = token
+            else:
+                sanMoves.append(token)
+        if variationDepth > 0:
+            raise ValueError("unterminated variation")
+        return sanMoves
+
+
+    # Creating the game state of the first position of the game (the FEN tag of games not starting from the initial position)
+    def createStartingState(self, backend="mailbox"):
+        return createGameState(backend, self.tags.get("FEN"))
+
+
+    # Resolving the SAN moves against the valid moves, setting the moves or the error of the game
+    # Returns the game state of the final position, or None when the game is malformed
+    def replay(self, backend="mailbox"):
+        positions = self.replayPositions(backend)
+        while True:
+            try:
+                next(positions)
+            except StopIteration as stop:
+                return stop.value
+
+
+    # Replaying the game one move at a time, yielding (gameState, move) with the position before every move
+    # The moves and the error of the game are set as it goes, so a malformed game yields its positions up to the
+    # invalid move. The generator returns the game state of the final position, or None when the game is malformed
+    def replayPositions(self, backend="mailbox"):
+        self.moves = []
+        self.error = None
+        try:
+            gameState = self.createStartingState(backend)
+            for i, san in enumerate(self.getSanMoves()):
+                move = gameState.parseSan(san)
+                if move is None:
+                    moveNumber = f"{i // 2 + 1}{'.' if gameState.whiteToMove else '...'}"
+                    reason = "castling is not supported by the engine" if san.startswith(("O-O", "0-0")) else "not a valid move"
+                    raise ValueError(f"move {moveNumber} {san} : {reason}")
+                yield gameState, move
+                gameState.makeMove(move)
+                self.moves.append(move)
+        except (ValueError, IndexError, KeyError) as error:
+            self.moves = []
+            self.error = str(error) or type(error).__name__
+            return None
+        return gameState
+
+
+# A game starts on a tag line that does not follow another tag line
+def isGameStart(line, previousLine):
+    return line.startswith(b'[') and not previousLine.startswith(b'[')
+
+
+# Getting the line that ends right before the given offset, which is at the start of a line
+def getPreviousLine(pgnFile, offset):
+    lineEnd = offset - 1
+    lineStart = lineEnd
+    while lineStart > 0:
+        step = min(lineStart, 4096)
+        pgnFile.seek(lineStart - step)
+        newline = pgnFile.read(step).rfind(b'\n')
+        if newline >= 0:
+            lineStart += newline + 1 - step
+            break
+        lineStart -= step
+    pgnFile.seek(max(0, lineStart))
+    return pgnFile.read(max(0, lineEnd - lineStart))
+
+
+# Reading the games whose first line starts in [start, end) of the file, one at a time
+# A game starting before end is read to its last line, so consecutive ranges split a file without losing any game
+def readGames(path, start=0, end=None):
+    with open(path, "rb", buffering=CHUNK_SIZE) as pgnFile:
+        previousLine = b""
+        if start > 0:
+            # Moving to the first line starting in the range
+            pgnFile.seek(start - 1)
+            if pgnFile.read(1) != b'\n':
+                pgnFile.readline()
+            offset = pgnFile.tell()
+            previousLine = getPreviousLine(pgnFile, offset)
+            pgnFile.seek(offset)
+        else:
+            offset = 0
+
+        # Lines before the first tag line of the file make a game without tags, the other ranges skip them
+        # since they belong to the last game of the previous range
+        gameOffset = 0 if start == 0 else None
+        tagLines, moveLines = [], []
+        for line in pgnFile:
+            if isGameStart(line, previousLine):
+                if tagLines or any(moveLine.strip() for moveLine in moveLines):
+                    yield createGame(gameOffset, tagLines, moveLines)
+                if end is not None and offset >= end:
+                    return
+                gameOffset, tagLines, moveLines = offset, [], []
+            if gameOffset is not None:
+                (tagLines if line.startswith(b'[') else moveLines).append(line)
+            offset += len(line)
+            previousLine = line
+        if tagLines or any(moveLine.strip() for moveLine in moveLines):
+            yield createGame(gameOffset, tagLines, moveLines)
+
+
+def createGame(offset, tagLines, moveLines):
+    tags = {}
+    for line in tagLines:
+        match = TAG_PATTERN.match(line.decode("utf-8", "replace").strip())
+        if match:
+            tags[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+    return PgnGame(offset, tags, b"".join(moveLines).decode("utf-8", "replace"))
+
+
+# Reading and replaying the games, malformed ones are yielded too with their error set
+def iterateGames(path, backend="mailbox", start=0, end=None):
+    for game in readGames(path, start, end):
+        game.replay(backend)
+        yield game
+
+
+# Yielding (gameState, move, game) for every move of the games, the game state being the position before the move
+# Every game is replayed once, the positions being yielded as its moves are resolved : the positions of a malformed
+# game are yielded up to its invalid move, game.error is set once the iteration moves past it
+# The same game state object is reused and changes as the iteration goes on
+def iteratePositions(path, backend="mailbox", start=0, end=None):
+    for game in readGames(path, start, end):
+        for gameState, move in game.replayPositions(backend):
+            yield gameState, move, game
+
+
+# Splitting the file into byte ranges, one per worker, that readGames aligns to the game boundaries
+def getShards(path, shards):
+    size = os.path.getsize(path)
+    bounds = [size * i // shards for i in range(shards + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(shards) if bounds[i] < bounds[i + 1]]
+
+
+# Replaying the games of a range of the file and counting them, the skipped ones by reason
+def collectStatistics(path, start=0, end=None, backend="mailbox", maxSkippedExamples=20):
+    statistics = {"games": 0, "valid": 0, "skipped": 0, "plies": 0, "results": Counter(), "skipReasons": Counter(),
+                  "skippedExamples": [], "seconds": 0.0}
+    startTime = time.perf_counter()
+    for game in iterateGames(path, backend, start, end):
+        statistics["games"] += 1
+        if game.error is not None:
+            statistics["skipped"] += 1
+            # Grouping the reasons without the move or position they are about
+            reason = game.error.split(" : ", 1)
+            statistics["skipReasons"][reason[1] if game.error.startswith("move ") else reason[0]] += 1
+            if len(statistics["skippedExamples"]) < maxSkippedExamples:
+                statistics["skippedExamples"].append({"offset": game.offset, "reason": game.error})
+            continue
+        statistics["valid"] += 1
+        statistics["plies"] += len(game.moves)
+        statistics["results"][game.result] += 1
+    statistics["seconds"] = time.perf_counter() - startTime
+    return statistics
+
+
+def mergeStatistics(shardStatistics, maxSkippedExamples=20):
+    merged = {"games": 0, "valid": 0, "skipped": 0, "plies": 0, "results": Counter(), "skipReasons": Counter(),
+              "skippedExamples": [], "seconds": 0.0}
+    for statistics in shardStatistics:
+        for name in ("games", "valid", "skipped", "plies", "results", "skipReasons"):
+            merged[name] += statistics[name]
+        merged["skippedExamples"] += statistics["skippedExamples"]
+        merged["seconds"] = max(merged["seconds"], statistics["seconds"])
+    merged["skippedExamples"] = sorted(merged["skippedExamples"], key=lambda example: example["offset"])[:maxSkippedExamples]
+    return merged
+
+
+# Replaying the file in one process, or sharded by game boundaries over a pool of worker processes
+def replayFile(path, workers=1, backend="mailbox"):
+    startTime = time.perf_counter()
+    if workers <= 1:
+        statistics = collectStatistics(path, backend=backend)
+    else:
+        shards = getShards(path, workers)
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(collectStatistics, path, start, end, backend) for start, end in shards]
+            statistics = mergeStatistics([future.result() for future in futures])
+    seconds = time.perf_counter() - startTime
+    statistics["results"] = dict(statistics["results"])
+    statistics["skipReasons"] = dict(statistics["skipReasons"])
+    statistics["workers"] = workers
+    statistics["wallSeconds"] = seconds
+    statistics["gamesPerSecond"] = statistics["games"] / seconds if seconds > 0 else 0.0
+    statistics["pliesPerSecond"] = statistics["plies"] / seconds if seconds > 0 else 0.0
+    return statistics
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Replay the games of a PGN file and report the throughput")
+    parser.add_argument("pgn", help="PGN file, read as a stream")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes the file is sharded over")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(arguments)
+
+    statistics = replayFile(args.pgn, args.workers, args.backend)
+    if args.json:
+        print(json.dumps(statistics, indent=2))
+        return 0
+    print(f"{statistics['games']} games ({statistics['valid']} valid, {statistics['skipped']} skipped), "
+          f"{statistics['plies']} plies in {statistics['wallSeconds']:.2f} s")
+    print(f"{statistics['gamesPerSecond']:.1f} games/s, {statistics['pliesPerSecond']:.0f} plies/s with {args.workers} worker(s)")
+    for reason, count in sorted(statistics["skipReasons"].items(), key=lambda item: -item[1]):
+        print(f"  skipped {count} : {reason}")
+    for example in statistics["skippedExamples"]:
+        print(f"  offset {example['offset']} : {example['reason']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
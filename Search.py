@@ -0,0 +1,324 @@
+import argparse
+import json
+import sys
+import time
+
+from ChessEngine import createGameState, FIFTY_MOVE_PLIES
+from Evaluation import evaluate
+from MoveOrdering import MoveOrdering
+from TranspositionTable import TranspositionTable, BOUND_EXACT, BOUND_LOWER, BOUND_UPPER
+
+# Scores in centipawns, mates are reported as MATE_SCORE minus the distance to the mate in plies
+INFINITE_SCORE = 1000000
+MATE_SCORE = 100000
+MATE_THRESHOLD = MATE_SCORE - 1000
+MAX_PLY = 128
+ASPIRATION_WINDOW = 50
+# The clock and the node limit are only checked every CHECK_INTERVAL nodes
+CHECK_INTERVAL = 1024
+
+# Fixed positions used to measure the nodes per second and the time to reach a depth
+BENCHMARK_POSITIONS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "r1bq1rk1/pp2ppbp/2np1np1/8/3NP3/2N1BP2/PPPQ2PP/2KR1B1R b - - 0 9",
+    "2r3k1/pp3pp1/4p2p/3pP3/3P2P1/2P1K3/P6P/2R5 w - - 0 28",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+]
+
+
+# Raised inside the tree when the time or node limit is reached, the search then keeps the last full iteration
+class SearchAborted(Exception):
+    pass
+
+
+class SearchResult:
+    def __init__(self, bestMove=None, score=0, depth=0, pv=None, nodes=0, seconds=0.0):
+        self.bestMove = bestMove
+        self.score = score
+        self.depth = depth
+        self.pv = pv if pv is not None else []
+        self.nodes = nodes
+        self.seconds = seconds
+
+    @property
+    def nps(self):
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self):
+        pv = ' '.join(move.getUciNotation() for move in self.pv)
+        return f"SearchResult(depth={self.depth}, score={self.score}, nodes={self.nodes}, pv={pv})"
+
+
+# Iterative deepening negamax alpha-beta search over GameState.makeMove / undoMove
+class Search:
+    # stopEvent is an optional threading / multiprocessing Event that stops the search once set
+    # stagedGeneration : producing the moves of a node stage by stage (MoveOrdering.generateMoves) instead of
+    # generating and sorting all of them up front
+    def __init__(self, evaluate=evaluate, transpositionTable=None, moveOrdering=None, stopEvent=None, stagedGeneration=True):
+        self.evaluate = evaluate
+        self.stopEvent = stopEvent
+        self.stagedGeneration = stagedGeneration
+        self.transpositionTable = transpositionTable if transpositionTable is not None else TranspositionTable(16)
+        self.moveOrdering = moveOrdering if moveOrdering is not None else MoveOrdering(MAX_PLY)
+        self.stopRequested = False
+        self.nodes = 0
+
+
+    # Asking a running search to stop as soon as possible (safe to call from another thread)
+    def stop(self):
+        self.stopRequested = True
+
+
+    # Searching the position until maxDepth, timeLimit (seconds) or nodeLimit is reached
+    # onIteration(result) is called after every completed depth
+    def search(self, gameState, maxDepth=64, timeLimit=None, nodeLimit=None, onIteration=None):
+        self.startSearch(gameState, timeLimit, nodeLimit)
+        result = SearchResult()
+        rootMoves = gameState.getValidMoves()
+        if len(rootMoves) == 0:
+            return result
+        # A move is always available, even if the first iteration is interrupted
+        result.bestMove = rootMoves[0]
+
+        score = 0
+        for depth in range(1, min(maxDepth, MAX_PLY) + 1):
+            try:
+                score = self.aspirationSearch(gameState, depth, score)
+            except SearchAborted:
+                # Taking back the moves left on the board by the interrupted iteration
+                while len(gameState.moveLog) > self.rootPly:
+                    gameState.undoMove()
+                break
+
+            result = SearchResult(self.pvTable[0][0] if self.pvTable[0] else result.bestMove, score, depth,
+                                  list(self.pvTable[0]), self.nodes, time.perf_counter() - self.startTime)
+            if onIteration is not None:
+                onIteration(result)
+            # No need to look deeper once a forced mate has been found
+            if abs(score) >= MATE_THRESHOLD:
+                break
+
+        result.nodes, result.seconds = self.nodes, time.perf_counter() - self.startTime
+        # Searching leaves the checkmate / stalemate flags of the last visited position
+        gameState.getValidMoves()
+        return result
+
+
+    # Resetting the counters and limits of a new search from the given position, which is its root
+    # Callers driving negamax themselves (e.g. the root splitting of ParallelSearch) start with it too
+    def startSearch(self, gameState, timeLimit=None, nodeLimit=None):
+        self.stopRequested = False
+        self.nodes = 0
+        self.startTime = time.perf_counter()
+        self.deadline = None if timeLimit is None else self.startTime + timeLimit
+        self.nodeLimit = nodeLimit
+        self.rootPly = len(gameState.moveLog)
+        self.pvTable = [[] for _ in range(MAX_PLY + 1)]
+        self.transpositionTable.newSearch()
+        self.moveOrdering.newSearch()
+
+
+    # Searching with a narrow window around the previous score, widening it when the score falls outside
+    def aspirationSearch(self, gameState, depth, previousScore):
+        if depth < 4:
+            return self.negamax(gameState, depth, -INFINITE_SCORE, INFINITE_SCORE, 0)
+
+        window = ASPIRATION_WINDOW
+        while True:
+            alpha, beta = max(previousScore - window, -INFINITE_SCORE), min(previousScore + window, INFINITE_SCORE)
+            score = self.negamax(gameState, depth, alpha, beta, 0)
+            if alpha < score < beta:
+                return score
+            window *= 4
+            if window > 4 * MATE_SCORE:
+                return self.negamax(gameState, depth, -INFINITE_SCORE, INFINITE_SCORE, 0)
+
+
+    def checkLimits(self):
+        if self.stopRequested or (self.stopEvent is not None and self.stopEvent.is_set()):
+            raise SearchAborted()
+        if (self.nodeLimit is not None) and (self.nodes >= self.nodeLimit):
+            raise SearchAborted()
+        if (self.deadline is not None) and (time.perf_counter() >= self.deadline):
+            raise SearchAborted()
+
+
+    def negamax(self, gameState, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self.checkLimits()
+        self.pvTable[ply] = []
+        # A repeated position or the end of the fifty moves is a draw, the root is searched anyway to get a move
+        if ply > 0:
+            if gameState.isRepetition():
+                return 0
+            if gameState.halfmoveClock >= FIFTY_MOVE_PLIES:
+                # A checkmate on the last move of the fifty still wins
+                if gameState.isInCheck() and not gameState.getValidMoves():
+                    return -MATE_SCORE + ply
+                return 0
+        if depth <= 0:
+            return self.quiescence(gameState, alpha, beta, ply)
+
+        isPvNode = beta - alpha > 1
+        key = gameState.zobristKey
+        hashMoveID = 0
+        entry = self.transpositionTable.probe(key)
+        if entry is not None:
+            hashMoveID, entryDepth, entryScore, bound = entry
+            entryScore = scoreFromTable(entryScore, ply)
+            if (not isPvNode) and ply > 0 and entryDepth >= depth:
+                if (bound == BOUND_EXACT) or \
+                   (bound == BOUND_LOWER and entryScore >= beta) or \
+                   (bound == BOUND_UPPER and entryScore <= alpha):
+                    return entryScore
+
+        if self.stagedGeneration:
+            moves = self.moveOrdering.generateMoves(gameState, hashMoveID, ply)
+        else:
+            moves = gameState.getValidMoves()
+            self.moveOrdering.orderMoves(moves, hashMoveID, ply)
+
+        originalAlpha = alpha
+        bestScore, bestMove = -INFINITE_SCORE, None
+        for moveIndex, move in enumerate(moves):
+            gameState.makeMove(move)
+            score = -self.negamax(gameState, depth - 1, -beta, -alpha, ply + 1)
+            gameState.undoMove()
+
+            if score > bestScore:
+                bestScore, bestMove = score, move
+                if score > alpha:
+                    alpha = score
+                    self.pvTable[ply] = [move] + self.pvTable[ply + 1]
+                    if alpha >= beta:
+                        self.moveOrdering.recordCutoff(move, ply, depth, moveIndex)
+                        break
+
+        # No move : checkmate or stalemate
+        if bestMove is None:
+            return -MATE_SCORE + ply if gameState.isInCheck() else 0
+
+        if bestScore >= beta:
+            bound = BOUND_LOWER
+        elif bestScore > originalAlpha:
+            bound = BOUND_EXACT
+        else:
+            bound = BOUND_UPPER
+        self.transpositionTable.store(key, bestMove.moveID, depth, scoreToTable(bestScore, ply), bound)
+        return bestScore
+
+
+    # Searching the captures only, so the static evaluation is never taken in the middle of an exchange
+    def quiescence(self, gameState, alpha, beta, ply):
+        standPat = self.evaluate(gameState)
+        if standPat >= beta or ply >= MAX_PLY:
+            return standPat
+        alpha = max(alpha, standPat)
+
+        if self.stagedGeneration:
+            moves = self.moveOrdering.generateMoves(gameState, capturesOnly=True)
+        else:
+            validMoves = gameState.getValidMoves()
+            moves = [move for move in validMoves if move.capturedPiece != "--" or move.promotionPiece]
+            self.moveOrdering.orderCaptures(moves, len(validMoves))
+        for move in moves:
+            self.nodes += 1
+            if self.nodes % CHECK_INTERVAL == 0:
+                self.checkLimits()
+            gameState.makeMove(move)
+            score = -self.quiescence(gameState, -beta, -alpha, ply + 1)
+            gameState.undoMove()
+
+            if score > alpha:
+                if score >= beta:
+                    return score
+                alpha = score
+        return alpha
+
+
+# Mate scores are stored relative to the node, so they stay valid when the position is reached at another ply
+def scoreToTable(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+# Searching every benchmark position to the given depth and reporting the time to depth and nodes per second
+def runBenchmark(depth=3, backend="mailbox", positions=BENCHMARK_POSITIONS, hashSizeInMB=16, stagedGeneration=True):
+    results = []
+    for fen in positions:
+        gameState = createGameState(backend)
+        gameState.loadFen(fen)
+        search = Search(transpositionTable=TranspositionTable(hashSizeInMB), stagedGeneration=stagedGeneration)
+        result = search.search(gameState, maxDepth=depth)
+        results.append({
+            "fen": fen,
+            "depth": result.depth,
+            "bestMove": result.bestMove.getUciNotation() if result.bestMove else None,
+            "score": result.score,
+            "pv": [move.getUciNotation() for move in result.pv],
+            "nodes": result.nodes,
+            "seconds": result.seconds,
+            "nps": result.nps,
+            "ordering": search.moveOrdering.getStats(),
+        })
+    totalNodes = sum(result["nodes"] for result in results)
+    totalSeconds = sum(result["seconds"] for result in results)
+    return {"backend": backend, "depth": depth, "results": results, "totalNodes": totalNodes,
+            "totalSeconds": totalSeconds, "nps": totalNodes / totalSeconds if totalSeconds > 0 else 0.0}
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Search a position or run the search benchmark")
+    parser.add_argument("--fen", help="Position to search (runs the benchmark positions when omitted)")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--time", type=float, help="Time limit in seconds for --fen")
+    parser.add_argument("--nodes", type=int, help="Node limit for --fen")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    parser.add_argument("--hash", type=int, default=16, help="Transposition table size in MB")
+    parser.add_argument("--json", action="store_true", help="Print the benchmark as JSON")
+    parser.add_argument("--no-staged", action="store_true", help="Generate and sort all the moves of a node up front")
+    args = parser.parse_args(arguments)
+
+    if args.fen:
+        gameState = createGameState(args.backend)
+        gameState.loadFen(args.fen)
+        search = Search(transpositionTable=TranspositionTable(args.hash), stagedGeneration=not args.no_staged)
+
+        def printIteration(result):
+            pv = ' '.join(move.getUciNotation() for move in result.pv)
+            print(f"depth {result.depth} score {result.score} nodes {result.nodes} time {result.seconds:.3f} nps {result.nps:.0f} pv {pv}")
+
+        result = search.search(gameState, args.depth, args.time, args.nodes, printIteration)
+        print(f"bestmove {result.bestMove.getUciNotation() if result.bestMove else '(none)'}")
+        return 0
+
+    benchmark = runBenchmark(args.depth, args.backend, hashSizeInMB=args.hash, stagedGeneration=not args.no_staged)
+    if args.json:
+        print(json.dumps(benchmark, indent=2))
+    else:
+        print(f"{'Position':<76}{'Depth':>6}{'Nodes':>10}{'Seconds':>10}{'Nodes/s':>10}{'1st cut':>9}{'Cut idx':>9}{'Gen/node':>9}  Best")
+        for result in benchmark["results"]:
+            ordering = result["ordering"]
+            print(f"{result['fen']:<76}{result['depth']:>6}{result['nodes']:>10}{result['seconds']:>10.3f}{result['nps']:>10.0f}"
+                  f"{ordering['firstMoveCutoffRate']:>9.1%}{ordering['averageCutoffIndex']:>9.2f}"
+                  f"{ordering['generatedMovesPerNode']:>9.2f}  {result['bestMove']}")
+        print(f"{'Total':<76}{'':>6}{benchmark['totalNodes']:>10}{benchmark['totalSeconds']:>10.3f}{benchmark['nps']:>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
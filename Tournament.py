@@ -0,0 +1,378 @@
+import argparse
+import importlib
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from ChessEngine import createGameState
+from EpdRunner import readEpdFile, parseEpdLine
+from PgnReader import readGames
+from Search import Search
+from TranspositionTable import TranspositionTable
+
+# Positions after a few common opening moves, without castling rights since the engine does not castle
+DEFAULT_OPENINGS = [
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w - - 2 3",
+    "rnbqkbnr/ppp2ppp/4p3/3p4/2PP4/8/PP2PPPP/RNBQKBNR w - - 0 3",
+    "rnbqkbnr/pp2pppp/3p4/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R w - - 0 3",
+    "rnbqkbnr/ppp2ppp/4p3/3p4/3PP3/8/PPP2PPP/RNBQKBNR w - - 0 3",
+    "rnbqkb1r/pppppp1p/5np1/8/2PP4/8/PP2PPPP/RNBQKBNR w - - 0 3",
+    "rnbqkb1r/pppp1ppp/5n2/4p3/2P5/2N5/PP1PPPPP/R1BQKBNR w - - 2 3",
+    "rnbqkbnr/pp2pppp/2p5/3p4/3PP3/8/PPP2PPP/RNBQKBNR w - - 0 3",
+    "rnbqkb1r/ppp1pppp/5n2/3p4/8/5NP1/PPPPPP1P/RNBQKB1R w - - 1 3",
+    "rnbqkb1r/pppp1ppp/5n2/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w - - 2 3",
+    "rnbqk2r/pppp1ppp/4pn2/8/1bPP4/2N5/PP2PPPP/R1BQKBNR w - - 2 4",
+    "rnb1kbnr/ppp1pppp/8/3q4/8/8/PPPP1PPP/RNBQKBNR w - - 0 3",
+]
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1"
+DEFAULT_ENGINE = "time=0.1"
+# Games longer than this are adjudicated as draws
+DEFAULT_MAX_PLIES = 300
+
+
+# Parsing an engine description "name=new,depth=4,time=0.5,nodes=20000,hash=8,staged=0,eval=module:function"
+def parseEngineSpec(text, defaultName):
+    spec = {"name": defaultName, "depth": 64, "time": None, "nodes": None, "hash": 8, "staged": True, "eval": None}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        if '=' not in item:
+            raise ValueError(f"Invalid engine option '{item}', expected name=value")
+        name, value = (part.strip() for part in item.split('=', 1))
+        if name in ("name", "eval"):
+            spec[name] = value
+        elif name in ("depth", "nodes", "hash"):
+            spec[name] = int(value)
+        elif name == "time":
+            spec[name] = float(value)
+        elif name == "staged":
+            spec[name] = value.lower() not in ("0", "false", "no")
+        else:
+            raise ValueError(f"Unknown engine option '{name}'")
+    if spec["time"] is None and spec["nodes"] is None and spec["depth"] == 64:
+        raise ValueError(f"Engine {spec['name']} needs a depth, time or nodes limit per move")
+    return spec
+
+
+def createSearch(spec):
+    arguments = {"transpositionTable": TranspositionTable(spec["hash"]), "stagedGeneration": spec["staged"]}
+    if spec["eval"]:
+        moduleName, functionName = spec["eval"].split(':', 1)
+        arguments["evaluate"] = getattr(importlib.import_module(moduleName), functionName)
+    return Search(**arguments)
+
+
+# Kings only, or a single minor piece against a bare king : no checkmate is possible
+def isInsufficientMaterial(board):
+    pieces = [piece[1] for row in board for piece in row if piece != "--" and piece[1] != 'K']
+    return len(pieces) == 0 or (len(pieces) == 1 and pieces[0] in "NB")
+
+
+# Playing one game between two engine specs from the opening position, returning its result and SAN moves
+def playGame(gameIndex, fen, whiteSpec, blackSpec, maxPlies=DEFAULT_MAX_PLIES, backend="mailbox"):
+    startTime = time.perf_counter()
+    gameState = createGameState(backend, fen)
+    searches = {'w': createSearch(whiteSpec), 'b': createSearch(blackSpec)}
+    specs = {'w': whiteSpec, 'b': blackSpec}
+    sanMoves, nodes = [], 0
+    while True:
+        validMoves = gameState.getValidMoves()
+        if gameState.checkmate:
+            result, termination = ("0-1" if gameState.whiteToMove else "1-0"), "checkmate"
+        elif gameState.stalemate:
+            result, termination = "1/2-1/2", "stalemate"
+        elif gameState.draw:
+            result, termination = "1/2-1/2", gameState.drawReason
+        elif isInsufficientMaterial(gameState.board):
+            result, termination = "1/2-1/2", "insufficient material"
+        elif len(gameState.moveLog) >= maxPlies:
+            result, termination = "1/2-1/2", "move limit"
+        else:
+            color = 'w' if gameState.whiteToMove else 'b'
+            spec = specs[color]
+            searchResult = searches[color].search(gameState, spec["depth"], spec["time"], spec["nodes"])
+            nodes += searchResult.nodes
+            move = searchResult.bestMove or validMoves[0]
+            sanMoves.append(gameState.getSanNotation(move, validMoves))
+            gameState.makeMove(move)
+            continue
+        break
+
+    for search in searches.values():
+        search.transpositionTable.release()
+    return {
+        "index": gameIndex,
+        "fen": fen,
+        "white": whiteSpec["name"],
+        "black": blackSpec["name"],
+        "result": result,
+        "termination": termination,
+        "moves": sanMoves,
+        "nodes": nodes,
+        "seconds": time.perf_counter() - startTime,
+        "pid": os.getpid(),
+    }
+
+
+# Writing a finished game as PGN, the opening position being given by the FEN tag
+def formatPgn(game, event="Self-play tournament"):
+    tags = [("Event", event), ("Site", "?"), ("Date", time.strftime("%Y.%m.%d")), ("Round", str(game["index"] + 1)),
+            ("White", game["white"]), ("Black", game["black"]), ("Result", game["result"])]
+    if game["fen"] != START_FEN:
+        tags += [("SetUp", "1"), ("FEN", game["fen"])]
+    tags += [("Termination", game["termination"]), ("PlyCount", str(len(game["moves"])))]
+
+    fields = game["fen"].split()
+    ply = 2 * (int(fields[5]) - 1) + (0 if fields[1] == 'w' else 1) if len(fields) > 5 else (0 if fields[1] == 'w' else 1)
+    tokens = []
+    for i, san in enumerate(game["moves"]):
+        if (ply + i) % 2 == 0:
+            tokens.append(f"{(ply + i) // 2 + 1}.")
+        elif i == 0:
+            tokens.append(f"{(ply + i) // 2 + 1}...")
+        tokens.append(san)
+    tokens.append(game["result"])
+
+    lines, line = [], ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(f'[{name} "{value}"]' for name, value in tags) + "\n\n" + "\n".join(lines) + "\n\n"
+
+
+# Reading the opening positions of an EPD / FEN file (one per line) or the final positions of the games of a PGN file
+# The games that could not be replayed and the ones that ended in checkmate or stalemate are left out
+def readOpenings(path):
+    if path.lower().endswith(".pgn"):
+        for game in readGames(path):
+            gameState = game.replay()
+            if gameState is not None and gameState.getValidMoves():
+                yield gameState.getFen()
+    else:
+        for _, line in readEpdFile(path):
+            yield parseEpdLine(line)[0]
+
+
+# Expected score of an Elo difference
+def getExpectedScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+# Elo difference of a score, clamped away from 0 and 1 where it is infinite
+def getEloDifference(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400 * math.log10(score / (1 - score))
+
+
+# Wins / draws / losses of the first engine, with the Elo difference and its 95% confidence interval
+# The interval comes from the standard error of the per-game scores
+def getEloEstimate(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return {"games": 0, "score": 0.5, "elo": 0.0, "eloLow": 0.0, "eloHigh": 0.0, "errorMargin": 0.0}
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    standardError = math.sqrt(variance / games)
+    eloLow, eloHigh = getEloDifference(score - 1.96 * standardError), getEloDifference(score + 1.96 * standardError)
+    return {"games": games, "score": score, "elo": getEloDifference(score), "eloLow": eloLow, "eloHigh": eloHigh,
+            "errorMargin": (eloHigh - eloLow) / 2}
+
+
+# Sequential probability ratio test of H0 : elo = elo0 against H1 : elo = elo1, with the normal approximation
+# of the trinomial (win / draw / loss) log-likelihood ratio
+class Sprt:
+    def __init__(self, elo0=0.0, elo1=10.0, alpha=0.05, beta=0.05):
+        self.elo0, self.elo1 = elo0, elo1
+        self.lowerBound = math.log(beta / (1 - alpha))
+        self.upperBound = math.log((1 - beta) / alpha)
+
+
+    def getLlr(self, wins, draws, losses):
+        games = wins + draws + losses
+        if games == 0 or wins + losses == 0:
+            return 0.0
+        score = (wins + draws / 2) / games
+        variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+        if variance <= 0:
+            return 0.0
+        score0, score1 = getExpectedScore(self.elo0), getExpectedScore(self.elo1)
+        return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+    # Getting "H1" (the change is an improvement), "H0" (it is not) or None while the test goes on
+    def getDecision(self, wins, draws, losses):
+        llr = self.getLlr(wins, draws, losses)
+        if llr >= self.upperBound:
+            return "H1"
+        if llr <= self.lowerBound:
+            return "H0"
+        return None
+
+
+# Playing the games across a pool of worker processes, every opening twice with the colors swapped
+# The games are sent a few per worker at a time, so the SPRT can stop the match without playing the queued ones
+class Tournament:
+    def __init__(self, engineA, engineB, openings, games, workers=None, maxPlies=DEFAULT_MAX_PLIES, backend="mailbox",
+                 sprt=None, pgnPath=None, onGame=None):
+        self.engineA, self.engineB = engineA, engineB
+        self.openings = openings
+        self.games = games
+        self.workers = workers or os.cpu_count() or 1
+        self.maxPlies = maxPlies
+        self.backend = backend
+        self.sprt = sprt
+        self.pgnPath = pgnPath
+        self.onGame = onGame
+        # Results from the point of view of engine A
+        self.wins = self.draws = self.losses = 0
+        self.terminations = {}
+        self.busySeconds = {}
+        self.nodes = 0
+        self.decision = None
+
+
+    # Getting the arguments of playGame for every game : opening i // 2, engine A playing white in the even games
+    def getTasks(self):
+        openingIterator = iter(self.openings)
+        opening = None
+        for gameIndex in range(self.games):
+            if gameIndex % 2 == 0:
+                opening = next(openingIterator, None)
+                if opening is None:
+                    openingIterator = iter(self.openings)
+                    opening = next(openingIterator)
+            white, black = (self.engineA, self.engineB) if gameIndex % 2 == 0 else (self.engineB, self.engineA)
+            yield gameIndex, opening, white, black, self.maxPlies, self.backend
+
+
+    def addResult(self, game, pgnFile):
+        scoreA = {"1-0": 1.0, "0-1": 0.0}.get(game["result"], 0.5)
+        if game["black"] == self.engineA["name"] and game["white"] != self.engineA["name"]:
+            scoreA = 1.0 - scoreA
+        if scoreA == 1.0:
+            self.wins += 1
+        elif scoreA == 0.0:
+            self.losses += 1
+        else:
+            self.draws += 1
+        self.terminations[game["termination"]] = self.terminations.get(game["termination"], 0) + 1
+        self.busySeconds[game["pid"]] = self.busySeconds.get(game["pid"], 0.0) + game["seconds"]
+        self.nodes += game["nodes"]
+        if pgnFile is not None:
+            pgnFile.write(formatPgn(game))
+            pgnFile.flush()
+        if self.onGame is not None:
+            self.onGame(game, self)
+        if self.sprt is not None and self.decision is None:
+            self.decision = self.sprt.getDecision(self.wins, self.draws, self.losses)
+
+
+    def run(self):
+        self.startTime = time.perf_counter()
+        pgnFile = open(self.pgnPath, "w", encoding="utf-8") if self.pgnPath else None
+        try:
+            with ProcessPoolExecutor(self.workers) as executor:
+                pending = set()
+                for task in self.getTasks():
+                    if self.decision is not None:
+                        break
+                    pending.add(executor.submit(playGame, *task))
+                    if len(pending) >= 2 * self.workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            self.addResult(future.result(), pgnFile)
+                # The games already started are finished, the stopped match still counts them
+                for future in pending:
+                    self.addResult(future.result(), pgnFile)
+        finally:
+            if pgnFile is not None:
+                pgnFile.close()
+        self.seconds = time.perf_counter() - self.startTime
+        return self.getReport()
+
+
+    def getReport(self):
+        seconds = getattr(self, "seconds", None) or time.perf_counter() - self.startTime
+        estimate = getEloEstimate(self.wins, self.draws, self.losses)
+        report = {
+            "engineA": self.engineA["name"],
+            "engineB": self.engineB["name"],
+            "wins": self.wins,
+            "draws": self.draws,
+            "losses": self.losses,
+            **estimate,
+            "terminations": self.terminations,
+            "seconds": seconds,
+            "gamesPerHour": 3600 * estimate["games"] / seconds if seconds > 0 else 0.0,
+            "nodes": self.nodes,
+            # Share of the wall-clock time every worker process spent playing games
+            "workerUtilization": {str(pid): busy / seconds for pid, busy in self.busySeconds.items()} if seconds > 0 else {},
+        }
+        if self.sprt is not None:
+            report["sprt"] = {"elo0": self.sprt.elo0, "elo1": self.sprt.elo1, "llr": self.sprt.getLlr(self.wins, self.draws, self.losses),
+                              "lowerBound": self.sprt.lowerBound, "upperBound": self.sprt.upperBound, "decision": self.decision}
+        return report
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Headless engine-vs-engine match over a process pool")
+    parser.add_argument("--engine-a", default=DEFAULT_ENGINE, help=f"First engine, e.g. 'name=new,nodes=5000' (default '{DEFAULT_ENGINE}')")
+    parser.add_argument("--engine-b", default=DEFAULT_ENGINE, help="Second engine, same format")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--workers", type=int, help="Number of worker processes (the number of CPUs by default)")
+    parser.add_argument("--openings", help="EPD / FEN file (one position per line) or PGN file of opening positions")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="Games longer than this are drawn")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox")
+    parser.add_argument("--pgn", help="File the games are written to")
+    parser.add_argument("--sprt", action="store_true", help="Stop as soon as the SPRT accepts one of the hypotheses")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=10.0)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--quiet", action="store_true", help="Do not print a line per game")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(arguments)
+
+    try:
+        engineA = parseEngineSpec(args.engine_a, "A")
+        engineB = parseEngineSpec(args.engine_b, "B")
+    except ValueError as error:
+        parser.error(str(error))
+    if engineA["name"] == engineB["name"]:
+        engineB["name"] += "'"
+    openings = list(readOpenings(args.openings)) if args.openings else DEFAULT_OPENINGS
+    if not openings:
+        parser.error("No opening position found")
+    sprt = Sprt(args.elo0, args.elo1, args.alpha, args.beta) if args.sprt else None
+
+    def printGame(game, tournament):
+        if not args.quiet and not args.json:
+            print(f"game {game['index'] + 1:>4} {game['white']} - {game['black']} {game['result']:<8} {game['termination']:<22}"
+                  f"{len(game['moves']):>4} plies  score {tournament.wins}-{tournament.draws}-{tournament.losses}")
+
+    tournament = Tournament(engineA, engineB, openings, args.games, args.workers, args.max_plies, args.backend, sprt, args.pgn, printGame)
+    report = tournament.run()
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"{report['engineA']} vs {report['engineB']} : +{report['wins']} ={report['draws']} -{report['losses']} "
+          f"({report['score']:.1%}), Elo {report['elo']:+.1f} +/- {report['errorMargin']:.1f} "
+          f"[{report['eloLow']:+.1f}, {report['eloHigh']:+.1f}]")
+    if "sprt" in report:
+        sprtReport = report["sprt"]
+        print(f"SPRT elo0={sprtReport['elo0']} elo1={sprtReport['elo1']} : LLR {sprtReport['llr']:.2f} "
+              f"[{sprtReport['lowerBound']:.2f}, {sprtReport['upperBound']:.2f}], {sprtReport['decision'] or 'undecided'}")
+    print(f"{report['games']} games in {report['seconds']:.1f} s, {report['gamesPerHour']:.0f} games/hour, {report['nodes']} nodes")
+    for pid, utilization in sorted(report["workerUtilization"].items()):
+        print(f"  worker {pid} : {utilization:.0%} busy")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# Bound types of a stored score
+BOUND_EXACT = 1
+BOUND_LOWER = 2
+BOUND_UPPER = 3
+
+# Every entry is two 64-bit words : (key ^ data, data), so a torn or foreign entry never matches a probe
+ENTRY_WORDS = 2
+BUCKET_SIZE = 4
+MAX_AGE = 63
+SCORE_OFFSET = 1 << 31
+
+# Layout of the data word
+DEPTH_SHIFT = 16
+BOUND_SHIFT = 24
+AGE_SHIFT = 26
+SCORE_SHIFT = 32
+
+
+# Packing an entry into its data word : move ID (16 bits), depth (8), bound (2), age (6), score (32)
+def packEntry(moveID, depth, score, bound, age):
+    return moveID | (depth << DEPTH_SHIFT) | (bound << BOUND_SHIFT) | (age << AGE_SHIFT) | ((score + SCORE_OFFSET) << SCORE_SHIFT)
+
+
+# Unpacking a data word into (moveID, depth, score, bound)
+def unpackEntry(data):
+    return data & 0xFFFF, (data >> DEPTH_SHIFT) & 0xFF, (data >> SCORE_SHIFT) - SCORE_OFFSET, (data >> BOUND_SHIFT) & 3
+
+
+# Fixed-size table of search results keyed by GameState.zobristKey
+# The entries live in one flat buffer of 64-bit words, so the memory used is the requested budget
+class TranspositionTable:
+    def __init__(self, sizeInMB=16, buffer=None):
+        # An existing buffer (e.g. shared memory) can be given instead of allocating a new one
+        if buffer is None:
+            buffer = bytearray(sizeInMB * 1024 * 1024)
+        self.buffer = buffer
+        self.words = memoryview(buffer).cast('Q')
+        self.bucketCount = max(1, len(self.words) // (ENTRY_WORDS * BUCKET_SIZE))
+        self.age = 0
+        self.resetStats()
+
+
+    # Releasing the view on the buffer, needed before closing a shared memory block
+    def release(self):
+        self.words.release()
+
+
+    def resetStats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+        self.overwrites = 0
+
+
+    # Starting a new search : older entries become the first to be replaced
+    def newSearch(self):
+        self.age = (self.age + 1) & MAX_AGE
+
+
+    def clear(self):
+        self.words[:] = memoryview(bytes(len(self.words) * 8)).cast('Q')
+        self.age = 0
+        self.resetStats()
+
+
+    # Getting (moveID, depth, score, bound) stored for the key, or None
+    def probe(self, key):
+        self.probes += 1
+        words = self.words
+        index = (key % self.bucketCount) * ENTRY_WORDS * BUCKET_SIZE
+        for slot in range(index, index + ENTRY_WORDS * BUCKET_SIZE, ENTRY_WORDS):
+            data = words[slot + 1]
+            if data and (words[slot] ^ data) == key:
+                self.hits += 1
+                return unpackEntry(data)
+        return None
+
+
+    # Storing a search result, preferring to keep deep entries of the current search
+    def store(self, key, moveID, depth, score, bound):
+        self.stores += 1
+        words = self.words
+        index = (key % self.bucketCount) * ENTRY_WORDS * BUCKET_SIZE
+        depth = max(0, min(depth, 0xFF))
+        emptySlot, replacedSlot, replacedValue = None, None, None
+        otherPositions = 0
+        for slot in range(index, index + ENTRY_WORDS * BUCKET_SIZE, ENTRY_WORDS):
+            data = words[slot + 1]
+            if not data:
+                if emptySlot is None:
+                    emptySlot = slot
+                continue
+            if (words[slot] ^ data) == key:
+                # Same position : a shallower bound of the current search does not replace a deeper result
+                storedMoveID, storedDepth, _, _ = unpackEntry(data)
+                if depth < storedDepth and bound != BOUND_EXACT and ((data >> AGE_SHIFT) & MAX_AGE) == self.age:
+                    return
+                self.writeEntry(slot, key, moveID or storedMoveID, depth, score, bound)
+                return
+            # Entry of another position : the shallowest and oldest one is the one to replace
+            otherPositions += 1
+            relativeAge = (self.age - ((data >> AGE_SHIFT) & MAX_AGE)) & MAX_AGE
+            value = ((data >> DEPTH_SHIFT) & 0xFF) - 4 * relativeAge
+            if replacedValue is None or value < replacedValue:
+                replacedSlot, replacedValue = slot, value
+
+        if otherPositions:
+            self.collisions += 1
+        if emptySlot is None:
+            self.overwrites += 1
+            emptySlot = replacedSlot
+        self.writeEntry(emptySlot, key, moveID, depth, score, bound)
+
+
+    def writeEntry(self, slot, key, moveID, depth, score, bound):
+        data = packEntry(moveID, depth, score, bound, self.age)
+        self.words[slot] = key ^ data
+        self.words[slot + 1] = data
+
+
+    # Permille of the sampled entries that are used by the current search (as reported by UCI engines)
+    def getHashFull(self, sampleSize=1000):
+        words = self.words
+        sampleSize = min(sampleSize, len(words) // ENTRY_WORDS)
+        used = 0
+        for slot in range(0, sampleSize * ENTRY_WORDS, ENTRY_WORDS):
+            data = words[slot + 1]
+            if data and ((data >> AGE_SHIFT) & MAX_AGE) == self.age:
+                used += 1
+        return used * 1000 // max(1, sampleSize)
+
+
+    def getStats(self):
+        return {
+            "sizeInBytes": len(self.words) * 8,
+            "entries": self.bucketCount * BUCKET_SIZE,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hitRate": self.hits / self.probes if self.probes else 0.0,
+            "stores": self.stores,
+            "collisions": self.collisions,
+            "overwrites": self.overwrites,
+        }
@@ -0,0 +1,296 @@
+import queue
+import sys
+import threading
+import time
+
+from ChessEngine import createGameState
+from OpeningBook import OpeningBook
+from Search import Search, MATE_SCORE, MATE_THRESHOLD, MAX_PLY
+from TranspositionTable import TranspositionTable
+
+ENGINE_NAME = "MyChessEngine"
+ENGINE_AUTHOR = "Louay Barraq"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1"
+
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+DEFAULT_MOVE_OVERHEAD_MS = 50
+# Number of moves the remaining time is shared between when the GUI does not send movestogo
+DEFAULT_MOVES_TO_GO = 30
+# Numeric go parameters the engine handles
+GO_LIMITS = ("wtime", "btime", "winc", "binc", "movestogo", "depth", "nodes", "mate", "movetime")
+
+
+# Getting the (soft, hard) time limits in seconds of a move from the go parameters, None when the search is not timed
+# The search does not start a new depth after the soft limit and is stopped at the hard limit
+def getTimeLimits(parameters, whiteToMove, moveOverhead):
+    if "movetime" in parameters:
+        moveTime = max(0.001, parameters["movetime"] / 1000 - moveOverhead)
+        return moveTime, moveTime
+
+    remaining = parameters.get("wtime" if whiteToMove else "btime")
+    if remaining is None:
+        return None, None
+    increment = parameters.get("winc" if whiteToMove else "binc", 0) / 1000
+    remaining = max(0.001, remaining / 1000 - moveOverhead)
+    movesToGo = max(1, parameters.get("movestogo", DEFAULT_MOVES_TO_GO))
+
+    allotted = remaining / movesToGo + increment * 3 / 4
+    hardLimit = min(remaining * 4 / 5, allotted * 3)
+    softLimit = min(allotted, hardLimit)
+    return softLimit, hardLimit
+
+
+# Formatting a score for an info line : "cp <centipawns>" or "mate <moves>" (negative when getting mated)
+def formatScore(score):
+    if score >= MATE_THRESHOLD:
+        return f"mate {(MATE_SCORE - score + 1) // 2}"
+    if score <= -MATE_THRESHOLD:
+        return f"mate {-((MATE_SCORE + score) // 2)}"
+    return f"cp {score}"
+
+
+# Parsing the go parameters into a dict of numbers, with the flags (infinite, ponder) set to True
+# The parameters the engine does not support are listed under "ignored", so the GUI can be told about them
+def parseGoParameters(tokens):
+    parameters = {"ignored": []}
+    i = 0
+    while i < len(tokens):
+        name = tokens[i]
+        if name in ("infinite", "ponder"):
+            parameters[name] = True
+        elif name == "searchmoves":
+            # The remaining tokens are the moves to search, which are not supported
+            parameters["ignored"].append(name)
+            break
+        elif name in GO_LIMITS and i + 1 < len(tokens):
+            try:
+                parameters[name] = int(tokens[i + 1])
+            except ValueError:
+                parameters["ignored"].append(name)
+            i += 1
+        else:
+            parameters["ignored"].append(name)
+        i += 1
+    return parameters
+
+
+# Getting the depth limit of a search : a mate in N moves is found within 2 * N plies
+def getDepthLimit(parameters):
+    depth = parameters.get("depth", MAX_PLY)
+    if "mate" in parameters:
+        depth = min(depth, 2 * max(1, parameters["mate"]))
+    return max(1, depth)
+
+
+# Headless UCI front end : the commands are read by a separate thread, the search runs on another one
+# so that stop, ponderhit and isready are answered while the engine is thinking
+class UciEngine:
+    def __init__(self, inputStream=sys.stdin, outputStream=sys.stdout, backend="mailbox"):
+        self.inputStream = inputStream
+        self.outputStream = outputStream
+        self.backend = backend
+        self.outputLock = threading.Lock()
+        self.commands = queue.Queue()
+
+        self.hashSizeInMB = DEFAULT_HASH_MB
+        self.moveOverhead = DEFAULT_MOVE_OVERHEAD_MS / 1000
+        self.stopEvent = threading.Event()
+        self.ponderHitEvent = threading.Event()
+        self.search = Search(transpositionTable=TranspositionTable(self.hashSizeInMB), stopEvent=self.stopEvent)
+        self.searchThread = None
+        self.book = None
+        self.gameState = createGameState(self.backend)
+        self.gameState.loadFen(START_FEN)
+
+
+    def send(self, line):
+        with self.outputLock:
+            self.outputStream.write(line + "\n")
+            self.outputStream.flush()
+
+
+    # Reading the input on its own thread, so a blocking read never delays the engine
+    def readInput(self):
+        for line in self.inputStream:
+            self.commands.put(line.strip())
+        self.commands.put("quit")
+
+
+    def run(self):
+        threading.Thread(target=self.readInput, daemon=True).start()
+        while True:
+            line = self.commands.get()
+            if not line:
+                continue
+            if not self.handleCommand(line):
+                break
+
+
+    # Handling one command, returning False on quit
+    def handleCommand(self, line):
+        tokens = line.split()
+        command, arguments = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send(f"option name Move Overhead type spin default {DEFAULT_MOVE_OVERHEAD_MS} min 0 max 5000")
+            self.send("option name Ponder type check default false")
+            self.send("option name Book File type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.stopSearch()
+            self.setOption(arguments)
+        elif command == "ucinewgame":
+            self.stopSearch()
+            self.search.transpositionTable.clear()
+            self.search.moveOrdering.clear()
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(arguments)
+        elif command == "go":
+            self.stopSearch()
+            parameters = parseGoParameters(arguments)
+            if parameters["ignored"]:
+                self.send(f"info string ignoring unsupported go parameters : {' '.join(parameters['ignored'])}")
+            # A book move is played at once, unless the GUI asked for an analysis
+            bookMove = None
+            if self.book is not None and not (parameters.get("infinite") or parameters.get("ponder")):
+                bookMove = self.book.chooseMove(self.gameState)
+            if bookMove is not None:
+                self.send(f"info string book move {bookMove.getUciNotation()}")
+                self.send(f"bestmove {bookMove.getUciNotation()}")
+            else:
+                self.startSearch(parameters)
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "quit":
+            self.stopSearch()
+            if self.book is not None:
+                self.book.close()
+            return False
+        return True
+
+
+    def setOption(self, arguments):
+        text = " ".join(arguments)
+        if not text.startswith("name ") or " value " not in text:
+            return
+        name, value = text[len("name "):].split(" value ", 1)
+        name = name.strip().lower()
+        try:
+            if name == "hash":
+                self.hashSizeInMB = max(1, min(int(value), MAX_HASH_MB))
+                self.search.transpositionTable = TranspositionTable(self.hashSizeInMB)
+            elif name == "move overhead":
+                self.moveOverhead = max(0, int(value)) / 1000
+            elif name == "book file":
+                if self.book is not None:
+                    self.book.close()
+                    self.book = None
+                value = value.strip()
+                if value and value != "<empty>":
+                    self.book = OpeningBook(value)
+        except (ValueError, OSError):
+            self.send(f"info string invalid value for option {name} : {value}")
+
+
+    # position [startpos | fen <fen>] [moves <move1> ... <moveN>]
+    def setPosition(self, arguments):
+        if "moves" in arguments:
+            movesIndex = arguments.index("moves")
+            positionArguments, moves = arguments[:movesIndex], arguments[movesIndex + 1:]
+        else:
+            positionArguments, moves = arguments, []
+
+        gameState = createGameState(self.backend)
+        try:
+            if positionArguments[:1] == ["fen"]:
+                gameState.loadFen(" ".join(positionArguments[1:]))
+            else:
+                gameState.loadFen(START_FEN)
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+
+        for uciMove in moves:
+            move = next((move for move in gameState.getValidMoves() if move.getUciNotation() == uciMove), None)
+            if move is None:
+                self.send(f"info string illegal move {uciMove}")
+                break
+            gameState.makeMove(move)
+        self.gameState = gameState
+
+
+    def startSearch(self, parameters):
+        self.stopEvent.clear()
+        self.ponderHitEvent.clear()
+        softLimit, hardLimit = (None, None) if parameters.get("infinite") else \
+            getTimeLimits(parameters, self.gameState.whiteToMove, self.moveOverhead)
+        # Pondering is not timed until ponderhit, which then applies the limits of the move
+        self.ponderTimeLimits = (softLimit, hardLimit)
+        if parameters.get("ponder"):
+            softLimit, hardLimit = None, None
+        self.softDeadline = None if softLimit is None else time.perf_counter() + softLimit
+        self.searchThread = threading.Thread(target=self.runSearch, args=(parameters, hardLimit), daemon=True)
+        self.searchThread.start()
+
+
+    # Stopping the running search and waiting for its bestmove
+    def stopSearch(self):
+        if self.searchThread is None:
+            return
+        self.stopEvent.set()
+        self.ponderHitEvent.set()
+        self.searchThread.join()
+        self.searchThread = None
+
+
+    # The opponent played the expected move : the ponder search keeps going, now with the clock of the move
+    def ponderHit(self):
+        if self.searchThread is None:
+            return
+        softLimit, hardLimit = self.ponderTimeLimits
+        startTime = time.perf_counter()
+        self.softDeadline = None if softLimit is None else startTime + softLimit
+        if hardLimit is not None:
+            self.search.deadline = startTime + hardLimit
+        self.ponderHitEvent.set()
+
+
+    def runSearch(self, parameters, timeLimit):
+        isPondering = parameters.get("ponder", False)
+
+        def onIteration(result):
+            pv = ' '.join(move.getUciNotation() for move in result.pv)
+            self.send(f"info depth {result.depth} score {formatScore(result.score)} nodes {result.nodes} "
+                      f"nps {result.nps:.0f} time {int(result.seconds * 1000)} "
+                      f"hashfull {self.search.transpositionTable.getHashFull()} pv {pv}")
+            # Starting a new depth after the soft limit would most likely not finish in time
+            if self.softDeadline is not None and time.perf_counter() >= self.softDeadline:
+                self.search.stop()
+
+        result = self.search.search(self.gameState, getDepthLimit(parameters), timeLimit,
+                                    parameters.get("nodes"), onIteration)
+
+        # The bestmove of a ponder or infinite search is only sent once the GUI asks for it
+        if isPondering or parameters.get("infinite"):
+            while not self.stopEvent.is_set() and not (isPondering and self.ponderHitEvent.is_set()):
+                self.stopEvent.wait(0.01)
+        bestMove = result.bestMove.getUciNotation() if result.bestMove else "0000"
+        ponderMove = f" ponder {result.pv[1].getUciNotation()}" if len(result.pv) > 1 else ""
+        self.send(f"bestmove {bestMove}{ponderMove}")
+
+
+def main():
+    UciEngine().run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -38,4 +38,6 @@ BORDER_WIDTH = 16
 DIMENSION = 8
 SQUARE_SIZE = BOARD_HEIGHT // DIMENSION
 MAX_FPS = 15
+# Seconds the engine thinks when asked to play a move
+ENGINE_THINKING_TIME = 2
 IMAGES = {}
\ No newline at end of file